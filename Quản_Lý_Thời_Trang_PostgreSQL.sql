@@ -550,19 +550,17 @@ GROUP BY u.id, u.username, u.email, u.full_name
 ORDER BY total_spent DESC;
 
 -- Tạo các chỉ mục để tối ưu hiệu suất
-CREATE INDEX IF NOT EXISTS idx_products_category ON products(category_id);
+-- Tên và cột chỉ mục khớp với khai báo trong các model của app.py (migrations.py)
+CREATE INDEX IF NOT EXISTS ix_products_category_id ON products(category_id);
 CREATE INDEX IF NOT EXISTS idx_products_featured ON products(is_featured);
-CREATE INDEX IF NOT EXISTS idx_product_variants_product ON product_variants(product_id);
-CREATE INDEX IF NOT EXISTS idx_orders_user ON orders(user_id);
-CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status);
-CREATE INDEX IF NOT EXISTS idx_orders_created ON orders(created_at);
+CREATE INDEX IF NOT EXISTS ix_product_variants_product_id ON product_variants(product_id);
+CREATE INDEX IF NOT EXISTS ix_orders_user_id ON orders(user_id);
+CREATE INDEX IF NOT EXISTS ix_orders_created_at ON orders(created_at);
+CREATE INDEX IF NOT EXISTS ix_orders_status_created_at ON orders(status, created_at);
 CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items(order_id);
 CREATE INDEX IF NOT EXISTS idx_order_items_product ON order_items(product_id);
-CREATE INDEX IF NOT EXISTS idx_reviews_product ON reviews(product_id);
+CREATE INDEX IF NOT EXISTS idx_reviews_product_created ON reviews(product_id, created_at);
 CREATE INDEX IF NOT EXISTS idx_reviews_user ON reviews(user_id);
-CREATE INDEX IF NOT EXISTS idx_wishlist_user ON wishlist(user_id);
-CREATE INDEX IF NOT EXISTS idx_wishlist_product ON wishlist(product_id);
-CREATE INDEX IF NOT EXISTS idx_comments_product ON product_comments(product_id);
-CREATE INDEX IF NOT EXISTS idx_comments_approved ON product_comments(is_approved);
-CREATE INDEX IF NOT EXISTS idx_recently_viewed_user ON recently_viewed(user_id);
-CREATE INDEX IF NOT EXISTS idx_recently_viewed_time ON recently_viewed(viewed_at);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS ix_wishlist_product_id ON wishlist(product_id);
+CREATE INDEX IF NOT EXISTS ix_product_comments_product_id_approved_created_at ON product_comments(product_id, is_approved, created_at);
+CREATE INDEX IF NOT EXISTS ix_recently_viewed_user_id_viewed_at ON recently_viewed(user_id, viewed_at);
\ No newline at end of file
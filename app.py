@@ -1,24 +1,85 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, Response, send_from_directory, send_file, abort, make_response
+from markupsafe import Markup, escape
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import create_engine
 from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.utils import safe_join
+from jinja2 import FileSystemBytecodeCache, TemplateError
 import os
-from datetime import datetime, timedelta
-import decimal
+import mimetypes
+import hashlib
+import hmac
+from datetime import datetime, timedelta, timezone
 import json
 import re
 import uuid
 import smtplib
+import time
+import math
+import heapq
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+import click
+from order_feed import OrderEventHub, default_max_streams
+from recently_viewed import RecentlyViewedBuffer
+from reference_data import ReferenceDataCache
+from search_suggest import SearchSuggestions
+from stock_cache import StockCache
+from image_pipeline import ImagePipeline, SOURCE_EXTENSIONS
+from compression import CompressionMiddleware
+from json_provider import FastJSONProvider
+from server_session import ServerSessionInterface, SessionStore
+from metrics import APP_ERRORS, install_metrics, metrics_response
+from slow_queries import SlowQueryLog
+from migrations import run_migrations
+from db_tuning import configure_sqlite, database_config, write_transaction
+import analytics
+import assets
+import synthetic_data
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'fashion_store_secret_key_development')
 
-# Cấu hình SQLite database
+# JSON dùng orjson: Decimal, datetime và Row của SQLAlchemy được jsonify trực tiếp
+app.json = FastJSONProvider(app)
+
+# Nén gzip/brotli cho HTML/JSON theo Accept-Encoding; mức nén cao tốn CPU hơn, tiết kiệm băng thông hơn
+app.wsgi_app = CompressionMiddleware(
+    app.wsgi_app,
+    min_size=int(os.environ.get('COMPRESS_MIN_SIZE', 500)),
+    gzip_level=int(os.environ.get('COMPRESS_GZIP_LEVEL', 6)),
+    brotli_quality=int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4))
+)
+
+# Cấu hình database: PostgreSQL qua DATABASE_URL, mặc định dùng file SQLite
 basedir = os.path.abspath(os.path.dirname(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(basedir, "fashion_store.db")}'
+database_url, engine_options = database_config(f'sqlite:///{os.path.join(basedir, "fashion_store.db")}')
+app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Phiên phía server: cookie chỉ chứa id phiên đã ký, dữ liệu phiên (giỏ hàng...) nằm trong
+# SESSION_DATABASE_URL (mặc định file SQLite riêng). SESSION_BACKEND=cookie dùng lại cookie ký của Flask.
+if os.environ.get('SESSION_BACKEND', 'server') == 'server':
+    session_url, session_engine_options = database_config(
+        f'sqlite:///{os.path.join(basedir, "sessions.db")}', env='SESSION_DATABASE_URL'
+    )
+    session_engine = create_engine(session_url, **session_engine_options)
+    if session_engine.dialect.name == 'sqlite':
+        configure_sqlite(session_engine)
+    app.session_interface = ServerSessionInterface(SessionStore(
+        session_engine,
+        ttl=timedelta(seconds=int(os.environ.get('SESSION_TTL', 7 * 24 * 3600))),
+        cache_size=int(os.environ.get('SESSION_CACHE_SIZE', 10000)),
+        cache_ttl=float(os.environ.get('SESSION_CACHE_TTL', 30)),
+        gc_interval=int(os.environ.get('SESSION_GC_INTERVAL', 300))
+    ))
+
+# Bytecode của template lưu trên đĩa, dùng chung giữa các worker và giữa các lần khởi động lại
+template_cache_dir = os.environ.get('TEMPLATE_CACHE_DIR', os.path.join(basedir, 'template_cache'))
+os.makedirs(template_cache_dir, exist_ok=True)
+app.jinja_options = {**app.jinja_options, 'bytecode_cache': FileSystemBytecodeCache(template_cache_dir)}
+
 # Cấu hình email
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
@@ -28,6 +89,25 @@ EMAIL_USE_TLS = True
 
 db = SQLAlchemy(app)
 
+# Cấu hình hiệu năng SQLite (WAL, busy_timeout, mmap...), chọn profile qua SQLITE_PROFILE
+with app.app_context():
+    if db.engine.dialect.name == 'sqlite':
+        configure_sqlite(db.engine)
+
+# Nhật ký truy vấn chậm (ngưỡng SLOW_QUERY_MS) kèm kế hoạch thực thi, xem tổng hợp tại /admin/slow_queries
+slow_query_log = SlowQueryLog(
+    os.environ.get('SLOW_QUERY_LOG', os.path.join(basedir, 'logs', 'slow_queries.log')),
+    threshold_ms=float(os.environ.get('SLOW_QUERY_MS', 200)),
+    explain=os.environ.get('SLOW_QUERY_EXPLAIN', '1') == '1',
+    analyze=os.environ.get('SLOW_QUERY_EXPLAIN_ANALYZE', '0') == '1',
+    explain_interval=float(os.environ.get('SLOW_QUERY_EXPLAIN_INTERVAL', 300))
+)
+
+# Chỉ số Prometheus cho route, SQL và template, xem tại /metrics
+with app.app_context():
+    install_metrics(app, db.engine)
+    slow_query_log.install(db.engine)
+
 # Models
 class User(db.Model):
     __tablename__ = 'users'
@@ -69,18 +149,35 @@ class Product(db.Model):
     name = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
     base_price = db.Column(db.Numeric(10, 2), nullable=False)
-    category_id = db.Column(db.Integer, db.ForeignKey('categories.id'))
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), index=True)
     image_url = db.Column(db.String(255))
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    # Khóa lọc/sắp xếp tính sẵn cho trang danh sách (cập nhật khi biến thể, đánh giá, đơn hàng thay đổi)
+    min_price = db.Column(db.Numeric(10, 2))
+    avg_rating = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    review_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    sold_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
+    # Mỗi kiểu sắp xếp có chỉ mục (is_active, khóa, id) và (is_active, category_id, khóa, id)
+    __table_args__ = (
+        db.Index('ix_products_active_min_price', 'is_active', 'min_price', 'id'),
+        db.Index('ix_products_active_created_at', 'is_active', 'created_at', 'id'),
+        db.Index('ix_products_active_rating', 'is_active', 'avg_rating', 'review_count', 'id'),
+        db.Index('ix_products_active_sold_count', 'is_active', 'sold_count', 'id'),
+        db.Index('ix_products_active_category_min_price', 'is_active', 'category_id', 'min_price', 'id'),
+        db.Index('ix_products_active_category_created_at', 'is_active', 'category_id', 'created_at', 'id'),
+        db.Index('ix_products_active_category_rating', 'is_active', 'category_id', 'avg_rating', 'review_count', 'id'),
+        db.Index('ix_products_active_category_sold_count', 'is_active', 'category_id', 'sold_count', 'id'),
+    )
     
     category = db.relationship('Category', backref='products')
 
 class ProductVariant(db.Model):
     __tablename__ = 'product_variants'
     id = db.Column(db.Integer, primary_key=True)
-    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'))
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), index=True)
     color_id = db.Column(db.Integer, db.ForeignKey('colors.id'))
     size_id = db.Column(db.Integer, db.ForeignKey('sizes.id'))
     price = db.Column(db.Numeric(10, 2), nullable=False)
@@ -95,22 +192,24 @@ class ProductVariant(db.Model):
 class Order(db.Model):
     __tablename__ = 'orders'
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
     total_amount = db.Column(db.Numeric(10, 2), default=0)
     status = db.Column(db.String(20), default='pending')
     shipping_address = db.Column(db.Text)
     phone = db.Column(db.String(20))
     notes = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (db.Index('ix_orders_status_created_at', 'status', 'created_at'),)
+    
     user = db.relationship('User', backref='orders')
 
 class OrderDetail(db.Model):
     __tablename__ = 'order_details'
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('orders.id', ondelete='CASCADE'))
-    product_variant_id = db.Column(db.Integer, db.ForeignKey('product_variants.id'))
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id', ondelete='CASCADE'), index=True)
+    product_variant_id = db.Column(db.Integer, db.ForeignKey('product_variants.id'), index=True)
     quantity = db.Column(db.Integer, nullable=False)
     unit_price = db.Column(db.Numeric(10, 2), nullable=False)
     total_price = db.Column(db.Numeric(10, 2), nullable=False)
@@ -122,11 +221,13 @@ class ProductReview(db.Model):
     __tablename__ = 'product_reviews'
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'))
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
     rating = db.Column(db.Integer, nullable=False)
     comment = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (db.Index('ix_product_reviews_product_id_created_at', 'product_id', 'created_at'),)
+    
     product = db.relationship('Product', backref='reviews')
     user = db.relationship('User')
 
@@ -137,7 +238,10 @@ class Wishlist(db.Model):
     product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    __table_args__ = (db.UniqueConstraint('user_id', 'product_id'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'product_id'),
+        db.Index('ix_wishlist_product_id', 'product_id'),
+    )
     
     user = db.relationship('User')
     product = db.relationship('Product')
@@ -153,6 +257,10 @@ class ProductComment(db.Model):
     reply_date = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_product_comments_product_id_approved_created_at', 'product_id', 'is_approved', 'created_at'),
+    )
+    
     product = db.relationship('Product')
     user = db.relationship('User')
 
@@ -184,12 +292,84 @@ class PasswordResetToken(db.Model):
     
     user = db.relationship('User')
 
-# Hàm chuyển đổi decimal sang float cho JSON
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, decimal.Decimal):
-            return float(o)
-        return super(DecimalEncoder, self).default(o)
+class RecentlyViewed(db.Model):
+    __tablename__ = 'recently_viewed'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'))
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'))
+    viewed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'product_id'),
+        db.Index('ix_recently_viewed_user_id_viewed_at', 'user_id', 'viewed_at'),
+    )
+
+class StoreCounter(db.Model):
+    __tablename__ = 'store_counters'
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class OrderEvent(db.Model):
+    __tablename__ = 'order_events'
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id', ondelete='CASCADE'))
+    event_type = db.Column(db.String(20), nullable=False)
+    status = db.Column(db.String(20))
+    total_amount = db.Column(db.Numeric(10, 2))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'order_id': self.order_id,
+            'type': self.event_type,
+            'status': self.status,
+            'total_amount': float(self.total_amount or 0),
+            'created_at': self.created_at.strftime('%d/%m/%Y %H:%M')
+        }
+
+class CustomerRFM(db.Model):
+    __tablename__ = 'customer_rfm'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    recency_days = db.Column(db.Integer, nullable=False)
+    frequency = db.Column(db.Integer, nullable=False)
+    monetary = db.Column(db.Numeric(15, 2), nullable=False)
+    r_score = db.Column(db.SmallInteger, nullable=False)
+    f_score = db.Column(db.SmallInteger, nullable=False)
+    m_score = db.Column(db.SmallInteger, nullable=False)
+    segment = db.Column(db.String(20), nullable=False, index=True)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    user = db.relationship('User')
+
+class CustomerCohort(db.Model):
+    __tablename__ = 'customer_cohorts'
+    cohort_month = db.Column(db.String(7), primary_key=True)
+    month_offset = db.Column(db.Integer, primary_key=True)
+    customers = db.Column(db.Integer, nullable=False)
+    retention = db.Column(db.Float, nullable=False)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ProductPairCount(db.Model):
+    __tablename__ = 'product_pair_counts'
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    related_product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+
+class ProductOrderCount(db.Model):
+    __tablename__ = 'product_order_counts'
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+
+class ProductRecommendation(db.Model):
+    __tablename__ = 'product_recommendations'
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    rank = db.Column(db.SmallInteger, primary_key=True)
+    related_product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    
+    related_product = db.relationship('Product', foreign_keys=[related_product_id])
 
 # Hàm gửi email
 def send_email(to_email, subject, html_content):
@@ -208,13 +388,530 @@ def send_email(to_email, subject, html_content):
         server.quit()
         return True
     except Exception as e:
+        APP_ERRORS.labels('email').inc()
         print(f"Error sending email: {str(e)}")
         return False
 
+# ===== BỘ ĐẾM KPI CHO DASHBOARD =====
+
+# Các trạng thái đơn hàng được tính vào doanh thu
+REVENUE_STATUSES = ('completed', 'shipped')
+
+# Thời gian cache KPI trong mỗi worker (giây)
+DASHBOARD_CACHE_TTL = float(os.environ.get('DASHBOARD_CACHE_TTL', 5))
+_dashboard_cache = {'expires': 0, 'data': None}
+
+# Cộng dồn bộ đếm trong transaction hiện tại (commit cùng với thay đổi dữ liệu)
+def bump_counter(name, delta):
+    if not delta:
+        return
+    updated = db.session.query(StoreCounter).filter_by(name=name).update(
+        {StoreCounter.value: StoreCounter.value + delta},
+        synchronize_session=False
+    )
+    if not updated:
+        db.session.add(StoreCounter(name=name, value=delta))
+    _dashboard_cache['expires'] = 0
+
+# Đổi trạng thái đơn hàng và cập nhật doanh thu tương ứng
+def set_order_status(order, new_status):
+    old_status = order.status
+    if old_status == new_status:
+        return
+    was_revenue = old_status in REVENUE_STATUSES
+    is_revenue = new_status in REVENUE_STATUSES
+    if was_revenue != is_revenue:
+        amount = order.total_amount or 0
+        bump_counter('total_revenue', amount if is_revenue else -amount)
+    order.status = new_status
+    order.updated_at = datetime.utcnow()
+    record_order_event(order, 'status_change')
+    
+    # Đơn bị hủy (hoặc được khôi phục) thì trừ khỏi (cộng lại vào) ma trận "thường được mua cùng",
+    # giống rebuild_recommendations chỉ tính các đơn chưa hủy
+    if (old_status == 'cancelled') != (new_status == 'cancelled'):
+        product_ids = order_product_ids(order.id)
+        if new_status == 'cancelled':
+            remove_order_cooccurrence(product_ids)
+        else:
+            record_order_cooccurrence(product_ids)
+        if len(product_ids) > 1:
+            refresh_recommendations(product_ids)
+
+# ===== LUỒNG SỰ KIỆN ĐƠN HÀNG (SSE) =====
+
+# Ghi sự kiện vào log trong cùng transaction với thay đổi đơn hàng
+def record_order_event(order, event_type):
+    db.session.add(OrderEvent(
+        order_id=order.id,
+        event_type=event_type,
+        status=order.status,
+        total_amount=order.total_amount
+    ))
+    db.session.info['order_event_pending'] = True
+
+def fetch_order_events(after_id):
+    with app.app_context():
+        events = OrderEvent.query.filter(OrderEvent.id > after_id).order_by(OrderEvent.id).limit(200).all()
+        return [event.to_dict() for event in events]
+
+def latest_order_event_id():
+    with app.app_context():
+        return db.session.query(db.func.max(OrderEvent.id)).scalar() or 0
+
+order_event_hub = OrderEventHub(
+    fetch_order_events,
+    latest_order_event_id,
+    poll_interval=float(os.environ.get('ORDER_FEED_POLL_INTERVAL', 1)),
+    # Số kết nối SSE tối đa mỗi worker, mặc định theo loại worker gunicorn
+    max_subscribers=int(os.environ.get('ORDER_FEED_MAX_STREAMS', default_max_streams()))
+)
+
+# Sau khi commit có sự kiện mới thì đánh thức hub của worker hiện tại
+@db.event.listens_for(db.session, 'after_commit')
+def wake_order_event_hub(db_session):
+    if db_session.info.pop('order_event_pending', False):
+        order_event_hub.wake()
+
+@db.event.listens_for(db.session, 'after_rollback')
+def clear_order_event_flag(db_session):
+    db_session.info.pop('order_event_pending', None)
+
+# Tính lại toàn bộ bộ đếm từ dữ liệu gốc (dùng khi khởi tạo hoặc đối soát)
+def rebuild_counters():
+    values = {
+        'total_products': Product.query.count(),
+        'total_orders': Order.query.count(),
+        'total_customers': User.query.filter_by(is_admin=False).count(),
+        'total_revenue': db.session.query(db.func.sum(Order.total_amount)).filter(
+            Order.status.in_(REVENUE_STATUSES)
+        ).scalar() or 0
+    }
+    for name, value in values.items():
+        counter = StoreCounter.query.get(name)
+        if counter:
+            counter.value = value
+        else:
+            db.session.add(StoreCounter(name=name, value=value))
+    db.session.commit()
+    _dashboard_cache['expires'] = 0
+
+# Đọc KPI từ bảng bộ đếm, có cache ngắn hạn trong tiến trình
+def get_dashboard_kpis():
+    now = time.monotonic()
+    if _dashboard_cache['data'] is not None and now < _dashboard_cache['expires']:
+        return _dashboard_cache['data']
+    
+    counters = {c.name: c.value for c in StoreCounter.query.all()}
+    data = {
+        'total_products': int(counters.get('total_products', 0)),
+        'total_orders': int(counters.get('total_orders', 0)),
+        'total_customers': int(counters.get('total_customers', 0)),
+        'total_revenue': float(counters.get('total_revenue', 0))
+    }
+    _dashboard_cache['data'] = data
+    _dashboard_cache['expires'] = now + DASHBOARD_CACHE_TTL
+    return data
+
+# ===== GỢI Ý "THƯỜNG ĐƯỢC MUA CÙNG" =====
+
+# Số sản phẩm gợi ý giữ lại cho mỗi sản phẩm và cách chấm điểm ('cosine' hoặc 'lift')
+RECOMMENDATION_TOP_K = int(os.environ.get('RECOMMENDATION_TOP_K', 8))
+RECOMMENDATION_SCORE = os.environ.get('RECOMMENDATION_SCORE', 'cosine')
+RECOMMENDATION_MIN_ORDERS = int(os.environ.get('RECOMMENDATION_MIN_ORDERS', 1))
+
+# Bộ đếm số đơn hàng (chưa hủy) đã cộng vào ma trận, là mẫu số của điểm lift
+RECOMMENDATION_ORDERS_COUNTER = 'recommendation_orders'
+
+def upsert_insert(model):
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
+
+def order_product_ids(order_id):
+    return {product_id for product_id, in db.session.query(ProductVariant.product_id).join(
+        OrderDetail, OrderDetail.product_variant_id == ProductVariant.id
+    ).filter(OrderDetail.order_id == order_id).distinct()}
+
+# Cộng ma trận đồng xuất hiện cho các sản phẩm trong một đơn (trong transaction của đơn hàng)
+def record_order_cooccurrence(product_ids):
+    product_ids = sorted(set(product_ids))
+    if not product_ids:
+        return
+    
+    bump_counter(RECOMMENDATION_ORDERS_COUNTER, 1)
+    stmt = upsert_insert(ProductOrderCount).values([
+        {'product_id': product_id, 'orders': 1} for product_id in product_ids
+    ])
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['product_id'],
+        set_={'orders': ProductOrderCount.orders + 1}
+    ))
+    
+    pairs = [
+        {'product_id': a, 'related_product_id': b, 'orders': 1}
+        for a in product_ids for b in product_ids if a != b
+    ]
+    if pairs:
+        stmt = upsert_insert(ProductPairCount).values(pairs)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['product_id', 'related_product_id'],
+            set_={'orders': ProductPairCount.orders + 1}
+        ))
+
+# Trừ một đơn khỏi ma trận (đơn bị hủy); dòng không còn đơn nào bị xóa như khi xây lại
+def remove_order_cooccurrence(product_ids):
+    product_ids = sorted(set(product_ids))
+    if not product_ids:
+        return
+    
+    bump_counter(RECOMMENDATION_ORDERS_COUNTER, -1)
+    db.session.query(ProductOrderCount).filter(
+        ProductOrderCount.product_id.in_(product_ids)
+    ).update({ProductOrderCount.orders: ProductOrderCount.orders - 1}, synchronize_session=False)
+    db.session.query(ProductOrderCount).filter(
+        ProductOrderCount.product_id.in_(product_ids),
+        ProductOrderCount.orders <= 0
+    ).delete(synchronize_session=False)
+    
+    if len(product_ids) > 1:
+        pairs = db.session.query(ProductPairCount).filter(
+            ProductPairCount.product_id.in_(product_ids),
+            ProductPairCount.related_product_id.in_(product_ids)
+        )
+        pairs.update({ProductPairCount.orders: ProductPairCount.orders - 1}, synchronize_session=False)
+        pairs.filter(ProductPairCount.orders <= 0).delete(synchronize_session=False)
+
+# Tính lại top-K cho các sản phẩm chỉ định từ hàng tương ứng của ma trận thưa
+def refresh_recommendations(product_ids):
+    product_ids = list(set(product_ids))
+    if not product_ids:
+        return
+    
+    if RECOMMENDATION_SCORE == 'lift':
+        counter = db.session.get(StoreCounter, RECOMMENDATION_ORDERS_COUNTER)
+        total_orders = int(counter.value) if counter else 0
+    base_counts = dict(db.session.query(ProductOrderCount.product_id, ProductOrderCount.orders).filter(
+        ProductOrderCount.product_id.in_(product_ids)
+    ).all())
+    
+    neighbours = {}
+    rows = db.session.query(
+        ProductPairCount.product_id,
+        ProductPairCount.related_product_id,
+        ProductPairCount.orders,
+        ProductOrderCount.orders
+    ).join(
+        ProductOrderCount, ProductPairCount.related_product_id == ProductOrderCount.product_id
+    ).filter(
+        ProductPairCount.product_id.in_(product_ids),
+        ProductPairCount.orders >= RECOMMENDATION_MIN_ORDERS
+    )
+    for product_id, related_id, pair_orders, related_orders in rows:
+        base = base_counts.get(product_id) or 1
+        if RECOMMENDATION_SCORE == 'lift':
+            score = pair_orders * total_orders / (base * related_orders)
+        else:
+            score = pair_orders / math.sqrt(base * related_orders)
+        neighbours.setdefault(product_id, []).append((score, pair_orders, related_id))
+    
+    ProductRecommendation.query.filter(
+        ProductRecommendation.product_id.in_(product_ids)
+    ).delete(synchronize_session=False)
+    
+    recommendations = []
+    for product_id, candidates in neighbours.items():
+        top = heapq.nlargest(RECOMMENDATION_TOP_K, candidates)
+        for rank, (score, _, related_id) in enumerate(top):
+            recommendations.append({
+                'product_id': product_id,
+                'rank': rank,
+                'related_product_id': related_id,
+                'score': score
+            })
+    if recommendations:
+        db.session.execute(db.insert(ProductRecommendation), recommendations)
+
+# Xây lại toàn bộ ma trận từ lịch sử đơn hàng (chỉ dùng khi khởi tạo hoặc đối soát)
+def rebuild_recommendations(batch_size=500):
+    basket = db.select(OrderDetail.order_id, ProductVariant.product_id).join(
+        ProductVariant, OrderDetail.product_variant_id == ProductVariant.id
+    ).join(
+        Order, OrderDetail.order_id == Order.id
+    ).where(
+        Order.status != 'cancelled'
+    ).distinct().subquery()
+    left = db.aliased(basket)
+    right = db.aliased(basket)
+    
+    try:
+        ProductRecommendation.query.delete()
+        ProductPairCount.query.delete()
+        ProductOrderCount.query.delete()
+        
+        db.session.execute(db.insert(ProductOrderCount).from_select(
+            ['product_id', 'orders'],
+            db.select(basket.c.product_id, db.func.count()).group_by(basket.c.product_id)
+        ))
+        db.session.execute(db.insert(ProductPairCount).from_select(
+            ['product_id', 'related_product_id', 'orders'],
+            db.select(left.c.product_id, right.c.product_id, db.func.count()).join(
+                right, db.and_(left.c.order_id == right.c.order_id, left.c.product_id != right.c.product_id)
+            ).group_by(left.c.product_id, right.c.product_id)
+        ))
+        order_count = db.session.query(db.func.count(db.distinct(basket.c.order_id))).scalar() or 0
+        counter = db.session.get(StoreCounter, RECOMMENDATION_ORDERS_COUNTER)
+        if counter:
+            counter.value = order_count
+        else:
+            db.session.add(StoreCounter(name=RECOMMENDATION_ORDERS_COUNTER, value=order_count))
+        db.session.flush()
+        
+        # Duyệt theo khóa (product_id > id cuối của lô trước), không giữ cả danh sách trong bộ nhớ
+        last_id = 0
+        while True:
+            product_ids = db.session.scalars(
+                db.select(ProductOrderCount.product_id).where(ProductOrderCount.product_id > last_id)
+                .order_by(ProductOrderCount.product_id).limit(batch_size)
+            ).all()
+            if not product_ids:
+                break
+            refresh_recommendations(product_ids)
+            last_id = product_ids[-1]
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+def recommendations_query(product_id):
+    return db.session.query(ProductRecommendation, Product).join(
+        Product, ProductRecommendation.related_product_id == Product.id
+    ).filter(
+        ProductRecommendation.product_id == product_id,
+        Product.is_active == True
+    ).order_by(ProductRecommendation.rank)
+
+def get_recommendations(product_id):
+    return recommendations_query(product_id).all()
+
+# ===== SẢN PHẨM ĐÃ XEM GẦN ĐÂY =====
+
+# Số sản phẩm giữ lại cho mỗi người dùng
+RECENTLY_VIEWED_LIMIT = int(os.environ.get('RECENTLY_VIEWED_LIMIT', 10))
+
+# Ghi một lô lượt xem: upsert rồi cắt bớt các dòng cũ vượt quá giới hạn. Lượt xem của
+# sản phẩm/người dùng không tồn tại (id sai, đã bị xóa) được bỏ qua để khóa ngoại không
+# làm hỏng cả lô
+def flush_recently_viewed(views):
+    with app.app_context(), write_transaction():
+        product_ids = {product_id for _, product_id, _ in views}
+        user_ids = {user_id for user_id, _, _ in views}
+        product_ids = set(db.session.scalars(db.select(Product.id).where(Product.id.in_(product_ids))))
+        user_ids = set(db.session.scalars(db.select(User.id).where(User.id.in_(user_ids))))
+        rows = [
+            {'user_id': user_id, 'product_id': product_id, 'viewed_at': datetime.utcfromtimestamp(viewed_at)}
+            for user_id, product_id, viewed_at in views
+            if user_id in user_ids and product_id in product_ids
+        ]
+        if not rows:
+            db.session.commit()
+            return
+        stmt = upsert_insert(RecentlyViewed)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['user_id', 'product_id'],
+            set_={'viewed_at': stmt.excluded.viewed_at}
+        ), rows)
+        
+        keep = db.select(RecentlyViewed.id).where(
+            RecentlyViewed.user_id == db.bindparam('uid')
+        ).order_by(RecentlyViewed.viewed_at.desc()).limit(RECENTLY_VIEWED_LIMIT).scalar_subquery()
+        db.session.connection().execute(
+            db.delete(RecentlyViewed).where(
+                RecentlyViewed.user_id == db.bindparam('uid'),
+                RecentlyViewed.id.not_in(keep)
+            ),
+            [{'uid': user_id} for user_id in {row['user_id'] for row in rows}]
+        )
+        db.session.commit()
+
+def recently_viewed_query(user_id, limit):
+    return db.session.query(RecentlyViewed.product_id, RecentlyViewed.viewed_at).filter(
+        RecentlyViewed.user_id == user_id
+    ).order_by(RecentlyViewed.viewed_at.desc()).limit(limit)
+
+def load_recently_viewed(user_id, limit):
+    with app.app_context():
+        rows = recently_viewed_query(user_id, limit).all()
+        return [(product_id, (viewed_at - datetime(1970, 1, 1)).total_seconds()) for product_id, viewed_at in rows]
+
+recently_viewed_buffer = RecentlyViewedBuffer(
+    flush_recently_viewed,
+    load_recently_viewed,
+    max_items=RECENTLY_VIEWED_LIMIT,
+    max_users=int(os.environ.get('RECENTLY_VIEWED_CACHE_USERS', 5000)),
+    flush_interval=float(os.environ.get('RECENTLY_VIEWED_FLUSH_INTERVAL', 5)),
+    max_pending=int(os.environ.get('RECENTLY_VIEWED_MAX_PENDING', 1000)),
+    cache_ttl=float(os.environ.get('RECENTLY_VIEWED_CACHE_TTL', 30))
+)
+
+# ===== ẢNH RESPONSIVE =====
+
+# File có mã băm nội dung trong tên (ảnh đã tối ưu, CSS/JS đã đóng gói) được cache vĩnh viễn
+IMMUTABLE_CACHE_MAX_AGE = 365 * 24 * 3600
+IMAGE_SIZES = '(max-width: 576px) 100vw, (max-width: 992px) 50vw, 25vw'
+
+image_pipeline = ImagePipeline(
+    app.static_folder,
+    os.environ.get('IMAGE_CACHE_DIR', os.path.join(basedir, 'image_cache')),
+    formats=os.environ.get('IMAGE_FORMATS', 'webp').split(','),
+    quality=int(os.environ.get('IMAGE_QUALITY', 80))
+)
+
+# Ảnh mới của sản phẩm/danh mục được xử lý nền sau khi transaction commit
+@db.event.listens_for(Product.image_url, 'set')
+@db.event.listens_for(Category.image_url, 'set')
+def queue_image_processing(target, value, oldvalue, initiator):
+    if value and value != oldvalue:
+        db.session.info.setdefault('pending_images', set()).add(value)
+
+@db.event.listens_for(db.session, 'after_commit')
+def process_pending_images(db_session):
+    for image_url in db_session.info.pop('pending_images', ()):
+        image_pipeline.enqueue(image_url)
+
+@db.event.listens_for(db.session, 'after_rollback')
+def clear_pending_images(db_session):
+    db_session.info.pop('pending_images', None)
+
+def static_image_url(image_url):
+    if image_url.startswith(('/', 'http://', 'https://')):
+        return image_url
+    return url_for('static', filename=image_url)
+
+# Thẻ <picture> với srcset AVIF/WebP và JPEG dự phòng; ảnh chưa xử lý dùng file gốc
+@app.template_global()
+def responsive_image(image_url, alt='', sizes=IMAGE_SIZES, loading='lazy', **attrs):
+    if not image_url:
+        return ''
+    attrs.update(alt=alt, loading=loading, decoding='async')
+    entry = image_pipeline.lookup(image_url)
+    if entry is None:
+        image_pipeline.enqueue(image_url)
+        attrs['src'] = static_image_url(image_url)
+        return Markup('<img %s>' % ' '.join(f'{name}="{escape(value)}"' for name, value in attrs.items()))
+
+    def srcset(fmt):
+        return ', '.join(f"{url_for('optimized_image', filename=filename)} {width}w"
+                         for filename, width in entry['variants'][fmt])
+
+    fallback = entry['variants']['jpeg']
+    # Ảnh mặc định cỡ trung bình cho trình duyệt không hỗ trợ srcset
+    attrs.update(src=url_for('optimized_image', filename=fallback[min(1, len(fallback) - 1)][0]),
+                 srcset=srcset('jpeg'), sizes=sizes, width=entry['width'], height=entry['height'])
+    sources = ''.join(f'<source type="image/{fmt}" srcset="{srcset(fmt)}" sizes="{escape(sizes)}">'
+                      for fmt in entry['variants'] if fmt != 'jpeg')
+    img = '<img %s>' % ' '.join(f'{name}="{escape(value)}"' for name, value in attrs.items())
+    return Markup(f'<picture>{sources}{img}</picture>')
+
+@app.route('/media/<path:filename>')
+def optimized_image(filename):
+    if filename == 'manifest.json':
+        abort(404)
+    response = send_from_directory(image_pipeline.output_dir, filename, max_age=IMMUTABLE_CACHE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+# ===== CSS/JS ĐÃ ĐÓNG GÓI =====
+
+# Sinh bởi bước build (python assets.py); nếu chưa build thì dùng file nguồn trong static/
+asset_manifest = assets.load_manifest(app.static_folder)
+
+@app.template_global()
+def asset_url(source):
+    filename = asset_manifest.get(source)
+    if filename is None or app.debug:
+        return url_for('static', filename=source)
+    return url_for('built_asset', filename=filename)
+
+@app.route('/assets/<path:filename>')
+def built_asset(filename):
+    path = safe_join(os.path.join(app.static_folder, assets.DIST_DIR), filename)
+    if path is None or filename == 'manifest.json' or not os.path.isfile(path):
+        abort(404)
+    # Gửi thẳng bản đã nén sẵn lúc build, không tốn CPU nén lại mỗi request
+    encoding, served_path = assets.precompressed_variant(path, request.accept_encodings)
+    response = send_file(served_path, mimetype=mimetypes.guess_type(filename)[0], max_age=IMMUTABLE_CACHE_MAX_AGE)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+# ===== CHỈ SỐ GIÁM SÁT =====
+
+# Chỉ số lộ tên endpoint, lưu lượng và thời gian truy vấn: /metrics chỉ bật khi đặt
+# METRICS_TOKEN và Prometheus phải gửi header Authorization: Bearer <token>
+@app.route('/metrics')
+def metrics():
+    token = os.environ.get('METRICS_TOKEN')
+    if not token:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        abort(403)
+    return metrics_response()
+
+# ===== PHÂN TÍCH KHÁCH HÀNG (RFM) =====
+
+# Tính lại RFM và cohort từ bảng orders rồi ghi đè bảng kết quả trong một transaction
+def refresh_customer_analytics():
+    user_ids, amounts, timestamps = analytics.load_order_arrays(db.session.connection())
+    now = int(time.time())
+    rfm = analytics.compute_rfm(user_ids, amounts, timestamps, now)
+    cohorts = analytics.compute_cohort_retention(user_ids, timestamps)
+    computed_at = datetime.utcnow()
+    
+    rfm_rows = [
+        {
+            'user_id': int(user_id),
+            'recency_days': int(recency),
+            'frequency': int(frequency),
+            'monetary': float(monetary),
+            'r_score': int(r_score),
+            'f_score': int(f_score),
+            'm_score': int(m_score),
+            'segment': str(segment),
+            'computed_at': computed_at
+        }
+        for user_id, recency, frequency, monetary, r_score, f_score, m_score, segment in zip(
+            rfm['user_id'], rfm['recency_days'], rfm['frequency'], rfm['monetary'],
+            rfm['r_score'], rfm['f_score'], rfm['m_score'], rfm['segment']
+        )
+    ]
+    for row in cohorts:
+        row['computed_at'] = computed_at
+    
+    try:
+        CustomerRFM.query.delete()
+        CustomerCohort.query.delete()
+        if rfm_rows:
+            db.session.execute(db.insert(CustomerRFM), rfm_rows)
+        if cohorts:
+            db.session.execute(db.insert(CustomerCohort), cohorts)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(rfm_rows)
+
 # Khởi tạo database và dữ liệu mẫu
 def init_db():
-    with app.app_context():
+    with app.app_context(), write_transaction():
         db.create_all()
+        run_migrations(db.engine, db.metadata)
         
         # Kiểm tra xem đã có dữ liệu chưa
         if User.query.first() is None:
@@ -431,13 +1128,429 @@ def init_db():
             
             db.session.commit()
             print("Database initialized with sample data!")
+        
+        # Khởi tạo bộ đếm KPI nếu chưa có
+        if StoreCounter.query.get('total_products') is None:
+            rebuild_counters()
+        
+        # Khởi tạo ma trận gợi ý từ các đơn hàng mẫu
+        if ProductOrderCount.query.first() is None and OrderDetail.query.first() is not None:
+            rebuild_recommendations()
+
+# ===== DỮ LIỆU THAM CHIẾU (DANH MỤC, MÀU, SIZE) =====
+
+def load_reference_data():
+    categories = db.session.query(
+        Category.id, Category.name, Category.description, Category.image_url
+    ).order_by(Category.id).all()
+    colors = db.session.query(Color.id, Color.name, Color.hex_code).order_by(Color.id).all()
+    sizes = db.session.query(Size.id, Size.name, Size.description).order_by(Size.id).all()
+    return categories, colors, sizes
+
+def reference_data_version():
+    return db.session.query(StoreCounter.value).filter_by(name='reference_version').scalar() or 0
+
+# Mỗi worker đọc bộ đếm phiên bản tối đa một lần mỗi REFERENCE_CHECK_INTERVAL giây
+reference_data = ReferenceDataCache(
+    load_reference_data,
+    reference_data_version,
+    check_interval=float(os.environ.get('REFERENCE_CHECK_INTERVAL', 1))
+)
+
+REFERENCE_MODELS = (Category, Color, Size)
+
+# Tăng một bộ đếm phiên bản (tạo dòng nếu chưa có) trên connection của transaction hiện tại
+def bump_version_counter(connection, name):
+    statement = upsert_insert(StoreCounter).values(name=name, value=1)
+    connection.execute(statement.on_conflict_do_update(
+        index_elements=[StoreCounter.name],
+        set_={'value': StoreCounter.value + 1, 'updated_at': datetime.utcnow()}
+    ))
+
+# Mọi thay đổi danh mục/màu/size qua ORM tăng bộ đếm phiên bản trong cùng transaction
+@db.event.listens_for(db.session, 'after_flush')
+def bump_reference_version(db_session, flush_context):
+    changed = db_session.new | db_session.dirty | db_session.deleted
+    if not any(isinstance(obj, REFERENCE_MODELS) for obj in changed):
+        return
+    bump_version_counter(db_session.connection(), 'reference_version')
+    db_session.info['reference_data_changed'] = True
+
+@db.event.listens_for(db.session, 'after_commit')
+def invalidate_reference_data(db_session):
+    if db_session.info.pop('reference_data_changed', False):
+        reference_data.invalidate()
+
+@db.event.listens_for(db.session, 'after_rollback')
+def clear_reference_data_flag(db_session):
+    db_session.info.pop('reference_data_changed', None)
+
+# ===== KHÓA SẮP XẾP SẢN PHẨM =====
+
+# Phiên bản danh mục sản phẩm: tăng trong cùng transaction với mọi thay đổi làm đổi nội dung
+# hoặc thứ tự trang danh sách (sản phẩm, khóa sắp xếp), dùng làm validator cho /products
+CATALOG_VERSION_COUNTER = 'catalog_version'
+
+# Các kiểu sắp xếp của trang danh sách; id luôn là khóa phụ để thứ tự ổn định và
+# trùng với cột cuối của chỉ mục (quét ngược chỉ mục cho thứ tự giảm dần)
+PRODUCT_SORTS = {
+    'newest': (Product.created_at.desc(), Product.id.desc()),
+    'price_asc': (Product.min_price.asc(), Product.id.asc()),
+    'price_desc': (Product.min_price.desc(), Product.id.desc()),
+    'rating': (Product.avg_rating.desc(), Product.review_count.desc(), Product.id.desc()),
+    'best_selling': (Product.sold_count.desc(), Product.id.desc()),
+}
+
+# Truy vấn trang danh sách: lọc theo danh mục, tên, giá khách thực trả (giá thấp nhất của
+# các biến thể) và sắp xếp theo PRODUCT_SORTS. Khi sắp xếp theo khóa khác giá, điều kiện
+# giá được viết dạng min_price + 0 để planner duyệt chỉ mục của khóa sắp xếp và lọc giá
+# trong lúc duyệt, thay vì lấy khoảng giá qua chỉ mục min_price rồi sắp xếp lại kết quả.
+def product_listing_query(category_id=None, search_term='', min_price=None, max_price=None, sort='newest'):
+    query = Product.query.filter_by(is_active=True)
+    
+    if category_id:
+        query = query.filter_by(category_id=category_id)
+    
+    if search_term:
+        query = query.filter(Product.name.contains(search_term))
+    
+    price = Product.min_price if sort in ('price_asc', 'price_desc') else Product.min_price + 0
+    if min_price:
+        query = query.filter(price >= min_price)
+    
+    if max_price:
+        query = query.filter(price <= max_price)
+    
+    return query.order_by(*PRODUCT_SORTS[sort])
+
+def product_price_key():
+    return db.func.coalesce(
+        db.select(db.func.min(ProductVariant.price)).where(ProductVariant.product_id == Product.id).scalar_subquery(),
+        Product.base_price
+    )
+
+def product_rating_keys():
+    return {
+        'avg_rating': db.func.coalesce(
+            db.select(db.func.avg(ProductReview.rating)).where(ProductReview.product_id == Product.id).scalar_subquery(), 0
+        ),
+        'review_count': db.select(db.func.count(ProductReview.id)).where(
+            ProductReview.product_id == Product.id
+        ).scalar_subquery(),
+    }
+
+# Tính lại toàn bộ khóa sắp xếp từ dữ liệu gốc (sau khi nạp dữ liệu hàng loạt không qua ORM).
+# Khóa sắp xếp là dữ liệu dẫn xuất: giữ nguyên updated_at (cột có onupdate) để bán hàng,
+# đổi tồn kho hay đánh giá không làm sản phẩm trông như vừa được sửa.
+def rebuild_product_sort_keys():
+    sold = db.select(db.func.sum(OrderDetail.quantity)).join(
+        ProductVariant, OrderDetail.product_variant_id == ProductVariant.id
+    ).where(ProductVariant.product_id == Product.id).scalar_subquery()
+    db.session.execute(
+        db.update(Product).values(min_price=product_price_key(), sold_count=db.func.coalesce(sold, 0),
+                                  updated_at=Product.updated_at, **product_rating_keys()),
+        execution_options={'synchronize_session': False}
+    )
+    bump_version_counter(db.session.connection(), CATALOG_VERSION_COUNTER)
+    db.session.commit()
+
+def attribute_history(obj, name):
+    return db.inspect(obj).attrs[name].history
+
+# Cập nhật khóa sắp xếp trong cùng transaction với thay đổi: giá thấp nhất khi sản phẩm mới,
+# giá gốc đổi hoặc biến thể được thêm/xóa/đổi giá (không tính khi chỉ đổi tồn kho), điểm
+# đánh giá khi có đánh giá mới, số đã bán cộng dồn theo chi tiết đơn hàng mới
+@db.event.listens_for(db.session, 'after_flush')
+def refresh_product_sort_keys(db_session, flush_context):
+    price_ids, rating_ids, sold_by_variant = set(), set(), {}
+    products_changed = False
+    for obj in db_session.new | db_session.dirty | db_session.deleted:
+        if isinstance(obj, Product):
+            products_changed = True
+            if obj in db_session.new or (obj not in db_session.deleted
+                                         and attribute_history(obj, 'base_price').has_changes()):
+                price_ids.add(obj.id)
+        elif isinstance(obj, ProductVariant):
+            if obj in db_session.new or obj in db_session.deleted:
+                price_ids.add(obj.product_id)
+            elif attribute_history(obj, 'price').has_changes():
+                price_ids.add(obj.product_id)
+            moved = attribute_history(obj, 'product_id')
+            if moved.has_changes():
+                price_ids.update(moved.added)
+                price_ids.update(moved.deleted)
+        elif isinstance(obj, ProductReview):
+            rating_ids.add(obj.product_id)
+        elif isinstance(obj, OrderDetail) and obj in db_session.new:
+            sold_by_variant[obj.product_variant_id] = sold_by_variant.get(obj.product_variant_id, 0) + obj.quantity
+    if not (products_changed or price_ids or rating_ids or sold_by_variant):
+        return
+    
+    connection = db_session.connection()
+    bump_version_counter(connection, CATALOG_VERSION_COUNTER)
+    price_ids.discard(None)
+    rating_ids.discard(None)
+    if price_ids:
+        connection.execute(db.update(Product).where(Product.id.in_(price_ids)).values(
+            min_price=product_price_key(), updated_at=Product.updated_at
+        ))
+    if rating_ids:
+        connection.execute(db.update(Product).where(Product.id.in_(rating_ids)).values(
+            updated_at=Product.updated_at, **product_rating_keys()
+        ))
+    if sold_by_variant:
+        sold_by_product = {}
+        for variant_id, product_id in connection.execute(
+            db.select(ProductVariant.id, ProductVariant.product_id).where(ProductVariant.id.in_(sold_by_variant))
+        ):
+            sold_by_product[product_id] = sold_by_product.get(product_id, 0) + sold_by_variant[variant_id]
+        products = Product.__table__
+        connection.execute(
+            products.update().where(products.c.id == db.bindparam('product')).values(
+                sold_count=products.c.sold_count + db.bindparam('quantity'), updated_at=products.c.updated_at
+            ),
+            [{'product': product_id, 'quantity': quantity} for product_id, quantity in sold_by_product.items()]
+        )
+
+# ===== GỢI Ý TÌM KIẾM =====
+
+# Sản phẩm cho chỉ mục gợi ý, độ phổ biến là số lượng đã bán; since=None: toàn bộ sản phẩm
+# đang bán, ngược lại các sản phẩm có updated_at từ mốc đó (kể cả sản phẩm đã ẩn)
+def load_suggestion_products(since):
+    with app.app_context():
+        query = db.session.query(
+            Product.id, Product.name, Product.category_id, Product.sold_count, Product.is_active, Product.updated_at
+        )
+        if since is None:
+            query = query.filter(Product.is_active == True)
+        else:
+            query = query.filter(Product.updated_at >= since)
+        return query.all()
+
+def load_suggestion_categories():
+    with app.app_context():
+        return [(category.id, category.name) for category in reference_data.get().categories]
+
+# Chỉ mục dựng lúc khởi động (master khi chạy gunicorn --preload), mỗi worker áp dụng thay
+# đổi sau mỗi SEARCH_SUGGEST_REFRESH giây và dựng lại toàn bộ sau SEARCH_SUGGEST_REBUILD giây
+search_suggestions = SearchSuggestions(
+    load_suggestion_products,
+    load_suggestion_categories,
+    refresh_interval=float(os.environ.get('SEARCH_SUGGEST_REFRESH', 30)),
+    rebuild_interval=float(os.environ.get('SEARCH_SUGGEST_REBUILD', 3600))
+)
+
+# Sản phẩm thay đổi trong worker này: cập nhật chỉ mục ngay sau commit, không chờ chu kỳ
+@db.event.listens_for(db.session, 'after_flush')
+def track_suggestion_changes(db_session, flush_context):
+    products = [obj for obj in db_session.new | db_session.dirty | db_session.deleted if isinstance(obj, Product)]
+    if products:
+        changes = db_session.info.setdefault('suggestion_changes', set())
+        changes.update(obj.id for obj in products if obj in db_session.deleted)
+        db_session.info['suggestions_changed'] = True
+
+@db.event.listens_for(db.session, 'after_commit')
+def refresh_search_suggestions(db_session):
+    if db_session.info.pop('suggestions_changed', False):
+        search_suggestions.changed(db_session.info.pop('suggestion_changes', ()))
+
+@db.event.listens_for(db.session, 'after_rollback')
+def clear_suggestion_changes(db_session):
+    db_session.info.pop('suggestions_changed', None)
+    db_session.info.pop('suggestion_changes', None)
+
+# ===== TỒN KHO BIẾN THỂ =====
+
+# Tồn kho, giá và thông tin hiển thị của nhiều biến thể trong một truy vấn
+def load_variant_stock(variant_ids):
+    rows = db.session.query(
+        ProductVariant.id.label('variant_id'),
+        ProductVariant.product_id,
+        Product.name.label('product_name'),
+        Product.image_url,
+        Color.name.label('color'),
+        Size.name.label('size'),
+        ProductVariant.price,
+        ProductVariant.stock_quantity
+    ).join(
+        Product, ProductVariant.product_id == Product.id
+    ).outerjoin(
+        Color, ProductVariant.color_id == Color.id
+    ).outerjoin(
+        Size, ProductVariant.size_id == Size.id
+    ).filter(
+        ProductVariant.id.in_(variant_ids)
+    ).all()
+    return {row.variant_id: row for row in rows}
+
+# Số liệu trong cache có thể cũ tối đa STOCK_CACHE_TTL giây ở các worker khác; worker
+# ghi thay đổi bỏ mục của mình ngay sau commit. Chỉ dùng cho endpoint polling chỉ đọc
+# /stock_availability: các route thêm/cập nhật giỏ hàng kiểm tra tồn kho bằng
+# current_variant_stock vì đó là lần kiểm tra duy nhất chống bán vượt tồn kho.
+variant_stock = StockCache(
+    load_variant_stock,
+    ttl=float(os.environ.get('STOCK_CACHE_TTL', 2)),
+    max_entries=int(os.environ.get('STOCK_CACHE_SIZE', 50000))
+)
+STOCK_BATCH_LIMIT = 200
+
+def current_variant_stock(variant_id):
+    return load_variant_stock([variant_id]).get(variant_id)
+
+@db.event.listens_for(db.session, 'after_flush')
+def track_stock_changes(db_session, flush_context):
+    variant_ids = [obj.id for obj in db_session.new | db_session.dirty | db_session.deleted
+                   if isinstance(obj, ProductVariant)]
+    if variant_ids:
+        db_session.info.setdefault('stock_changes', set()).update(variant_ids)
+
+@db.event.listens_for(db.session, 'after_commit')
+def invalidate_variant_stock(db_session):
+    variant_stock.invalidate(db_session.info.pop('stock_changes', ()))
+
+@db.event.listens_for(db.session, 'after_rollback')
+def clear_stock_changes(db_session):
+    db_session.info.pop('stock_changes', None)
+
+# ===== DỮ LIỆU CHO TRANG VÀ API (GIỎ HÀNG, BIẾN THỂ) =====
+# Các hàm thuần Python chạy trong mỗi request, đo bằng benchmarks/bench_hot_paths.py
+
+def cart_total(cart):
+    return sum(item['price'] * item['quantity'] for item in cart)
+
+def cart_item_count(cart):
+    return sum(item['quantity'] for item in cart)
+
+# Tổ chức các biến thể theo màu sắc và kích thước
+def build_variant_options(variants):
+    colors = {}
+    sizes = {}
+    variants_map = {}
+    
+    for variant in variants:
+        color_id = variant.color_id
+        size_id = variant.size_id
+        
+        if color_id not in colors:
+            colors[color_id] = {'id': color_id, 'name': variant.color.name}
+        
+        if size_id not in sizes:
+            sizes[size_id] = {'id': size_id, 'name': variant.size.name}
+        
+        key = f"{color_id}_{size_id}"
+        variants_map[key] = {
+            'variant_id': variant.id,
+            'quantity': variant.stock_quantity,
+            'price': variant.price
+        }
+    
+    return list(colors.values()), list(sizes.values()), variants_map
+
+# ===== CONDITIONAL GET (ETAG / LAST-MODIFIED) =====
+
+# Phiên bản giao diện: đổi template hoặc CSS/JS thì ETag của mọi trang HTML cũng đổi
+def compute_template_version():
+    digest = hashlib.sha1(json.dumps(asset_manifest, sort_keys=True).encode())
+    for name in sorted(app.jinja_env.list_templates()):
+        source = app.jinja_loader.get_source(app.jinja_env, name)[0]
+        digest.update(name.encode() + source.encode())
+    return digest.hexdigest()
+
+TEMPLATE_VERSION = compute_template_version()
+
+def is_not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is None or request.if_modified_since is None:
+        return False
+    return last_modified.replace(microsecond=0, tzinfo=timezone.utc) <= request.if_modified_since
+
+# Trả 304 khi validator (tính từ vài truy vấn tổng hợp rẻ) khớp với bản client đang giữ,
+# không truy vấn đầy đủ và không render. validators(*args) trả về (các giá trị, last_modified)
+# hoặc None để bỏ qua. Trang HTML (private) còn phụ thuộc phiên: người dùng, giỏ hàng, chế độ tối.
+def conditional(validators, private=False):
+    def decorator(f):
+        def decorated_function(*args, **kwargs):
+            result = validators(*args, **kwargs)
+            if result is None or (private and session.get('_flashes')):
+                return f(*args, **kwargs)
+            parts, last_modified = result
+            if private:
+                parts = (parts, TEMPLATE_VERSION, session.get('user_id'), session.get('is_admin'),
+                         session.get('dark_mode'), session.get('cart'))
+            etag = hashlib.sha1(repr(parts).encode()).hexdigest()
+            
+            if is_not_modified(etag, last_modified):
+                response = Response(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            # no-cache: được lưu nhưng phải hỏi lại server (rẻ nhờ 304) trước mỗi lần dùng
+            response.headers['Cache-Control'] = 'private, no-cache' if private else 'public, no-cache'
+            return response
+        
+        decorated_function.__name__ = f.__name__
+        return decorated_function
+    return decorator
+
+def latest(*values):
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+# Trang danh sách chỉ phụ thuộc sản phẩm (kể cả khóa sắp xếp) và danh mục: đọc hai bộ đếm
+# phiên bản theo khóa chính thay vì tổng hợp cả bảng products
+def products_validators():
+    counters = db.session.query(StoreCounter.name, StoreCounter.value, StoreCounter.updated_at).filter(
+        StoreCounter.name.in_((CATALOG_VERSION_COUNTER, 'reference_version'))
+    ).all()
+    versions = {name: str(value) for name, value, _ in counters}
+    return ((versions.get(CATALOG_VERSION_COUNTER), versions.get('reference_version')),
+            latest(*(updated_at for _, _, updated_at in counters)))
+
+def product_detail_validators(product_id):
+    product = db.session.query(Product.updated_at).filter(Product.id == product_id).first()
+    if product is None:
+        return None
+    # Tồn kho/giá biến thể không có cột thời gian: dùng tổng làm phiên bản
+    variants = db.session.query(
+        db.func.count(ProductVariant.id), db.func.sum(ProductVariant.stock_quantity), db.func.sum(ProductVariant.price)
+    ).filter(ProductVariant.product_id == product_id).one()
+    reviews = db.session.query(
+        db.func.count(ProductReview.id), db.func.max(ProductReview.id)
+    ).filter(ProductReview.product_id == product_id).one()
+    recommendations = db.session.query(
+        db.func.count(), db.func.sum(ProductRecommendation.related_product_id * (ProductRecommendation.rank + 1))
+    ).filter(ProductRecommendation.product_id == product_id).one()
+    return (str(product.updated_at), tuple(map(str, variants)), tuple(reviews), tuple(recommendations)), None
+
+def get_reviews_validators(product_id):
+    count, total_ids, created_at, user_updated_at = db.session.query(
+        db.func.count(ProductReview.id), db.func.sum(ProductReview.id),
+        db.func.max(ProductReview.created_at), db.func.max(User.updated_at)
+    ).join(User, ProductReview.user_id == User.id).filter(ProductReview.product_id == product_id).one()
+    return (count, total_ids, str(created_at), str(user_updated_at)), latest(created_at, user_updated_at)
+
+def get_comments_validators(product_id):
+    count, total_ids, created_at, reply_date, user_updated_at = db.session.query(
+        db.func.count(ProductComment.id), db.func.sum(ProductComment.id), db.func.max(ProductComment.created_at),
+        db.func.max(ProductComment.reply_date), db.func.max(User.updated_at)
+    ).join(User, ProductComment.user_id == User.id).filter(
+        ProductComment.product_id == product_id,
+        ProductComment.is_approved == True
+    ).one()
+    return ((count, total_ids, str(created_at), str(reply_date), str(user_updated_at)),
+            latest(created_at, reply_date, user_updated_at))
 
 # Routes
 
 # Trang chủ
 @app.route('/')
 def home():
-    categories = Category.query.all()
+    categories = reference_data.get().categories
     featured_products = Product.query.filter_by(is_active=True).limit(8).all()
     
     # Lấy sản phẩm bán chạy (giả lập)
@@ -450,6 +1563,7 @@ def home():
 
 # Trang danh sách sản phẩm
 @app.route('/products')
+@conditional(products_validators, private=True)
 def products():
     category_id = request.args.get('category', type=int)
     search_term = request.args.get('search', '')
@@ -457,28 +1571,14 @@ def products():
     max_price = request.args.get('max_price', type=float)
     color_id = request.args.get('color', type=int)
     size_id = request.args.get('size', type=int)
+    sort = request.args.get('sort', 'newest')
+    if sort not in PRODUCT_SORTS:
+        sort = 'newest'
     
-    categories = Category.query.all()
-    colors = Color.query.all()
-    sizes = Size.query.all()
+    reference = reference_data.get()
+    categories, colors, sizes = reference.categories, reference.colors, reference.sizes
     
-    # Tạo query cơ bản
-    query = Product.query.filter_by(is_active=True)
-    
-    # Áp dụng các bộ lọc
-    if category_id:
-        query = query.filter_by(category_id=category_id)
-    
-    if search_term:
-        query = query.filter(Product.name.contains(search_term))
-    
-    if min_price:
-        query = query.filter(Product.base_price >= min_price)
-    
-    if max_price:
-        query = query.filter(Product.base_price <= max_price)
-    
-    products = query.all()
+    products = product_listing_query(category_id, search_term, min_price, max_price, sort).all()
     
     return render_template('products.html', 
                           products=products, 
@@ -486,55 +1586,134 @@ def products():
                           colors=colors,
                           sizes=sizes,
                           current_category=category_id,
+                          current_sort=sort,
                           search_term=search_term)
 
+def product_variants_query(product_id):
+    return ProductVariant.query.filter_by(product_id=product_id)
+
+def product_reviews_query(product_id):
+    return ProductReview.query.filter_by(product_id=product_id)
+
 # Trang chi tiết sản phẩm
 @app.route('/product/<int:product_id>')
+@conditional(product_detail_validators, private=True)
 def product_detail(product_id):
     product = Product.query.get_or_404(product_id)
     
     # Lấy các biến thể của sản phẩm
-    variants = ProductVariant.query.filter_by(product_id=product_id).all()
-    
-    # Tổ chức các biến thể theo màu sắc và kích thước
-    colors = {}
-    sizes = {}
-    variants_map = {}
+    variants = product_variants_query(product_id).all()
     
-    for variant in variants:
-        color_id = variant.color_id
-        size_id = variant.size_id
-        
-        if color_id not in colors:
-            colors[color_id] = {'id': color_id, 'name': variant.color.name}
-        
-        if size_id not in sizes:
-            sizes[size_id] = {'id': size_id, 'name': variant.size.name}
-        
-        key = f"{color_id}_{size_id}"
-        variants_map[key] = {
-            'variant_id': variant.id,
-            'quantity': variant.stock_quantity,
-            'price': float(variant.price)
-        }
+    colors, sizes, variants_map = build_variant_options(variants)
     
     # Lấy đánh giá sản phẩm
-    reviews = ProductReview.query.filter_by(product_id=product_id).all()
+    reviews = product_reviews_query(product_id).all()
     
     # Tính rating breakdown
     rating_breakdown = {i: 0 for i in range(1, 6)}
     for review in reviews:
         rating_breakdown[review.rating] += 1
     
+    # Sản phẩm thường được mua cùng (đọc top-K đã tính sẵn)
+    related_products = [related for _, related in get_recommendations(product_id)]
+    
     return render_template('product_detail.html', 
                           product=product,
+                          related_products=related_products,
                           original_price=float(product.base_price) * 1.2,
-                          colors=list(colors.values()),
-                          sizes=list(sizes.values()),
+                          colors=colors,
+                          sizes=sizes,
                           variants=variants_map,
                           rating_breakdown=rating_breakdown,
                           reviews=reviews)
 
+# Ghi nhận lượt xem sản phẩm (chỉ ghi vào bộ đệm, database được cập nhật theo lô)
+@app.route('/track_product_view', methods=['POST'])
+def track_product_view():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Vui lòng đăng nhập'})
+    
+    product_id = request.form.get('product_id', type=int)
+    if not product_id:
+        return jsonify({'success': False, 'message': 'Dữ liệu không hợp lệ'})
+    
+    recently_viewed_buffer.record(session['user_id'], product_id)
+    return jsonify({'success': True})
+
+# Gợi ý cho ô tìm kiếm theo tiền tố đang gõ (không dấu vẫn khớp): sản phẩm và danh mục
+@app.route('/search_suggestions')
+def get_search_suggestions():
+    limit = max(1, min(request.args.get('limit', 8, type=int), search_suggestions.top_k))
+    products, categories = search_suggestions.suggest(request.args.get('q', '')[:100], limit)
+    response = jsonify({
+        'products': [{'id': product_id, 'name': name, 'url': url_for('product_detail', product_id=product_id)}
+                     for product_id, name in products],
+        'categories': [{'id': category_id, 'name': name, 'url': url_for('products', category=category_id)}
+                       for category_id, name in categories]
+    })
+    response.cache_control.public = True
+    response.cache_control.max_age = 60
+    return response
+
+# Tồn kho và giá hiện tại của nhiều biến thể (trang giỏ hàng và chi tiết sản phẩm gọi định
+# kỳ): ?ids=1,2,3, tối đa STOCK_BATCH_LIMIT biến thể mỗi lần
+@app.route('/stock_availability')
+def stock_availability():
+    variant_ids = []
+    for part in request.args.get('ids', '').split(','):
+        part = part.strip()
+        # isdecimal: isdigit() nhận cả ký tự như '²' mà int() không đọc được
+        if part.isdecimal() and int(part) not in variant_ids:
+            variant_ids.append(int(part))
+            if len(variant_ids) >= STOCK_BATCH_LIMIT:
+                break
+    
+    found = variant_stock.get_many(variant_ids)
+    response = jsonify({
+        'variants': [{
+            'variant_id': variant_id,
+            'stock_quantity': found[variant_id].stock_quantity,
+            'price': found[variant_id].price,
+            'available': found[variant_id].stock_quantity > 0
+        } for variant_id in variant_ids if variant_id in found],
+        'missing': [variant_id for variant_id in variant_ids if variant_id not in found]
+    })
+    response.cache_control.public = True
+    response.cache_control.max_age = max(1, int(variant_stock.ttl))
+    return response
+
+# Lấy danh sách sản phẩm đã xem gần đây
+@app.route('/get_recently_viewed')
+def get_recently_viewed():
+    if 'user_id' not in session:
+        return jsonify({'success': True, 'products': []})
+    
+    product_ids = recently_viewed_buffer.get(session['user_id'])
+    if not product_ids:
+        return jsonify({'success': True, 'products': []})
+    
+    rows = db.session.query(Product, Category.name).outerjoin(
+        Category, Product.category_id == Category.id
+    ).filter(
+        Product.id.in_(product_ids),
+        Product.is_active == True
+    ).all()
+    by_id = {product.id: (product, category_name) for product, category_name in rows}
+    
+    result = []
+    for product_id in product_ids:
+        if product_id in by_id:
+            product, category_name = by_id[product_id]
+            result.append({
+                'product_id': product.id,
+                'product_name': product.name,
+                'category_name': category_name,
+                'price': product.base_price,
+                'image_url': product.image_url
+            })
+    
+    return jsonify({'success': True, 'products': result})
+
 # Thêm vào giỏ hàng
 @app.route('/add_to_cart', methods=['POST'])
 def add_to_cart():
@@ -545,8 +1724,10 @@ def add_to_cart():
         flash('Vui lòng chọn màu sắc và kích thước', 'error')
         return redirect(request.referrer)
     
-    # Kiểm tra số lượng tồn kho
-    variant = ProductVariant.query.get_or_404(variant_id)
+    # Kiểm tra số lượng tồn kho (đọc thẳng database, không qua cache)
+    variant = current_variant_stock(variant_id)
+    if variant is None:
+        abort(404)
     
     if variant.stock_quantity < quantity:
         flash(f'Chỉ còn {variant.stock_quantity} sản phẩm trong kho', 'error')
@@ -571,12 +1752,12 @@ def add_to_cart():
         cart.append({
             'variant_id': variant_id,
             'product_id': variant.product_id,
-            'product_name': variant.product.name,
+            'product_name': variant.product_name,
             'price': float(variant.price),
-            'color': variant.color.name,
-            'size': variant.size.name,
+            'color': variant.color,
+            'size': variant.size,
             'quantity': quantity,
-            'image_url': variant.product.image_url
+            'image_url': variant.image_url
         })
     
     session['cart'] = cart
@@ -587,7 +1768,7 @@ def add_to_cart():
 @app.route('/cart')
 def view_cart():
     cart = session.get('cart', [])
-    total = sum(item['price'] * item['quantity'] for item in cart)
+    total = cart_total(cart)
     
     return render_template('cart.html', cart=cart, total=total)
 
@@ -601,8 +1782,10 @@ def buy_now():
         flash('Vui lòng chọn màu sắc và kích thước', 'error')
         return redirect(request.referrer)
     
-    # Kiểm tra số lượng tồn kho
-    variant = ProductVariant.query.get_or_404(variant_id)
+    # Kiểm tra số lượng tồn kho (đọc thẳng database, không qua cache)
+    variant = current_variant_stock(variant_id)
+    if variant is None:
+        abort(404)
     
     if variant.stock_quantity < quantity:
         flash(f'Chỉ còn {variant.stock_quantity} sản phẩm trong kho', 'error')
@@ -612,12 +1795,12 @@ def buy_now():
     temp_cart = [{
         'variant_id': variant_id,
         'product_id': variant.product_id,
-        'product_name': variant.product.name,
+        'product_name': variant.product_name,
         'price': float(variant.price),
-        'color': variant.color.name,
-        'size': variant.size.name,
+        'color': variant.color,
+        'size': variant.size,
         'quantity': quantity,
-        'image_url': variant.product.image_url
+        'image_url': variant.image_url
     }]
     
     # Lưu giỏ hàng tạm thời vào session
@@ -635,8 +1818,8 @@ def update_cart():
     if not variant_id or quantity < 1:
         return jsonify({'success': False, 'message': 'Dữ liệu không hợp lệ'})
     
-    # Kiểm tra số lượng tồn kho
-    variant = ProductVariant.query.get(variant_id)
+    # Kiểm tra số lượng tồn kho (đọc thẳng database, không qua cache)
+    variant = current_variant_stock(variant_id)
     if not variant or variant.stock_quantity < quantity:
         return jsonify({'success': False, 'message': f'Chỉ còn {variant.stock_quantity if variant else 0} sản phẩm trong kho'})
     
@@ -648,7 +1831,7 @@ def update_cart():
             break
     
     session['cart'] = cart
-    total = sum(item['price'] * item['quantity'] for item in cart)
+    total = cart_total(cart)
     
     return jsonify({
         'success': True, 
@@ -669,7 +1852,7 @@ def remove_from_cart():
     cart = [item for item in cart if item['variant_id'] != variant_id]
     session['cart'] = cart
     
-    total = sum(item['price'] * item['quantity'] for item in cart)
+    total = cart_total(cart)
     
     return jsonify({
         'success': True, 
@@ -707,7 +1890,7 @@ def checkout():
             return redirect(url_for('checkout'))
         
         # Tạo đơn hàng mới
-        total_amount = sum(item['price'] * item['quantity'] for item in cart)
+        total_amount = cart_total(cart)
         
         order = Order(
             user_id=session['user_id'],
@@ -718,7 +1901,11 @@ def checkout():
         db.session.add(order)
         db.session.flush()  # Để lấy order.id
         
-        # Thêm chi tiết đơn hàng
+        # Thêm chi tiết đơn hàng; các biến thể cần trừ kho được nạp bằng một truy vấn
+        variants = {variant.id: variant for variant in ProductVariant.query.filter(
+            ProductVariant.id.in_([item['variant_id'] for item in cart])
+        )}
+        ordered_product_ids = set()
         for item in cart:
             detail = OrderDetail(
                 order_id=order.id,
@@ -730,12 +1917,26 @@ def checkout():
             db.session.add(detail)
             
             # Cập nhật số lượng tồn kho
-            variant = ProductVariant.query.get(item['variant_id'])
+            variant = variants.get(item['variant_id'])
             if variant:
                 variant.stock_quantity -= item['quantity']
+                ordered_product_ids.add(variant.product_id)
         
+        bump_counter('total_orders', 1)
+        record_order_event(order, 'new_order')
+        record_order_cooccurrence(ordered_product_ids)
         db.session.commit()
         
+        # Cập nhật gợi ý cho các sản phẩm vừa được mua (không ảnh hưởng đơn hàng nếu lỗi)
+        if len(ordered_product_ids) > 1:
+            try:
+                refresh_recommendations(ordered_product_ids)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                APP_ERRORS.labels('recommendations').inc()
+                print(f"Error refreshing recommendations: {str(e)}")
+        
         # Xóa giỏ hàng sau khi đặt hàng thành công
         if buy_now and 'temp_cart' in session:
             session.pop('temp_cart', None)
@@ -746,7 +1947,7 @@ def checkout():
         return redirect(url_for('order_confirmation', order_id=order.id))
     
     # Tính tổng tiền
-    total = sum(item['price'] * item['quantity'] for item in cart)
+    total = cart_total(cart)
     
     # Nếu đã đăng nhập, lấy thông tin địa chỉ của khách hàng
     address = ''
@@ -771,6 +1972,13 @@ def order_confirmation(order_id):
     
     return render_template('order_confirmation.html', order=order)
 
+# Cấp id phiên mới khi quyền đổi (đăng nhập, đăng ký, đăng xuất) để id phiên bị lộ trước đó
+# không dùng được nữa (session fixation); cookie ký của Flask không có id phiên nên bỏ qua
+def regenerate_session():
+    regenerate = getattr(session, 'regenerate', None)
+    if regenerate is not None:
+        regenerate()
+
 # Trang đăng nhập
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -789,6 +1997,7 @@ def login():
             return redirect(url_for('login'))
         
         # Lưu thông tin đăng nhập vào session
+        regenerate_session()
         session['user_id'] = user.id
         session['user_name'] = user.full_name
         session['dark_mode'] = user.dark_mode
@@ -818,14 +2027,14 @@ def register():
             flash('Vui lòng điền đầy đủ thông tin bắt buộc', 'error')
             return redirect(url_for('register'))
         
+        # Mã hóa mật khẩu trước khi mở transaction để không giữ khóa ghi trong lúc băm
+        hashed_password = generate_password_hash(password)
+        
         # Kiểm tra email đã tồn tại
         if User.query.filter_by(email=email).first():
             flash('Email đã được sử dụng, vui lòng chọn email khác', 'error')
             return redirect(url_for('register'))
         
-        # Mã hóa mật khẩu
-        hashed_password = generate_password_hash(password)
-        
         # Tạo người dùng mới
         user = User(
             username=email.split('@')[0],  # Sử dụng phần trước @ làm username
@@ -838,9 +2047,11 @@ def register():
         
         try:
             db.session.add(user)
+            bump_counter('total_customers', 1)
             db.session.commit()
             
             # Đăng nhập tự động sau khi đăng ký
+            regenerate_session()
             session['user_id'] = user.id
             session['user_name'] = user.full_name
             session['dark_mode'] = user.dark_mode
@@ -860,9 +2071,13 @@ def register():
 @app.route('/logout')
 def logout():
     session.clear()
+    regenerate_session()
     flash('Đã đăng xuất thành công', 'success')
     return redirect(url_for('home'))
 
+def customer_orders_query(user_id):
+    return Order.query.filter_by(user_id=user_id).order_by(Order.created_at.desc())
+
 # Trang tài khoản của tôi
 @app.route('/my_account')
 def my_account():
@@ -870,7 +2085,7 @@ def my_account():
         return redirect(url_for('login'))
     
     user = User.query.get(session['user_id'])
-    orders = Order.query.filter_by(user_id=session['user_id']).order_by(Order.created_at.desc()).all()
+    orders = customer_orders_query(session['user_id']).all()
     
     return render_template('my_account.html', customer=user, orders=orders)
 
@@ -1000,8 +2215,7 @@ def cancel_order(order_id):
         return redirect(url_for('order_detail', order_id=order_id))
     
     try:
-        order.status = 'cancelled'
-        order.updated_at = datetime.utcnow()
+        set_order_status(order, 'cancelled')
         
         # Hoàn lại số lượng tồn kho
         for detail in order.details:
@@ -1114,19 +2328,22 @@ def toggle_wishlist():
         db.session.rollback()
         return jsonify({'success': False, 'message': f'Đã xảy ra lỗi: {str(e)}'})
 
+def wishlist_query(user_id):
+    return db.session.query(Wishlist, Product, Category).join(
+        Product, Wishlist.product_id == Product.id
+    ).join(
+        Category, Product.category_id == Category.id
+    ).filter(
+        Wishlist.user_id == user_id
+    ).order_by(Wishlist.created_at.desc())
+
 # Trang danh sách yêu thích
 @app.route('/wishlist')
 def wishlist():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    wishlist_items = db.session.query(Wishlist, Product, Category).join(
-        Product, Wishlist.product_id == Product.id
-    ).join(
-        Category, Product.category_id == Category.id
-    ).filter(
-        Wishlist.user_id == session['user_id']
-    ).order_by(Wishlist.created_at.desc()).all()
+    wishlist_items = wishlist_query(session['user_id']).all()
     
     return render_template('wishlist.html', wishlist_items=wishlist_items)
 
@@ -1198,55 +2415,59 @@ def add_comment():
         db.session.rollback()
         return jsonify({'success': False, 'message': f'Đã xảy ra lỗi: {str(e)}'})
 
-# Lấy bình luận sản phẩm
-@app.route('/get_comments/<int:product_id>')
-def get_comments(product_id):
-    comments = db.session.query(ProductComment, User).join(
+# Chỉ lấy các cột cần trả về; Row được jsonify trực tiếp theo tên cột
+def comments_query(product_id):
+    return db.session.query(
+        ProductComment.id,
+        ProductComment.comment.label('content'),
+        ProductComment.created_at,
+        User.full_name.label('customer_name'),
+        ProductComment.admin_reply,
+        ProductComment.reply_date
+    ).join(
         User, ProductComment.user_id == User.id
     ).filter(
         ProductComment.product_id == product_id,
         ProductComment.is_approved == True
-    ).order_by(ProductComment.created_at.desc()).all()
-    
-    result = []
-    for comment, user in comments:
-        result.append({
-            'id': comment.id,
-            'content': comment.comment,
-            'created_at': comment.created_at.strftime('%d/%m/%Y %H:%M'),
-            'customer_name': user.full_name,
-            'admin_reply': comment.admin_reply,
-            'reply_date': comment.reply_date.strftime('%d/%m/%Y %H:%M') if comment.reply_date else None
-        })
+    ).order_by(ProductComment.created_at.desc())
+
+# Lấy bình luận sản phẩm
+@app.route('/get_comments/<int:product_id>')
+@conditional(get_comments_validators)
+def get_comments(product_id):
+    comments = comments_query(product_id).all()
     
-    return jsonify(result)
+    return jsonify(comments)
 
-# Lấy đánh giá sản phẩm
-@app.route('/get_reviews/<int:product_id>')
-def get_reviews(product_id):
-    reviews = db.session.query(ProductReview, User).join(
+def reviews_query(product_id):
+    return db.session.query(
+        ProductReview.id,
+        ProductReview.rating,
+        ProductReview.comment,
+        ProductReview.created_at,
+        User.full_name.label('customer_name')
+    ).join(
         User, ProductReview.user_id == User.id
     ).filter(
         ProductReview.product_id == product_id
-    ).order_by(ProductReview.created_at.desc()).all()
+    ).order_by(ProductReview.created_at.desc())
+
+def average_rating_query(product_id):
+    return db.session.query(db.func.avg(ProductReview.rating)).filter_by(product_id=product_id)
+
+# Lấy đánh giá sản phẩm
+@app.route('/get_reviews/<int:product_id>')
+@conditional(get_reviews_validators)
+def get_reviews(product_id):
+    reviews = reviews_query(product_id).all()
     
     # Tính điểm trung bình
-    avg_rating = db.session.query(db.func.avg(ProductReview.rating)).filter_by(product_id=product_id).scalar()
+    avg_rating = average_rating_query(product_id).scalar()
     total_reviews = len(reviews)
     
-    result_reviews = []
-    for review, user in reviews:
-        result_reviews.append({
-            'id': review.id,
-            'rating': review.rating,
-            'comment': review.comment,
-            'created_at': review.created_at.strftime('%d/%m/%Y %H:%M'),
-            'customer_name': user.full_name
-        })
-    
     return jsonify({
-        'reviews': result_reviews,
-        'avg_rating': float(avg_rating) if avg_rating else 0,
+        'reviews': reviews,
+        'avg_rating': avg_rating or 0,
         'total_reviews': total_reviews
     })
 
@@ -1295,30 +2516,29 @@ def admin_required(f):
     decorated_function.__name__ = f.__name__
     return decorated_function
 
+def recent_orders_query(limit=10):
+    return db.session.query(Order, User).join(
+        User, Order.user_id == User.id
+    ).order_by(Order.created_at.desc()).limit(limit)
+
 # Trang quản trị chính
 @app.route('/admin')
 @admin_required
 def admin_dashboard():
-    total_products = Product.query.count()
-    total_orders = Order.query.count()
-    total_customers = User.query.filter_by(is_admin=False).count()
-    total_revenue = db.session.query(db.func.sum(Order.total_amount)).filter(
-        Order.status.in_(['completed', 'shipped'])
-    ).scalar() or 0
+    # KPI lấy từ bảng bộ đếm thay vì COUNT/SUM trên toàn bảng
+    kpis = get_dashboard_kpis()
     
     # Đơn hàng gần đây
-    recent_orders = db.session.query(Order, User).join(
-        User, Order.user_id == User.id
-    ).order_by(Order.created_at.desc()).limit(10).all()
+    recent_orders = recent_orders_query().all()
     
     # Sản phẩm bán chạy (giả lập)
     best_selling = Product.query.limit(5).all()
     
     return render_template('admin/dashboard.html',
-                          total_products=total_products,
-                          total_orders=total_orders,
-                          total_customers=total_customers,
-                          total_revenue=float(total_revenue),
+                          total_products=kpis['total_products'],
+                          total_orders=kpis['total_orders'],
+                          total_customers=kpis['total_customers'],
+                          total_revenue=kpis['total_revenue'],
                           recent_orders=recent_orders,
                           best_selling=best_selling)
 
@@ -1343,12 +2563,23 @@ def admin_edit_product(product_id):
         description = request.form.get('description')
         price = request.form.get('price', type=float)
         category_id = request.form.get('category_id', type=int)
+        image = request.files.get('image')
         
         try:
             product.name = product_name
             product.description = description
             product.base_price = price
             product.category_id = category_id
+            if image and image.filename:
+                extension = os.path.splitext(image.filename)[1].lower()
+                if extension not in SOURCE_EXTENSIONS:
+                    raise ValueError('Định dạng ảnh không được hỗ trợ')
+                # Ảnh gốc lưu trong static/images/uploads, các biến thể được tạo nền sau khi commit
+                filename = f'{uuid.uuid4().hex}{extension}'
+                upload_dir = os.path.join(app.static_folder, 'images', 'uploads')
+                os.makedirs(upload_dir, exist_ok=True)
+                image.save(os.path.join(upload_dir, filename))
+                product.image_url = f'/static/images/uploads/{filename}'
             product.updated_at = datetime.utcnow()
             
             db.session.commit()
@@ -1358,24 +2589,64 @@ def admin_edit_product(product_id):
             db.session.rollback()
             flash(f'Đã xảy ra lỗi: {str(e)}', 'error')
     
-    categories = Category.query.all()
+    categories = reference_data.get().categories
     return render_template('admin/edit_product.html', product=product, categories=categories)
 
+def admin_orders_query(status_filter=''):
+    query = db.session.query(Order, User).join(User, Order.user_id == User.id)
+    
+    if status_filter:
+        query = query.filter(Order.status == status_filter)
+    
+    return query.order_by(Order.created_at.desc())
+
 # Quản lý đơn hàng
 @app.route('/admin/orders')
 @admin_required
 def admin_orders():
     status_filter = request.args.get('status', '')
     
-    query = db.session.query(Order, User).join(User, Order.user_id == User.id)
-    
-    if status_filter:
-        query = query.filter(Order.status == status_filter)
-    
-    orders = query.order_by(Order.created_at.desc()).all()
+    orders = admin_orders_query(status_filter).all()
     
     return render_template('admin/orders.html', orders=orders, status_filter=status_filter)
 
+# Luồng sự kiện đơn hàng trực tiếp (Server-Sent Events)
+@app.route('/admin/orders/stream')
+@admin_required
+def admin_order_stream():
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    heartbeat = float(os.environ.get('ORDER_FEED_HEARTBEAT', 15))
+    
+    after_id = order_event_hub.subscribe()
+    if after_id is None:
+        # Worker đã đủ kết nối SSE: từ chối để các luồng còn lại phục vụ khách mua hàng
+        return Response('retry: 10000\n\n', status=503, mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'Retry-After': '10'
+        })
+    if last_event_id is not None:
+        after_id = last_event_id
+    
+    def generate(after_id):
+        yield 'retry: 3000\n\n'
+        while True:
+            events = order_event_hub.wait_for(after_id, heartbeat)
+            if not events:
+                # Giữ kết nối qua proxy
+                yield ': keep-alive\n\n'
+                continue
+            for event in events:
+                after_id = event['id']
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    
+    response = Response(generate(after_id), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Trả lại chỗ khi kết nối đóng, kể cả khi generator chưa từng chạy
+    response.call_on_close(order_event_hub.unsubscribe)
+    return response
+
 # Cập nhật trạng thái đơn hàng
 @app.route('/admin/update_order_status', methods=['POST'])
 @admin_required
@@ -1391,14 +2662,20 @@ def admin_update_order_status():
         return jsonify({'success': False, 'message': 'Đơn hàng không tồn tại'})
     
     try:
-        order.status = new_status
-        order.updated_at = datetime.utcnow()
+        set_order_status(order, new_status)
         db.session.commit()
         return jsonify({'success': True, 'message': 'Cập nhật trạng thái thành công'})
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': f'Đã xảy ra lỗi: {str(e)}'})
 
+def revenue_query(start, end):
+    return db.session.query(db.func.sum(Order.total_amount)).filter(
+        Order.status.in_(REVENUE_STATUSES),
+        Order.created_at >= start,
+        Order.created_at <= end
+    )
+
 # Báo cáo doanh thu
 @app.route('/admin/reports')
 @admin_required
@@ -1409,11 +2686,7 @@ def admin_reports():
         month_start = datetime.now().replace(day=1) - timedelta(days=30*i)
         month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
         
-        revenue = db.session.query(db.func.sum(Order.total_amount)).filter(
-            Order.status.in_(['completed', 'shipped']),
-            Order.created_at >= month_start,
-            Order.created_at <= month_end
-        ).scalar() or 0
+        revenue = revenue_query(month_start, month_end).scalar() or 0
         
         monthly_revenue.append({
             'month': month_start.strftime('%Y-%m'),
@@ -1455,6 +2728,42 @@ def admin_reports():
                           category_revenue=category_revenue,
                           daily_revenue=daily_revenue)
 
+# Phân tích khách hàng (đọc từ bảng kết quả đã tính sẵn)
+@app.route('/admin/customers')
+@admin_required
+def admin_customers():
+    segments = db.session.query(
+        CustomerRFM.segment,
+        db.func.count(CustomerRFM.user_id),
+        db.func.avg(CustomerRFM.recency_days),
+        db.func.avg(CustomerRFM.frequency),
+        db.func.sum(CustomerRFM.monetary)
+    ).group_by(CustomerRFM.segment).all()
+    
+    top_customers = db.session.query(CustomerRFM, User).join(
+        User, CustomerRFM.user_id == User.id
+    ).order_by(CustomerRFM.monetary.desc()).limit(20).all()
+    
+    cohorts = {}
+    for cohort in CustomerCohort.query.order_by(CustomerCohort.cohort_month.desc(), CustomerCohort.month_offset).limit(500):
+        cohorts.setdefault(cohort.cohort_month, []).append(cohort)
+    
+    computed_at = db.session.query(db.func.max(CustomerRFM.computed_at)).scalar()
+    
+    return render_template('admin/customers.html',
+                          segments=segments,
+                          top_customers=top_customers,
+                          cohorts=cohorts,
+                          computed_at=computed_at)
+
+# Truy vấn chậm, gộp theo fingerprint
+@app.route('/admin/slow_queries')
+@admin_required
+def admin_slow_queries():
+    return render_template('admin/slow_queries.html',
+                          queries=slow_query_log.summary(),
+                          threshold_ms=slow_query_log.threshold * 1000)
+
 # Quản lý tin nhắn liên hệ
 @app.route('/admin/contact_messages')
 @admin_required
@@ -1547,7 +2856,7 @@ def admin_toggle_comment_visibility():
 def inject_user_and_cart():
     cart_count = 0
     if 'cart' in session:
-        cart_count = sum(item['quantity'] for item in session['cart'])
+        cart_count = cart_item_count(session['cart'])
     
     return {
         'user_id': session.get('user_id'),
@@ -1573,228 +2882,126 @@ def create_app():
     init_db()
     return app
 
-# Khởi tạo database ngay khi module được import
-try:
-    with app.app_context():
-        db.create_all()
-        
-        # Kiểm tra xem đã có dữ liệu chưa
-        if User.query.first() is None:
-            # Thêm màu sắc
-            colors = [
-                Color(name='Đen', hex_code='#000000'),
-                Color(name='Trắng', hex_code='#FFFFFF'),
-                Color(name='Xanh dương', hex_code='#0000FF'),
-                Color(name='Đỏ', hex_code='#FF0000'),
-                Color(name='Xanh lá', hex_code='#008000'),
-                Color(name='Vàng', hex_code='#FFFF00'),
-                Color(name='Hồng', hex_code='#FFC0CB'),
-                Color(name='Nâu', hex_code='#A52A2A'),
-                Color(name='Xám', hex_code='#808080')
-            ]
-            for color in colors:
-                db.session.add(color)
-            
-            # Thêm kích thước
-            sizes = [
-                Size(name='XS', description='Extra Small'),
-                Size(name='S', description='Small'),
-                Size(name='M', description='Medium'),
-                Size(name='L', description='Large'),
-                Size(name='XL', description='Extra Large'),
-                Size(name='XXL', description='Double Extra Large'),
-                Size(name='28', description='Eo 28 inch'),
-                Size(name='29', description='Eo 29 inch'),
-                Size(name='30', description='Eo 30 inch'),
-                Size(name='31', description='Eo 31 inch'),
-                Size(name='32', description='Eo 32 inch'),
-                Size(name='33', description='Eo 33 inch')
-            ]
-            for size in sizes:
-                db.session.add(size)
-            
-            # Thêm danh mục
-            categories = [
-                Category(name='Áo Nam', description='Các loại áo dành cho nam giới', image_url='/static/images/ao-nam.jpg'),
-                Category(name='Áo Nữ', description='Các loại áo dành cho nữ giới', image_url='/static/images/ao-nu.jpg'),
-                Category(name='Quần Nam', description='Các loại quần dành cho nam giới', image_url='/static/images/quan-nam.jpg'),
-                Category(name='Quần Nữ', description='Các loại quần dành cho nữ giới', image_url='/static/images/quan-nu.jpg'),
-                Category(name='Váy Đầm', description='Các loại váy đầm nữ', image_url='/static/images/vay-dam.jpg'),
-                Category(name='Phụ Kiện', description='Các loại phụ kiện thời trang', image_url='/static/images/phu-kien.jpg')
-            ]
-            for category in categories:
-                db.session.add(category)
-            
-            db.session.commit()
-            
-            # Thêm sản phẩm
-            products = [
-                Product(name='Áo Thun Nam Đen', description='Áo thun nam màu đen, chất liệu cotton thoáng mát', base_price=299000, category_id=1, image_url='/static/images/ao-thun-nam-den.jpg'),
-                Product(name='Áo Sơ Mi Nam Trắng', description='Áo sơ mi nam màu trắng, phù hợp đi làm', base_price=499000, category_id=1, image_url='/static/images/ao-so-mi-nam-trang.jpg'),
-                Product(name='Áo Thun Nữ Hồng', description='Áo thun nữ màu hồng, thiết kế trẻ trung', base_price=259000, category_id=2, image_url='/static/images/ao-thun-nu-hong.jpg'),
-                Product(name='Áo Sơ Mi Nữ Trắng', description='Áo sơ mi nữ màu trắng, thanh lịch', base_price=459000, category_id=2, image_url='/static/images/ao-so-mi-nu-trang.jpg'),
-                Product(name='Áo Khoác Nữ Nhẹ', description='Áo khoác nữ nhẹ, phù hợp mùa thu', base_price=699000, category_id=2, image_url='/static/images/ao-khoac-nu-nhe.jpg'),
-                Product(name='Quần Jean Nam Xanh', description='Quần jean nam màu xanh, form slim fit', base_price=599000, category_id=3, image_url='/static/images/quan-jean-nam-xanh.jpg'),
-                Product(name='Quần Kaki Nam Nâu', description='Quần kaki nam màu nâu, phong cách lịch lãm', base_price=549000, category_id=3, image_url='/static/images/quan-kaki-nam-nau.jpg'),
-                Product(name='Quần Jean Nữ Xanh Nhạt', description='Quần jean nữ màu xanh nhạt, form skinny', base_price=559000, category_id=4, image_url='/static/images/quan-jean-nu-xanh-nhat.jpg'),
-                Product(name='Váy Đầm Suông Đen', description='Váy đầm suông màu đen, thanh lịch', base_price=799000, category_id=5, image_url='/static/images/vay-dam-suong-den.jpg')
-            ]
-            for product in products:
-                db.session.add(product)
-            
-            db.session.commit()
-            
-            # Thêm biến thể sản phẩm
-            variants = [
-                # Áo Thun Nam Đen
-                ProductVariant(product_id=1, color_id=1, size_id=2, price=299000, stock_quantity=50, sku='ATN-DEN-S'),
-                ProductVariant(product_id=1, color_id=1, size_id=3, price=299000, stock_quantity=45, sku='ATN-DEN-M'),
-                ProductVariant(product_id=1, color_id=1, size_id=4, price=299000, stock_quantity=40, sku='ATN-DEN-L'),
-                ProductVariant(product_id=1, color_id=1, size_id=5, price=299000, stock_quantity=35, sku='ATN-DEN-XL'),
-                # Áo Sơ Mi Nam Trắng
-                ProductVariant(product_id=2, color_id=2, size_id=2, price=499000, stock_quantity=30, sku='ASM-TRA-S'),
-                ProductVariant(product_id=2, color_id=2, size_id=3, price=499000, stock_quantity=25, sku='ASM-TRA-M'),
-                ProductVariant(product_id=2, color_id=2, size_id=4, price=499000, stock_quantity=20, sku='ASM-TRA-L'),
-                ProductVariant(product_id=2, color_id=2, size_id=5, price=499000, stock_quantity=15, sku='ASM-TRA-XL'),
-                # Áo Thun Nữ Hồng
-                ProductVariant(product_id=3, color_id=7, size_id=1, price=259000, stock_quantity=40, sku='ATN-HON-XS'),
-                ProductVariant(product_id=3, color_id=7, size_id=2, price=259000, stock_quantity=35, sku='ATN-HON-S'),
-                ProductVariant(product_id=3, color_id=7, size_id=3, price=259000, stock_quantity=30, sku='ATN-HON-M'),
-                ProductVariant(product_id=3, color_id=7, size_id=4, price=259000, stock_quantity=25, sku='ATN-HON-L'),
-                # Áo Sơ Mi Nữ Trắng
-                ProductVariant(product_id=4, color_id=2, size_id=1, price=459000, stock_quantity=25, sku='ASN-TRA-XS'),
-                ProductVariant(product_id=4, color_id=2, size_id=2, price=459000, stock_quantity=20, sku='ASN-TRA-S'),
-                ProductVariant(product_id=4, color_id=2, size_id=3, price=459000, stock_quantity=18, sku='ASN-TRA-M'),
-                ProductVariant(product_id=4, color_id=2, size_id=4, price=459000, stock_quantity=15, sku='ASN-TRA-L'),
-                # Áo Khoác Nữ Nhẹ
-                ProductVariant(product_id=5, color_id=1, size_id=2, price=699000, stock_quantity=20, sku='AKN-DEN-S'),
-                ProductVariant(product_id=5, color_id=1, size_id=3, price=699000, stock_quantity=18, sku='AKN-DEN-M'),
-                ProductVariant(product_id=5, color_id=1, size_id=4, price=699000, stock_quantity=15, sku='AKN-DEN-L'),
-                ProductVariant(product_id=5, color_id=9, size_id=2, price=699000, stock_quantity=12, sku='AKN-XAM-S'),
-                ProductVariant(product_id=5, color_id=9, size_id=3, price=699000, stock_quantity=10, sku='AKN-XAM-M'),
-                # Quần Jean Nam Xanh
-                ProductVariant(product_id=6, color_id=3, size_id=7, price=599000, stock_quantity=25, sku='QJN-XAN-28'),
-                ProductVariant(product_id=6, color_id=3, size_id=8, price=599000, stock_quantity=22, sku='QJN-XAN-29'),
-                ProductVariant(product_id=6, color_id=3, size_id=9, price=599000, stock_quantity=20, sku='QJN-XAN-30'),
-                ProductVariant(product_id=6, color_id=3, size_id=10, price=599000, stock_quantity=18, sku='QJN-XAN-31'),
-                ProductVariant(product_id=6, color_id=3, size_id=11, price=599000, stock_quantity=15, sku='QJN-XAN-32'),
-                # Quần Kaki Nam Nâu
-                ProductVariant(product_id=7, color_id=8, size_id=7, price=549000, stock_quantity=20, sku='QKN-NAU-28'),
-                ProductVariant(product_id=7, color_id=8, size_id=8, price=549000, stock_quantity=18, sku='QKN-NAU-29'),
-                ProductVariant(product_id=7, color_id=8, size_id=9, price=549000, stock_quantity=16, sku='QKN-NAU-30'),
-                ProductVariant(product_id=7, color_id=8, size_id=10, price=549000, stock_quantity=14, sku='QKN-NAU-31'),
-                ProductVariant(product_id=7, color_id=8, size_id=11, price=549000, stock_quantity=12, sku='QKN-NAU-32'),
-                # Quần Jean Nữ Xanh Nhạt
-                ProductVariant(product_id=8, color_id=3, size_id=1, price=559000, stock_quantity=18, sku='QJN-XAN-XS'),
-                ProductVariant(product_id=8, color_id=3, size_id=2, price=559000, stock_quantity=16, sku='QJN-XAN-S'),
-                ProductVariant(product_id=8, color_id=3, size_id=3, price=559000, stock_quantity=14, sku='QJN-XAN-M'),
-                ProductVariant(product_id=8, color_id=3, size_id=4, price=559000, stock_quantity=12, sku='QJN-XAN-L'),
-                # Váy Đầm Suông Đen
-                ProductVariant(product_id=9, color_id=1, size_id=1, price=799000, stock_quantity=15, sku='VDS-DEN-XS'),
-                ProductVariant(product_id=9, color_id=1, size_id=2, price=799000, stock_quantity=12, sku='VDS-DEN-S'),
-                ProductVariant(product_id=9, color_id=1, size_id=3, price=799000, stock_quantity=10, sku='VDS-DEN-M'),
-                ProductVariant(product_id=9, color_id=1, size_id=4, price=799000, stock_quantity=8, sku='VDS-DEN-L')
-            ]
-            for variant in variants:
-                db.session.add(variant)
-            
-            # Thêm người dùng mẫu
-            users = [
-                User(username='admin', email='admin@fashionstore.com', password_hash=generate_password_hash('admin123'), full_name='Quản trị viên', phone='0123456789', address='Hà Nội', is_admin=True),
-                User(username='user1', email='user1@email.com', password_hash=generate_password_hash('password123'), full_name='Nguyễn Văn A', phone='0987654321', address='TP.HCM'),
-                User(username='user2', email='user2@email.com', password_hash=generate_password_hash('password123'), full_name='Trần Thị B', phone='0912345678', address='Đà Nẵng'),
-                User(username='user3', email='user3@email.com', password_hash=generate_password_hash('password123'), full_name='Lê Văn C', phone='0934567890', address='Hải Phòng'),
-                User(username='user4', email='user4@email.com', password_hash=generate_password_hash('password123'), full_name='Phạm Thị D', phone='0945678901', address='Cần Thơ')
-            ]
-            for user in users:
-                db.session.add(user)
-            
-            db.session.commit()
-            
-            # Thêm đơn hàng mẫu
-            orders = [
-                Order(user_id=2, total_amount=598000, status='completed', shipping_address='TP.HCM', phone='0987654321'),
-                Order(user_id=3, total_amount=1158000, status='processing', shipping_address='Đà Nẵng', phone='0912345678'),
-                Order(user_id=4, total_amount=799000, status='pending', shipping_address='Hải Phòng', phone='0934567890'),
-                Order(user_id=5, total_amount=1098000, status='completed', shipping_address='Cần Thơ', phone='0945678901')
-            ]
-            for order in orders:
-                db.session.add(order)
-            
-            db.session.commit()
-            
-            # Thêm chi tiết đơn hàng
-            order_details = [
-                OrderDetail(order_id=1, product_variant_id=1, quantity=2, unit_price=299000, total_price=598000),
-                OrderDetail(order_id=2, product_variant_id=13, quantity=1, unit_price=459000, total_price=459000),
-                OrderDetail(order_id=2, product_variant_id=17, quantity=1, unit_price=699000, total_price=699000),
-                OrderDetail(order_id=3, product_variant_id=33, quantity=1, unit_price=799000, total_price=799000),
-                OrderDetail(order_id=4, product_variant_id=6, quantity=1, unit_price=499000, total_price=499000),
-                OrderDetail(order_id=4, product_variant_id=21, quantity=1, unit_price=599000, total_price=599000)
-            ]
-            for detail in order_details:
-                db.session.add(detail)
-            
-            # Thêm đánh giá sản phẩm
-            reviews = [
-                ProductReview(product_id=1, user_id=2, rating=5, comment='Áo rất đẹp và chất lượng tốt'),
-                ProductReview(product_id=2, user_id=3, rating=4, comment='Áo sơ mi đẹp, phù hợp đi làm'),
-                ProductReview(product_id=3, user_id=4, rating=5, comment='Màu hồng rất xinh, chất liệu mềm mại'),
-                ProductReview(product_id=9, user_id=5, rating=4, comment='Váy đẹp nhưng hơi dài')
-            ]
-            for review in reviews:
-                db.session.add(review)
-            
-            # Thêm wishlist
-            wishlists = [
-                Wishlist(user_id=2, product_id=3),
-                Wishlist(user_id=2, product_id=5),
-                Wishlist(user_id=2, product_id=9),
-                Wishlist(user_id=3, product_id=1),
-                Wishlist(user_id=3, product_id=6),
-                Wishlist(user_id=4, product_id=2),
-                Wishlist(user_id=4, product_id=4),
-                Wishlist(user_id=4, product_id=8),
-                Wishlist(user_id=5, product_id=7),
-                Wishlist(user_id=5, product_id=9)
-            ]
-            for wishlist in wishlists:
-                db.session.add(wishlist)
-            
-            # Thêm bình luận sản phẩm
-            comments = [
-                ProductComment(product_id=1, user_id=2, comment='Áo này có màu nào khác không?', is_approved=True),
-                ProductComment(product_id=2, user_id=3, comment='Size M có vừa với người cao 1m7 không?', is_approved=True),
-                ProductComment(product_id=3, user_id=4, comment='Chất liệu có co giãn không?', is_approved=False),
-                ProductComment(product_id=9, user_id=5, comment='Váy này có thể giặt máy được không?', is_approved=True)
-            ]
-            for comment in comments:
-                db.session.add(comment)
-            
-            # Thêm tin nhắn liên hệ
-            messages = [
-                ContactMessage(name='Nguyễn Văn E', email='user5@email.com', subject='Hỏi về sản phẩm', message='Tôi muốn hỏi về chính sách đổi trả'),
-                ContactMessage(name='Trần Thị F', email='user6@email.com', subject='Khiếu nại', message='Sản phẩm tôi nhận không đúng màu'),
-                ContactMessage(name='Lê Văn G', email='user7@email.com', subject='Góp ý', message='Website rất đẹp và dễ sử dụng')
-            ]
-            for message in messages:
-                db.session.add(message)
-            
-            # Thêm đăng ký newsletter
-            newsletters = [
-                NewsletterSubscription(email='newsletter1@email.com'),
-                NewsletterSubscription(email='newsletter2@email.com'),
-                NewsletterSubscription(email='newsletter3@email.com'),
-                NewsletterSubscription(email='newsletter4@email.com'),
-                NewsletterSubscription(email='newsletter5@email.com')
-            ]
-            for newsletter in newsletters:
-                db.session.add(newsletter)
-            
-            db.session.commit()
-            print("Database initialized with sample data!")
-except Exception as e:
-    print(f"Database initialization error: {str(e)}")
+# Biên dịch trước toàn bộ template (nạp từ bytecode cache nếu có), trả về thời gian từng template
+def warm_templates():
+    timings = []
+    for name in sorted(app.jinja_env.list_templates(extensions=['html'])):
+        start = time.perf_counter()
+        try:
+            app.jinja_env.get_template(name)
+            error = None
+        except TemplateError as e:
+            error = str(e)
+        timings.append((name, (time.perf_counter() - start) * 1000, error))
+    return timings
+
+# Lệnh xây lại gợi ý sản phẩm từ toàn bộ lịch sử: flask --app app rebuild-recommendations
+@app.cli.command('rebuild-recommendations')
+def rebuild_recommendations_command():
+    with write_transaction():
+        rebuild_recommendations()
+    print("Product recommendations rebuilt.")
+
+# Lệnh tính lại phân tích khách hàng, chạy định kỳ bởi cron service trong render.yaml và
+# service analytics trong docker-compose.yml: flask --app app refresh-customer-analytics
+@app.cli.command('refresh-customer-analytics')
+def refresh_customer_analytics_command():
+    started = time.perf_counter()
+    with write_transaction():
+        customers = refresh_customer_analytics()
+    print(f"Customer analytics refreshed: {customers} customers in {time.perf_counter() - started:.2f}s")
+
+# Áp dụng các migration còn thiếu: flask --app app migrate
+@app.cli.command('migrate')
+def migrate_command():
+    applied = run_migrations(db.engine, db.metadata)
+    for version, description in applied:
+        print(f"Applied migration {version}: {description}")
+    if not applied:
+        print("Schema is up to date.")
+
+# Kiểm tra kế hoạch thực thi của các truy vấn nóng: flask --app app check-query-plans
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    import query_plans
+    failures = query_plans.check_query_plans()
+    if failures:
+        raise SystemExit(1)
+
+@app.cli.command('process-images')
+def process_images_command():
+    results = image_pipeline.process_directory()
+    print(f"Processed {len(results)} images into {image_pipeline.output_dir}.")
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    manifest = assets.build_assets(app.static_folder)
+    asset_manifest.update(manifest)
+    for source, filename in manifest.items():
+        print(f"{source} -> {assets.DIST_DIR}/{filename}")
+
+@app.cli.command('warm-templates')
+def warm_templates_command():
+    timings = warm_templates()
+    for name, elapsed_ms, error in timings:
+        print(f"{elapsed_ms:8.1f} ms  {name}" + (f"  ERROR: {error}" if error else ""))
+    print(f"{sum(t[1] for t in timings):8.1f} ms  total ({len(timings)} templates)")
+
+# Lệnh đối soát lại bộ đếm KPI: flask --app app rebuild-counters
+@app.cli.command('rebuild-counters')
+def rebuild_counters_command():
+    with write_transaction():
+        rebuild_counters()
+    print("Store counters rebuilt.")
+
+# Sinh dữ liệu giả lập khối lượng lớn để kiểm thử hiệu năng, ví dụ:
+# flask --app app generate-data --scale large
+# flask --app app generate-data --scale small --orders 200000 --seed 7
+@app.cli.command('generate-data')
+@click.option('--scale', type=click.Choice(list(synthetic_data.PRESETS)), default='small')
+@click.option('--products', type=int)
+@click.option('--variants', type=int)
+@click.option('--users', type=int)
+@click.option('--orders', type=int)
+@click.option('--reviews', type=int)
+@click.option('--comments', type=int)
+@click.option('--wishlist', type=int)
+@click.option('--days', type=int, default=730, help='Khoảng thời gian của đơn hàng, tính lùi từ hôm nay')
+@click.option('--zipf', type=float, default=1.0, help='Độ lệch phân phối độ phổ biến sản phẩm')
+@click.option('--chunk-size', type=int, default=50000, help='Số dòng mỗi transaction')
+@click.option('--seed', type=int, default=42)
+def generate_data_command(scale, days, zipf, chunk_size, seed, **overrides):
+    volumes = synthetic_data.volumes_for(scale, **overrides)
+    started = time.perf_counter()
+    # Mọi khách hàng giả lập dùng chung một mật khẩu: băm một lần thay vì hàng trăm nghìn lần
+    generator = synthetic_data.SyntheticData(
+        db.engine, db.metadata, volumes, generate_password_hash('password123'),
+        seed=seed, days=days, zipf=zipf, chunk_size=chunk_size
+    )
+    with write_transaction():
+        generator.run()
+        rebuild_counters()
+        rebuild_product_sort_keys()
+    print(f"Synthetic data generated in {time.perf_counter() - started:.1f}s. "
+          "Run rebuild-recommendations and refresh-customer-analytics to refresh derived data.")
+
+# Xóa ngay các phiên đã hết hạn (bình thường do luồng nền của mỗi worker): flask --app app purge-sessions
+@app.cli.command('purge-sessions')
+def purge_sessions_command():
+    if not isinstance(app.session_interface, ServerSessionInterface):
+        print("Server-side sessions are disabled (SESSION_BACKEND=cookie).")
+        return
+    print(f"Removed {app.session_interface.store.purge_expired()} expired sessions.")
+
+# Khởi tạo database ngay khi module được import. Khi chạy gunicorn với --preload,
+# gunicorn.conf.py đặt INIT_DB_ON_IMPORT=0 và gọi init_db() trong hook when_ready
+# để tiến trình master không mở kết nối database trước khi fork worker.
+if os.environ.get('INIT_DB_ON_IMPORT', '1') == '1':
+    try:
+        init_db()
+    except Exception as e:
+        APP_ERRORS.labels('init_db').inc()
+        print(f"Database initialization error: {str(e)}")
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
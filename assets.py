@@ -0,0 +1,69 @@
+import gzip
+import hashlib
+import json
+import os
+import sys
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Đóng gói CSS/JS dùng chung: sao chép file nguồn trong static/ sang static/dist
+# với tên chứa mã băm nội dung và nén sẵn gzip/brotli, để phục vụ với cache vĩnh viễn.
+# Chạy lúc build: python assets.py (hoặc flask build-assets).
+
+ASSET_SOURCES = ('css/base.css', 'js/base.js')
+DIST_DIR = 'dist'
+
+
+def fingerprint(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def build_assets(static_folder, sources=ASSET_SOURCES):
+    dist_dir = os.path.join(static_folder, DIST_DIR)
+    os.makedirs(dist_dir, exist_ok=True)
+    manifest = {}
+    for source in sources:
+        with open(os.path.join(static_folder, source), 'rb') as f:
+            data = f.read()
+        name, extension = os.path.splitext(os.path.basename(source))
+        filename = f'{name}.{fingerprint(data)}{extension}'
+        path = os.path.join(dist_dir, filename)
+        with open(path, 'wb') as f:
+            f.write(data)
+        # mtime=0 để cùng nội dung luôn cho ra cùng file .gz
+        with open(path + '.gz', 'wb') as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(path + '.br', 'wb') as f:
+                f.write(brotli.compress(data, quality=11))
+        manifest[source] = filename
+
+    with open(os.path.join(dist_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, 'manifest.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+# Chọn bản nén tốt nhất mà trình duyệt chấp nhận và đã có sẵn trên đĩa
+def precompressed_variant(path, accept_encodings):
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if encoding in accept_encodings and os.path.exists(path + suffix):
+            return encoding, path + suffix
+    return None, path
+
+
+if __name__ == '__main__':
+    static_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    for source, filename in build_assets(static_folder, sys.argv[1:] or ASSET_SOURCES).items():
+        print(f"{source} -> {DIST_DIR}/{filename}")
@@ -0,0 +1,60 @@
+# Đo lượng byte tiết kiệm và CPU tiêu tốn khi nén động từng route, theo từng mức nén.
+# Chạy: python benchmarks/bench_compression.py --repeat 50
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROUTES = [
+    '/', '/cart', '/contact', '/get_reviews/1', '/get_comments/1',
+    '/admin', '/admin/orders', '/admin/reports', '/admin/customers', '/admin/comments',
+]
+LEVELS = [('gzip', 1), ('gzip', 6), ('gzip', 9), ('br', 1), ('br', 4), ('br', 11)]
+
+
+def fetch_bodies():
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    from app import app
+    app.logger.disabled = True
+    client = app.test_client()
+    admin = app.test_client()
+    admin.post('/login', data={'email': 'admin@fashionstore.com', 'password': 'admin123'})
+    bodies = {}
+    for route in ROUTES:
+        try:
+            response = (admin if route.startswith('/admin') else client).get(
+                route, headers={'Accept-Encoding': 'identity'}
+            )
+        except Exception:
+            continue
+        if response.status_code == 200:
+            bodies[route] = response.data
+    return bodies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    from compression import brotli, compress
+    levels = [(encoding, level) for encoding, level in LEVELS if encoding != 'br' or brotli is not None]
+    bodies = fetch_bodies()
+
+    print(f"{'route':20s} {'raw':>8s}  " + '  '.join(f'{e}-{l} bytes / ms'.rjust(19) for e, l in levels))
+    for route, body in bodies.items():
+        cells = []
+        for encoding, level in levels:
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                data = compress(body, encoding, level)
+            elapsed_ms = (time.perf_counter() - start) * 1000 / args.repeat
+            cells.append(f'{len(data):>8d} / {elapsed_ms:6.2f}'.rjust(19))
+        print(f'{route:20s} {len(body):>8d}  ' + '  '.join(cells))
+
+
+if __name__ == '__main__':
+    main()
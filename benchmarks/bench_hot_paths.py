@@ -0,0 +1,192 @@
+# Microbenchmark cho các đoạn Python thuần chạy trong mỗi request: dựng bảng biến thể
+# (product_detail), tính tổng giỏ hàng (cart, update_cart, remove_from_cart, context
+# processor) và tuần tự hóa JSON (giỏ hàng, dữ liệu phiên, danh sách đánh giá/bình luận),
+# trên dữ liệu giả lập ở nhiều kích thước. Kết quả (µs mỗi lần gọi) lưu ở benchmarks/baselines/hot_paths.json;
+# --compare báo lỗi khi một đoạn chậm hơn baseline quá --tolerance. Để giảm nhiễu do
+# tải máy thay đổi, mỗi đoạn được chia cho thời gian của một vòng lặp tham chiếu đo ngay
+# cạnh nó và so sánh theo tỉ lệ này. Baseline vẫn nên lưu và so sánh trên cùng một máy.
+# Chạy: python benchmarks/bench_hot_paths.py --compare
+#       python benchmarks/bench_hot_paths.py --save-baseline
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import timeit
+from datetime import datetime, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, Text, create_engine, select
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'baselines', 'hot_paths.json')
+sys.path.insert(0, ROOT)
+
+VARIANT_SIZES = (8, 48, 480)
+CART_SIZES = (1, 10, 100)
+LIST_SIZES = (10, 100, 1000)
+
+
+def make_variants(n, rng):
+    colors = [SimpleNamespace(name=f'Màu {i}') for i in range(12)]
+    sizes = [SimpleNamespace(name=f'Size {i}') for i in range(40)]
+    return [SimpleNamespace(id=i, color_id=i % 12, size_id=i // 12, color=colors[i % 12], size=sizes[(i // 12) % 40],
+                            stock_quantity=rng.randint(0, 200), price=Decimal(rng.randint(79, 999) * 1000))
+            for i in range(n)]
+
+
+def make_cart(n, rng):
+    return [{'variant_id': i, 'product_id': i // 5, 'product_name': f'Sản phẩm {i}',
+             'price': float(rng.randint(79, 999) * 1000), 'color': 'Đen', 'size': 'M',
+             'quantity': rng.randint(1, 3), 'image_url': f'/static/images/p{i}.jpg'} for i in range(n)]
+
+
+# Dòng kết quả truy vấn (Row) giống get_reviews/get_comments, lấy từ SQLite trong bộ nhớ
+def query_rows(columns, rows):
+    engine = create_engine('sqlite://')
+    table = Table('rows', MetaData(), *columns)
+    table.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(table.insert(), rows)
+        return connection.execute(select(table)).all()
+
+
+def make_review_rows(n, rng):
+    now = datetime(2026, 1, 1)
+    return query_rows(
+        [Column('id', Integer), Column('rating', Integer), Column('comment', Text), Column('created_at', DateTime),
+         Column('customer_name', String)],
+        [{'id': i, 'rating': rng.randint(1, 5), 'comment': 'Chất vải đẹp, đúng mô tả',
+          'created_at': now - timedelta(minutes=i * 37), 'customer_name': f'Khách hàng {i % 50}'} for i in range(n)]
+    )
+
+
+def make_comment_rows(n, rng):
+    now = datetime(2026, 1, 1)
+    return query_rows(
+        [Column('id', Integer), Column('content', Text), Column('created_at', DateTime),
+         Column('customer_name', String), Column('admin_reply', Text), Column('reply_date', DateTime)],
+        [{'id': i, 'content': 'Sản phẩm này còn size M không shop?', 'created_at': now - timedelta(minutes=i * 41),
+          'customer_name': f'Khách hàng {i % 50}', 'admin_reply': 'Dạ còn ạ' if i % 3 else None,
+          'reply_date': now - timedelta(minutes=i * 40) if i % 3 else None} for i in range(n)]
+    )
+
+
+# Trả về danh sách (tên, hàm không đối số) dùng đúng các hàm của app.py
+def build_cases(app_module):
+    app = app_module.app
+    rng = random.Random(42)
+    serializer = app.session_interface.serializer
+    cases = []
+    for n in VARIANT_SIZES:
+        variants = make_variants(n, rng)
+        cases.append((f'build_variant_options[{n}]', lambda v=variants: app_module.build_variant_options(v)))
+    for n in CART_SIZES:
+        cart = make_cart(n, rng)
+        cases.append((f'cart_total[{n}]', lambda c=cart: app_module.cart_total(c)))
+        cases.append((f'cart_item_count[{n}]', lambda c=cart: app_module.cart_item_count(c)))
+        cases.append((f'session_data_cart[{n}]', lambda c=cart: serializer.dumps({'cart': c, 'user_id': 1})))
+        payload = {'success': True, 'message': 'Đã cập nhật giỏ hàng', 'cart': cart, 'total': app_module.cart_total(cart)}
+        cases.append((f'json_cart[{n}]', lambda p=payload: app.json.dumps(p)))
+    for n in LIST_SIZES:
+        payload = {'reviews': make_review_rows(n, rng), 'avg_rating': Decimal('4.2'), 'total_reviews': n}
+        cases.append((f'json_reviews[{n}]', lambda p=payload: app.json.dumps(p)))
+        comments = make_comment_rows(n, rng)
+        cases.append((f'json_comments[{n}]', lambda c=comments: app.json.dumps(c)))
+    return cases
+
+
+def calibrate(timer):
+    number, _ = timer.autorange()
+    return max(1, number // 4)
+
+
+# Mỗi lượt đo đoạn cần đo rồi ngay sau đó đo vòng lặp tham chiếu; trả về µs mỗi lần gọi
+# (lượt nhanh nhất) và trung vị tỉ lệ giữa hai thời gian qua các lượt
+def measure(function, repeat):
+    timer = timeit.Timer(function)
+    reference = timeit.Timer(reference_workload)
+    number, reference_number = calibrate(timer), calibrate(reference)
+    timings, ratios = [], []
+    for _ in range(repeat):
+        elapsed = timer.timeit(number) / number
+        ratios.append(elapsed / (reference.timeit(reference_number) / reference_number))
+        timings.append(elapsed)
+    return round(min(timings) * 1e6, 3), round(statistics.median(ratios), 4)
+
+
+# Vòng lặp Python thuần cố định (duyệt dict, cộng số thực, định dạng chuỗi)
+REFERENCE_DATA = [{'price': float(i), 'quantity': i % 3 + 1, 'name': f'item {i}'} for i in range(200)]
+
+
+def reference_workload():
+    return sum(item['price'] * item['quantity'] for item in REFERENCE_DATA), [f"{item['name']}" for item in REFERENCE_DATA]
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=9)
+    parser.add_argument('--filter', default='', help='Chỉ chạy các đoạn có tên chứa chuỗi này')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--compare', action='store_true', help='So sánh với baseline, trả mã lỗi nếu chậm đi')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Mức chậm đi cho phép so với baseline')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    os.environ['INIT_DB_ON_IMPORT'] = '0'
+    import app as app_module
+
+    baseline = {}
+    if args.compare:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['relative']
+
+    results = {}
+    relative = {}
+    regressions = []
+    print(f"{'path':32s} {'µs/call':>12s} {'relative':>10s}" + ('  vs baseline' if baseline else ''))
+    with app_module.app.app_context():
+        for name, function in build_cases(app_module):
+            if args.filter not in name:
+                continue
+            results[name], relative[name] = measure(function, args.repeat)
+            line = f'{name:32s} {results[name]:12.3f} {relative[name]:10.4f}'
+            if name in baseline:
+                change = (relative[name] - baseline[name]) / baseline[name]
+                line += f'  {change * 100:+7.1f}%'
+                if change > args.tolerance:
+                    line += '  REGRESSION'
+                    regressions.append(name)
+            print(line)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({
+                'revision': git_revision(),
+                'python': sys.version.split()[0],
+                'results': results,
+                'relative': relative,
+            }, f, indent=2)
+        print(f'Baseline saved to {args.baseline}')
+
+    if regressions:
+        print(f"Regressions: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
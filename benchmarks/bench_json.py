@@ -0,0 +1,103 @@
+# So sánh tạo response JSON cho danh sách đánh giá lớn và giỏ hàng giữa cách cũ
+# (đối tượng ORM -> dict + strftime từng dòng -> JSON provider mặc định của Flask)
+# và FastJSONProvider (Row của truy vấn -> orjson), kèm FastJSONProvider khi không có orjson.
+# Chạy: python benchmarks/bench_json.py --repeat 5
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, Text, create_engine, select
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import json_provider
+from json_provider import FastJSONProvider
+
+REVIEW_SIZES = (1000, 10000, 50000)
+CART_SIZES = (10, 100, 1000)
+
+
+def make_reviews(n):
+    now = datetime(2026, 1, 1)
+    values = [{'id': i, 'rating': i % 5 + 1, 'comment': 'Chất vải đẹp, đúng mô tả',
+               'created_at': now - timedelta(minutes=i * 37), 'customer_name': f'Khách hàng {i % 50}'}
+              for i in range(n)]
+    engine = create_engine('sqlite://')
+    table = Table('reviews', MetaData(), Column('id', Integer), Column('rating', Integer), Column('comment', Text),
+                  Column('created_at', DateTime), Column('customer_name', String))
+    table.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(table.insert(), values)
+        rows = connection.execute(select(table)).all()
+    objects = [(SimpleNamespace(id=v['id'], rating=v['rating'], comment=v['comment'], created_at=v['created_at']),
+                SimpleNamespace(full_name=v['customer_name'])) for v in values]
+    return objects, rows
+
+
+def old_reviews_response(provider, objects):
+    result_reviews = []
+    for review, user in objects:
+        result_reviews.append({
+            'id': review.id,
+            'rating': review.rating,
+            'comment': review.comment,
+            'created_at': review.created_at.strftime('%d/%m/%Y %H:%M'),
+            'customer_name': user.full_name
+        })
+    return provider.response({'reviews': result_reviews, 'avg_rating': float(Decimal('4.2')),
+                              'total_reviews': len(objects)})
+
+
+def make_cart(n):
+    return [{'variant_id': i, 'product_id': i // 5, 'product_name': f'Sản phẩm {i}', 'price': 299000.0 + i,
+             'color': 'Đen', 'size': 'M', 'quantity': i % 3 + 1, 'image_url': f'/static/images/p{i}.jpg'}
+            for i in range(n)]
+
+
+def best(function, repeat):
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, max(1, number // 2))) / max(1, number // 2) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    default = DefaultJSONProvider(app)
+    fast = FastJSONProvider(app)
+    orjson = json_provider.orjson
+
+    def fast_without_orjson(call):
+        json_provider.orjson = None
+        try:
+            return call()
+        finally:
+            json_provider.orjson = orjson
+
+    print(f"{'payload':22s} {'default ms':>11s} {'fast ms':>9s} {'fast/json ms':>13s} {'speedup':>8s}")
+    with app.app_context():
+        for n in REVIEW_SIZES:
+            objects, rows = make_reviews(n)
+            payload = {'reviews': rows, 'avg_rating': Decimal('4.2'), 'total_reviews': n}
+            old = best(lambda: old_reviews_response(default, objects), args.repeat)
+            new = best(lambda: fast.response(payload), args.repeat)
+            stdlib = best(lambda: fast_without_orjson(lambda: fast.response(payload)), args.repeat)
+            print(f"{f'reviews[{n}]':22s} {old:11.2f} {new:9.2f} {stdlib:13.2f} {old / new:7.1f}x")
+        for n in CART_SIZES:
+            payload = {'success': True, 'cart': make_cart(n), 'total': 299000.0 * n}
+            old = best(lambda: default.response(payload), args.repeat)
+            new = best(lambda: fast.response(payload), args.repeat)
+            stdlib = best(lambda: fast_without_orjson(lambda: fast.response(payload)), args.repeat)
+            print(f"{f'cart[{n}]':22s} {old:11.3f} {new:9.3f} {stdlib:13.3f} {old / new:7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
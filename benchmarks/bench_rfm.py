@@ -0,0 +1,78 @@
+# Benchmark phân tích RFM/cohort trên dữ liệu đơn hàng giả lập.
+# Chạy: python benchmarks/bench_rfm.py --orders 5000000 --users 500000
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import analytics
+
+
+def generate_orders(orders, users, seed=42):
+    rng = np.random.default_rng(seed)
+    # Phân bố lệch: một số ít khách hàng đặt phần lớn đơn hàng
+    user_ids = (rng.zipf(1.3, orders) % users) + 1
+    amounts = rng.lognormal(mean=13, sigma=0.6, size=orders).round(-3)
+    now = int(time.time())
+    timestamps = now - rng.integers(0, 3 * 365 * 86400, size=orders)
+    return user_ids.astype(np.int64), amounts, timestamps.astype(np.int64), now
+
+
+def bench_compute(orders, users):
+    user_ids, amounts, timestamps, now = generate_orders(orders, users)
+
+    started = time.perf_counter()
+    rfm = analytics.compute_rfm(user_ids, amounts, timestamps, now)
+    rfm_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    cohorts = analytics.compute_cohort_retention(user_ids, timestamps)
+    cohort_seconds = time.perf_counter() - started
+
+    print(f"orders={orders:,} customers={len(rfm['user_id']):,}")
+    print(f"  compute_rfm:              {rfm_seconds:8.3f}s")
+    print(f"  compute_cohort_retention: {cohort_seconds:8.3f}s ({len(cohorts)} cells)")
+
+
+# Đo thêm thời gian đọc theo khối từ SQLite vào mảng NumPy
+def bench_load(orders, users):
+    user_ids, amounts, timestamps, _ = generate_orders(orders, users)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE orders (id INTEGER PRIMARY KEY, user_id INTEGER, total_amount NUMERIC(10, 2), "
+                     "status VARCHAR(20), created_at DATETIME)")
+        created = np.datetime_as_string(timestamps.astype('datetime64[s]'), unit='s')
+        conn.executemany(
+            "INSERT INTO orders (user_id, total_amount, status, created_at) VALUES (?, ?, 'completed', ?)",
+            zip(user_ids.tolist(), amounts.tolist(), [c.replace('T', ' ') for c in created])
+        )
+        conn.commit()
+        conn.close()
+
+        engine = create_engine(f'sqlite:///{path}')
+        with engine.connect() as connection:
+            started = time.perf_counter()
+            loaded = analytics.load_order_arrays(connection)
+            load_seconds = time.perf_counter() - started
+        engine.dispose()
+    print(f"  load_order_arrays:        {load_seconds:8.3f}s ({len(loaded[0]):,} rows from SQLite)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, default=5000000)
+    parser.add_argument('--users', type=int, default=500000)
+    parser.add_argument('--load-rows', type=int, default=0,
+                        help='Số đơn hàng ghi vào SQLite tạm để đo thêm bước đọc (0 = bỏ qua)')
+    args = parser.parse_args()
+
+    bench_compute(args.orders, args.users)
+    if args.load_rows:
+        bench_load(args.load_rows, args.users)
@@ -0,0 +1,53 @@
+# Đo chỉ mục gợi ý tìm kiếm (search_suggest.SuggestionIndex) trên danh mục giả lập:
+# thời gian dựng, cập nhật 1 và 100 sản phẩm và tra cứu tiền tố ngắn/dài (µs mỗi lần gọi).
+# Chạy: python benchmarks/bench_search_suggest.py --products 100000
+import argparse
+import os
+import random
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from search_suggest import SuggestionIndex
+
+WORDS = ['Áo', 'Quần', 'Váy', 'Đầm', 'thun', 'sơ mi', 'jean', 'kaki', 'nam', 'nữ', 'đen', 'trắng', 'xanh',
+         'hồng', 'công sở', 'thể thao', 'dáng rộng', 'ôm', 'cổ tròn', 'họa tiết', 'khoác', 'len', 'lụa']
+QUERIES = ['a', 'ao', 'ao th', 'quan jean nu', 'thun', 'vay d', 'dam lua', 'khong co']
+
+
+def make_items(n, rng):
+    # Độ phổ biến lệch (Pareto): ít sản phẩm bán rất chạy, phần lớn bán ít
+    return {i: (' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 6))) + f' {i}', int(rng.paretovariate(1.2)))
+            for i in range(1, n + 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    items = make_items(args.products, rng)
+
+    started = time.perf_counter()
+    index = SuggestionIndex(items)
+    print(f"build: {time.perf_counter() - started:.2f}s ({len(index.keys)} keys, {len(index.top)} cached prefixes)")
+
+    for count in (1, 100):
+        upserts = {product_id: (items[product_id][0] + ' mới', items[product_id][1])
+                   for product_id in rng.sample(sorted(items), count)}
+        started = time.perf_counter()
+        index.updated(upserts, {2})
+        print(f"update {count} products: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    for query in QUERIES:
+        timer = timeit.Timer(lambda: index.suggest(query, 8))
+        number, _ = timer.autorange()
+        best = min(timer.repeat(args.repeat, number)) / number
+        print(f"{query!r:18s} {best * 1e6:8.1f} µs  {len(index.suggest(query, 8))} results")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+# Benchmark đọc/ghi đồng thời nhiều tiến trình trên SQLite, so sánh các profile.
+# Chạy: python benchmarks/bench_sqlite_concurrency.py --writers 4 --readers 8 --seconds 10
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db_tuning
+
+SCHEMA = [
+    "CREATE TABLE product_variants (id INTEGER PRIMARY KEY, product_id INTEGER, price NUMERIC(10, 2), "
+    "stock_quantity INTEGER)",
+    "CREATE INDEX ix_product_variants_product_id ON product_variants (product_id)",
+    "CREATE TABLE orders (id INTEGER PRIMARY KEY, user_id INTEGER, total_amount NUMERIC(10, 2), "
+    "status VARCHAR(20), created_at DATETIME DEFAULT CURRENT_TIMESTAMP)",
+    "CREATE TABLE order_details (id INTEGER PRIMARY KEY, order_id INTEGER, product_variant_id INTEGER, "
+    "quantity INTEGER, unit_price NUMERIC(10, 2), total_price NUMERIC(10, 2))",
+]
+
+
+def make_engine(path, profile):
+    engine = create_engine(f'sqlite:///{path}')
+    db_tuning.configure_sqlite(engine, profile)
+    return engine
+
+
+def setup(path):
+    engine = create_engine(f'sqlite:///{path}')
+    with engine.begin() as connection:
+        for statement in SCHEMA:
+            connection.exec_driver_sql(statement)
+        connection.execute(text(
+            "INSERT INTO product_variants (product_id, price, stock_quantity) VALUES (:p, 299000, 1000000)"
+        ), [{'p': i // 4} for i in range(4000)])
+    engine.dispose()
+
+
+# Mô phỏng checkout: tạo đơn, thêm chi tiết, trừ tồn kho
+def writer(path, profile, seconds, results):
+    engine = make_engine(path, profile)
+    done = errors = 0
+    deadline = time.time() + seconds
+    n = 0
+    while time.time() < deadline:
+        n += 1
+        try:
+            with db_tuning.write_transaction(), engine.begin() as connection:
+                variant_id = (os.getpid() * 7 + n) % 4000 + 1
+                connection.execute(text("SELECT price FROM product_variants WHERE id = :id"), {'id': variant_id})
+                order_id = connection.execute(text(
+                    "INSERT INTO orders (user_id, total_amount, status) VALUES (1, 299000, 'pending')"
+                )).lastrowid
+                connection.execute(text(
+                    "INSERT INTO order_details (order_id, product_variant_id, quantity, unit_price, total_price) "
+                    "VALUES (:o, :v, 1, 299000, 299000)"
+                ), {'o': order_id, 'v': variant_id})
+                connection.execute(text(
+                    "UPDATE product_variants SET stock_quantity = stock_quantity - 1 WHERE id = :id"
+                ), {'id': variant_id})
+            done += 1
+        except OperationalError:
+            errors += 1
+    engine.dispose()
+    results.put(('write', done, errors))
+
+
+# Mô phỏng trang chi tiết sản phẩm: đọc các biến thể của một sản phẩm
+def reader(path, profile, seconds, results):
+    engine = make_engine(path, profile)
+    done = errors = 0
+    deadline = time.time() + seconds
+    n = 0
+    while time.time() < deadline:
+        n += 1
+        try:
+            with engine.connect() as connection:
+                connection.execute(text(
+                    "SELECT id, price, stock_quantity FROM product_variants WHERE product_id = :p"
+                ), {'p': n % 1000}).all()
+                connection.execute(text("SELECT COUNT(*) FROM orders WHERE user_id = 1")).scalar()
+            done += 1
+        except OperationalError:
+            errors += 1
+    engine.dispose()
+    results.put(('read', done, errors))
+
+
+def run(profile, writers, readers, seconds, directory=None):
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        setup(path)
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=writer, args=(path, profile, seconds, results))
+                     for _ in range(writers)]
+        processes += [multiprocessing.Process(target=reader, args=(path, profile, seconds, results))
+                      for _ in range(readers)]
+        for process in processes:
+            process.start()
+        totals = {'write': [0, 0], 'read': [0, 0]}
+        for _ in processes:
+            kind, done, errors = results.get()
+            totals[kind][0] += done
+            totals[kind][1] += errors
+        for process in processes:
+            process.join()
+
+    print(f"profile={profile}")
+    for kind, (done, errors) in totals.items():
+        print(f"  {kind:5s}: {done / seconds:10.1f} ops/s  ({errors} 'database is locked' errors)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--profiles', default='off,performance')
+    parser.add_argument('--dir', default=None, help='Thư mục chứa file database (nên là ổ đĩa thật, không phải tmpfs)')
+    args = parser.parse_args()
+
+    for profile in args.profiles.split(','):
+        run(profile, args.writers, args.readers, args.seconds, args.dir)
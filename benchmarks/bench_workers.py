@@ -0,0 +1,155 @@
+# So sánh throughput và bộ nhớ giữa các loại worker gunicorn với cùng số tiến trình.
+# Mô phỏng tình huống thực tế: một số admin đang mở luồng SSE (/admin/orders/stream)
+# trong khi khách hàng gọi các API JSON.
+# Chạy: python benchmarks/bench_workers.py --workers 2 --viewers 4 --clients 16 --seconds 10
+import argparse
+import http.client
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PATHS = ['/get_reviews/1', '/get_comments/1', '/get_reviews/2', '/get_comments/9', '/get_recently_viewed']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/get_comments/1')
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn did not start')
+
+
+def admin_cookie(port):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    body = urllib.parse.urlencode({'email': 'admin@fashionstore.com', 'password': 'admin123'})
+    conn.request('POST', '/login', body, {'Content-Type': 'application/x-www-form-urlencoded'})
+    response = conn.getresponse()
+    response.read()
+    return response.getheader('Set-Cookie').split(';')[0]
+
+
+# Mở luồng SSE và giữ kết nối (đọc dữ liệu ở nền để không bị nghẽn)
+def open_viewer(port, cookie):
+    sock = socket.create_connection(('127.0.0.1', port))
+    sock.sendall(f'GET /admin/orders/stream HTTP/1.1\r\nHost: localhost\r\nCookie: {cookie}\r\n\r\n'.encode())
+
+    def drain():
+        try:
+            while sock.recv(4096):
+                pass
+        except OSError:
+            pass
+    threading.Thread(target=drain, daemon=True).start()
+    return sock
+
+
+def client(port, deadline, counts):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    i = 0
+    while time.time() < deadline:
+        try:
+            conn.request('GET', PATHS[i % len(PATHS)])
+            response = conn.getresponse()
+            response.read()
+            counts['ok' if response.status == 200 else 'error'] += 1
+        except (OSError, http.client.HTTPException):
+            counts['error'] += 1
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        i += 1
+
+
+# Tổng RSS (KB) của master và các worker
+def total_rss(master_pid):
+    pids = [master_pid]
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    if int(f.read().split(')')[1].split()[1]) == master_pid:
+                        pids.append(int(entry))
+            except OSError:
+                pass
+    total = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+        except OSError:
+            pass
+    return total
+
+
+def run(worker_class, args):
+    port = free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ,
+                   GUNICORN_WORKER_CLASS=worker_class,
+                   WEB_CONCURRENCY=str(args.workers),
+                   PORT=str(port),
+                   DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--log-level', 'warning', 'app:app'],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True
+        )
+        try:
+            wait_ready(port)
+            cookie = admin_cookie(port)
+            viewers = [open_viewer(port, cookie) for _ in range(args.viewers)]
+            time.sleep(1)
+
+            counts = {'ok': 0, 'error': 0}
+            deadline = time.time() + args.seconds
+            threads = [threading.Thread(target=client, args=(port, deadline, counts)) for _ in range(args.clients)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            rss = total_rss(process.pid)
+            for viewer in viewers:
+                viewer.close()
+        finally:
+            # Worker đang giữ luồng SSE chỉ thoát sau graceful_timeout, không cần chờ
+            process.send_signal(signal.SIGQUIT)
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                os.killpg(process.pid, signal.SIGKILL)
+                process.wait()
+
+    print(f"{worker_class:8s} workers={args.workers} viewers={args.viewers}: "
+          f"{counts['ok'] / args.seconds:8.1f} req/s, {counts['error']} errors, RSS {rss / 1024:.1f} MB")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--viewers', type=int, default=2, help='Số kết nối SSE của admin đang mở')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--classes', default='sync,gthread')
+    args = parser.parse_args()
+
+    for worker_class in args.classes.split(','):
+        run(worker_class, args)
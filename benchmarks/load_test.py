@@ -0,0 +1,332 @@
+# Kiểm thử tải HTTP theo hành trình thực tế của khách hàng và admin. Mỗi người dùng ảo
+# chọn ngẫu nhiên một kịch bản theo trọng số rồi đi hết các bước của kịch bản đó;
+# kết quả gồm throughput, p50/p95/p99 và tỉ lệ lỗi cho từng bước.
+# Kết quả có thể lưu làm baseline (benchmarks/baselines/load_test.json, chạy trên main)
+# để so sánh với nhánh đang sửa; chỉ lưu được khi không bước nào lỗi, vì p95 của trang lỗi
+# không có ý nghĩa. Khi so sánh, bước có lỗi trong baseline bị bỏ qua.
+# Chạy: python benchmarks/load_test.py --users 16 --seconds 30 --compare
+#       python benchmarks/load_test.py --users 16 --seconds 30 --save-baseline
+#       python benchmarks/load_test.py --url http://127.0.0.1:5000   (server có sẵn)
+import argparse
+import http.client
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'baselines', 'load_test.json')
+
+# Khớp với dữ liệu mẫu của init_db()
+PRODUCT_IDS = range(1, 10)
+VARIANT_IDS = range(1, 40)
+CATEGORY_IDS = range(1, 7)
+SEARCH_TERMS = ['áo', 'quần', 'váy', 'jean', 'sơ mi', 'thun', 'khoác']
+SORTS = ['newest', 'price_asc', 'price_desc', 'rating', 'best_selling']
+CUSTOMERS = [(f'user{i}@email.com', 'password123') for i in range(1, 5)]
+ADMIN = ('admin@fashionstore.com', 'admin123')
+# Bước có quá ít mẫu thì p95 dao động mạnh, không dùng để kết luận chậm đi
+MIN_SAMPLES = 20
+
+
+# Mỗi kịch bản là generator trả về (bước, method, path, form); None ở form nghĩa là GET
+def browse_and_buy(rng):
+    yield 'home', 'GET', '/', None
+    query = {'category': rng.choice(CATEGORY_IDS), 'sort': rng.choice(SORTS)}
+    if rng.random() < 0.5:
+        query['min_price'] = rng.choice([0, 100000, 200000])
+        query['max_price'] = query['min_price'] + rng.choice([300000, 1000000])
+    yield 'products', 'GET', '/products?' + urllib.parse.urlencode(query), None
+    yield 'product_detail', 'GET', f'/product/{rng.choice(PRODUCT_IDS)}', None
+    yield 'add_to_cart', 'POST', '/add_to_cart', {'variant_id': rng.choice(VARIANT_IDS), 'quantity': 1}
+    yield 'cart', 'GET', '/cart', None
+    yield 'checkout', 'GET', '/checkout', None
+    yield 'place_order', 'POST', '/checkout', {'shipping_address': '123 Lê Lợi, Quận 1', 'payment_method': 'cod'}
+
+
+def search(rng):
+    yield 'search', 'GET', '/products?' + urllib.parse.urlencode({'search': rng.choice(SEARCH_TERMS)}), None
+    yield 'product_detail', 'GET', f'/product/{rng.choice(PRODUCT_IDS)}', None
+
+
+def reviews(rng):
+    product_id = rng.choice(PRODUCT_IDS)
+    yield 'product_detail', 'GET', f'/product/{product_id}', None
+    yield 'get_reviews', 'GET', f'/get_reviews/{product_id}', None
+    yield 'get_comments', 'GET', f'/get_comments/{product_id}', None
+
+
+def admin(rng):
+    yield 'dashboard', 'GET', '/admin', None
+    yield 'reports', 'GET', '/admin/reports', None
+    yield 'orders', 'GET', '/admin/orders', None
+    yield 'customers', 'GET', '/admin/customers', None
+
+
+# (tên, trọng số, hàm sinh bước, tài khoản đăng nhập)
+SCENARIOS = [
+    ('browse_and_buy', 40, browse_and_buy, 'customer'),
+    ('search', 25, search, None),
+    ('reviews', 25, reviews, None),
+    ('admin', 10, admin, 'admin'),
+]
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def record(self, scenario, step, elapsed, ok):
+        with self.lock:
+            self.samples.setdefault((scenario, step), []).append((elapsed, ok))
+
+    def report(self, seconds):
+        results = {}
+        for (scenario, step), samples in self.samples.items():
+            latencies = sorted(elapsed for elapsed, _ in samples)
+            errors = sum(1 for _, ok in samples if not ok)
+            results.setdefault(scenario, {})[step] = {
+                'requests': len(samples),
+                'rps': round(len(samples) / seconds, 2),
+                'p50_ms': percentile(latencies, 50),
+                'p95_ms': percentile(latencies, 95),
+                'p99_ms': percentile(latencies, 99),
+                'error_rate': round(errors / len(samples), 4),
+            }
+        return results
+
+
+def percentile(latencies, p):
+    index = min(len(latencies) - 1, int(round(p / 100 * (len(latencies) - 1))))
+    return round(latencies[index] * 1000, 2)
+
+
+# Trình duyệt tối giản: giữ kết nối keep-alive, cookie phiên và Referer
+# (add_to_cart chuyển hướng về request.referrer)
+class Browser:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.conn = None
+        self.cookies = {}
+        self.referer = '/'
+
+    def request(self, method, path, form=None):
+        headers = {'Accept-Encoding': 'gzip, br', 'Referer': f'http://{self.host}:{self.port}{self.referer}'}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in self.cookies.items())
+        body = None
+        if form is not None:
+            body = urllib.parse.urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            try:
+                self.conn.request(method, path, body, headers)
+                response = self.conn.getresponse()
+                response.read()
+                break
+            except (OSError, http.client.HTTPException):
+                # Server có thể đóng kết nối keep-alive cũ: thử lại một lần với kết nối mới
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+        for header in response.msg.get_all('Set-Cookie') or []:
+            name, _, value = header.split(';')[0].partition('=')
+            if value:
+                self.cookies[name] = value
+            else:
+                self.cookies.pop(name, None)
+        if method == 'GET':
+            self.referer = path
+        return response.status
+
+    def login(self, email, password):
+        self.request('POST', '/login', {'email': email, 'password': password})
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+
+
+def virtual_user(host, port, deadline, stats, seed):
+    rng = random.Random(seed)
+    weights = [weight for _, weight, _, _ in SCENARIOS]
+    browsers = {}
+    try:
+        while time.time() < deadline:
+            name, _, steps, account = rng.choices(SCENARIOS, weights)[0]
+            # Mỗi loại tài khoản dùng một phiên riêng; đăng nhập không tính vào kết quả
+            browser = browsers.get(account)
+            if browser is None:
+                browser = browsers[account] = Browser(host, port)
+                if account == 'customer':
+                    browser.login(*rng.choice(CUSTOMERS))
+                elif account == 'admin':
+                    browser.login(*ADMIN)
+            for step, method, path, form in steps(rng):
+                if time.time() >= deadline:
+                    break
+                start = time.perf_counter()
+                try:
+                    ok = browser.request(method, path, form) < 400
+                except (OSError, http.client.HTTPException):
+                    ok = False
+                stats.record(name, step, time.perf_counter() - start, ok)
+    finally:
+        for browser in browsers.values():
+            browser.close()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/get_comments/1')
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn did not start')
+
+
+def start_server(tmp, workers):
+    port = free_port()
+    env = dict(os.environ,
+               WEB_CONCURRENCY=str(workers),
+               PORT=str(port),
+               DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'load_test.db')}")
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--log-level', 'warning', 'app:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True
+    )
+    wait_ready(port)
+    return process, port
+
+
+def stop_server(process):
+    process.send_signal(signal.SIGQUIT)
+    try:
+        process.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+
+
+def run_load(host, port, args):
+    stats = Stats()
+    deadline = time.time() + args.seconds
+    threads = [threading.Thread(target=virtual_user, args=(host, port, deadline, stats, args.seed + i))
+               for i in range(args.users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats.report(args.seconds)
+
+
+def print_results(results, baseline=None, tolerance=0.2):
+    regressions = []
+    print(f"{'scenario/step':32s} {'req':>6s} {'rps':>8s} {'p50':>8s} {'p95':>8s} {'p99':>8s} {'err%':>6s}"
+          + ('  p95 vs baseline' if baseline else ''))
+    for scenario, _, _, _ in SCENARIOS:
+        for step, row in results.get(scenario, {}).items():
+            line = (f"{scenario + '/' + step:32s} {row['requests']:>6d} {row['rps']:>8.1f} {row['p50_ms']:>8.1f} "
+                    f"{row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['error_rate'] * 100:>6.1f}")
+            base = (baseline or {}).get(scenario, {}).get(step)
+            if base and base['error_rate'] > 0:
+                line += '  skipped (baseline has errors)'
+            elif base:
+                change = (row['p95_ms'] - base['p95_ms']) / base['p95_ms'] if base['p95_ms'] else 0
+                line += f'  {change * 100:+6.1f}%'
+                if row['requests'] >= MIN_SAMPLES and (
+                        change > tolerance or row['error_rate'] > base['error_rate'] + 0.01):
+                    line += '  REGRESSION'
+                    regressions.append(f'{scenario}/{step}')
+            print(line)
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', help='Chạy với server có sẵn thay vì tự khởi động gunicorn')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--users', type=int, default=16, help='Số người dùng ảo chạy song song')
+    parser.add_argument('--seconds', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--compare', action='store_true', help='So sánh với baseline, trả mã lỗi nếu chậm đi')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Mức tăng p95 cho phép so với baseline')
+    args = parser.parse_args()
+
+    if args.url:
+        target = urllib.parse.urlsplit(args.url)
+        results = run_load(target.hostname, target.port or 80, args)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            process, port = start_server(tmp, args.workers)
+            try:
+                results = run_load('127.0.0.1', port, args)
+            finally:
+                stop_server(process)
+
+    baseline = None
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            sys.exit(f'No baseline at {args.baseline}: run with --save-baseline on main first')
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+    regressions = print_results(results, baseline, args.tolerance)
+
+    failing = [f'{scenario}/{step}' for scenario, steps in results.items()
+               for step, row in steps.items() if row['error_rate'] > 0]
+    if args.save_baseline and failing:
+        print(f"Not saving baseline, steps with errors: {', '.join(failing)}")
+        sys.exit(1)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({
+                'revision': git_revision(),
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'workers': None if args.url else args.workers,
+                'users': args.users,
+                'seconds': args.seconds,
+                'results': results,
+            }, f, indent=2, ensure_ascii=False)
+        print(f'Baseline saved to {args.baseline}')
+
+    if regressions:
+        print(f"Regressions: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
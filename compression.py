@@ -0,0 +1,156 @@
+import itertools
+import zlib
+
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Nén động (gzip/brotli) cho HTML, JSON và luồng SSE ở tầng WSGI.
+# Response có Content-Length được nén một lần; response dạng stream (không có
+# Content-Length) được nén từng phần và flush sau mỗi phần để không bị giữ lại.
+
+COMPRESSIBLE_TYPES = (
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/event-stream',
+    'application/json', 'application/javascript', 'text/javascript',
+    'application/xml', 'image/svg+xml',
+)
+
+
+class GzipStream:
+    def __init__(self, level):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliStream:
+    def __init__(self, quality):
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+def header_value(headers, name):
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+# Nội dung đã nén khác byte với bản gốc nên ETag mạnh phải chuyển thành ETag yếu
+def weak_etag(value):
+    return value if value.startswith('W/') else f'W/{value}'
+
+
+def write_not_supported(data):
+    raise RuntimeError('CompressionMiddleware does not support the WSGI write() callable')
+
+
+def compress(data, encoding, level):
+    stream = BrotliStream(level) if encoding == 'br' else GzipStream(level)
+    return stream.compress(data) + stream.finish()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, min_size=500, gzip_level=6, brotli_quality=4, compressible_types=COMPRESSIBLE_TYPES):
+        self.app = app
+        self.min_size = min_size
+        self.levels = {'gzip': gzip_level, 'br': brotli_quality}
+        self.compressible_types = compressible_types
+
+    def choose_encoding(self, environ):
+        accept = parse_accept_header(environ.get('HTTP_ACCEPT_ENCODING'))
+        if brotli is not None and accept.quality('br') > 0:
+            return 'br'
+        if accept.quality('gzip') > 0:
+            return 'gzip'
+        return None
+
+    def is_compressible(self, headers):
+        content_type = header_value(headers, 'content-type') or ''
+        return content_type.split(';')[0].strip().lower() in self.compressible_types
+
+    def should_compress(self, environ, status, headers):
+        if environ['REQUEST_METHOD'] == 'HEAD' or not status.startswith('200'):
+            return False
+        if header_value(headers, 'content-encoding') or 'no-transform' in (header_value(headers, 'cache-control') or ''):
+            return False
+        length = header_value(headers, 'content-length')
+        return length is None or int(length) >= self.min_size
+
+    def __call__(self, environ, start_response):
+        encoding = self.choose_encoding(environ)
+        captured = []
+
+        def capture(status, headers, exc_info=None):
+            captured[:] = [status, headers, exc_info]
+            return write_not_supported
+
+        app_iter = self.app(environ, capture)
+        # Một số ứng dụng chỉ gọi start_response khi trả phần dữ liệu đầu tiên
+        first = []
+        iterator = iter(app_iter)
+        if not captured:
+            first = list(itertools.islice(iterator, 1))
+        status, headers, exc_info = captured
+
+        compressible = self.is_compressible(headers)
+        if compressible and not header_value(headers, 'content-encoding'):
+            headers = headers + [('Vary', 'Accept-Encoding')]
+        if encoding is None or not compressible or not self.should_compress(environ, status, headers):
+            start_response(status, headers, exc_info)
+            return app_iter if not first else self._stream(first, iterator, app_iter, None, None)
+
+        streamed = header_value(headers, 'content-length') is None
+        headers = [(name, weak_etag(value) if name.lower() == 'etag' else value)
+                   for name, value in headers if name.lower() != 'content-length']
+        headers.append(('Content-Encoding', encoding))
+        level = self.levels[encoding]
+
+        if streamed:
+            start_response(status, headers, exc_info)
+            return self._stream(first, iterator, app_iter, encoding, level)
+
+        try:
+            body = b''.join(itertools.chain(first, iterator))
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+        data = compress(body, encoding, level)
+        start_response(status, headers + [('Content-Length', str(len(data)))], exc_info)
+        return [data]
+
+    def _stream(self, first, iterator, app_iter, encoding, level):
+        stream = None
+        if encoding is not None:
+            stream = BrotliStream(level) if encoding == 'br' else GzipStream(level)
+        try:
+            for chunk in itertools.chain(first, iterator):
+                if stream is None:
+                    yield chunk
+                elif chunk:
+                    # Flush sau mỗi phần để sự kiện SSE đến trình duyệt ngay
+                    yield stream.compress(chunk) + stream.flush()
+            if stream is not None:
+                yield stream.finish()
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
@@ -0,0 +1,124 @@
+import contextvars
+import os
+from contextlib import contextmanager
+
+from flask import has_request_context, request
+from sqlalchemy import event
+
+
+# Cấu hình hiệu năng cho database, áp dụng qua sự kiện kết nối của SQLAlchemy.
+
+# Các profile SQLite: 'off' giữ nguyên mặc định của SQLite (rollback journal,
+# không chờ khóa), 'performance' dùng WAL để đọc không bị chặn bởi ghi.
+SQLITE_PROFILES = {
+    'off': {},
+    'performance': {
+        'journal_mode': 'WAL',
+        'busy_timeout': 5000,
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64000,
+        'temp_store': 'MEMORY',
+    },
+}
+
+# Các request POST chỉ đọc dữ liệu (hoặc làm việc chậm như băm mật khẩu trước khi ghi)
+# không cần giữ khóa ghi ngay từ đầu transaction. Các thao tác giỏ hàng chỉ đọc tồn kho và
+# ghi vào phiên (kho phiên ghi bằng write_transaction riêng), không ghi database chính.
+READ_ONLY_ENDPOINTS = {
+    'login', 'track_product_view', 'add_to_cart', 'buy_now', 'update_cart', 'remove_from_cart',
+}
+
+_write_intent = contextvars.ContextVar('write_intent', default=None)
+
+
+# Đánh dấu các transaction bên trong là transaction ghi (dùng cho luồng nền, lệnh CLI)
+@contextmanager
+def write_transaction():
+    token = _write_intent.set(True)
+    try:
+        yield
+    finally:
+        _write_intent.reset(token)
+
+
+def is_write_transaction():
+    intent = _write_intent.get()
+    if intent is not None:
+        return intent
+    if has_request_context():
+        return request.method not in ('GET', 'HEAD', 'OPTIONS') and request.endpoint not in READ_ONLY_ENDPOINTS
+    return False
+
+
+# Tùy chọn engine cho PostgreSQL, cấu hình theo từng worker qua biến môi trường.
+# Tổng số kết nối tối đa = số worker x (DB_POOL_SIZE + DB_MAX_OVERFLOW).
+def postgresql_engine_options():
+    options = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes'),
+        'connect_args': {
+            'application_name': os.environ.get('DB_APPLICATION_NAME', 'fashion-store'),
+            'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 5)),
+        },
+    }
+    # Giới hạn thời gian chạy mỗi câu lệnh để truy vấn chậm không giữ kết nối mãi
+    settings = []
+    statement_timeout = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 30000))
+    if statement_timeout:
+        settings.append(f'-c statement_timeout={statement_timeout}')
+    idle_timeout = int(os.environ.get('DB_IDLE_IN_TRANSACTION_TIMEOUT_MS', 60000))
+    if idle_timeout:
+        settings.append(f'-c idle_in_transaction_session_timeout={idle_timeout}')
+    if settings:
+        options['connect_args']['options'] = ' '.join(settings)
+    return options
+
+
+# Chuẩn hóa URL (Render/Heroku dùng tiền tố postgres://) và trả về tùy chọn engine tương ứng
+def database_config(default_url, env='DATABASE_URL'):
+    url = os.environ.get(env, default_url)
+    # Chỉ định rõ driver psycopg2 (SQLAlchemy mới mặc định dùng psycopg 3)
+    for prefix in ('postgres://', 'postgresql://'):
+        if url.startswith(prefix):
+            url = 'postgresql+psycopg2://' + url[len(prefix):]
+    if url.startswith('postgresql'):
+        return url, postgresql_engine_options()
+    return url, {}
+
+
+def sqlite_pragmas(profile=None):
+    profile = profile or os.environ.get('SQLITE_PROFILE', 'performance')
+    pragmas = dict(SQLITE_PROFILES[profile])
+    # Cho phép ghi đè từng pragma qua biến môi trường, ví dụ SQLITE_BUSY_TIMEOUT=10000
+    for name in SQLITE_PROFILES['performance']:
+        value = os.environ.get(f'SQLITE_{name.upper()}')
+        if value is not None:
+            pragmas[name] = value
+    return pragmas
+
+
+def configure_sqlite(engine, profile=None):
+    pragmas = sqlite_pragmas(profile)
+    if not pragmas:
+        return pragmas
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        # Tắt BEGIN tự động của pysqlite để tự phát lệnh BEGIN trong sự kiện 'begin'
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+    # Transaction ghi lấy khóa ngay từ đầu: tránh lỗi "database is locked" khi
+    # nâng cấp khóa đọc lên khóa ghi, trường hợp busy_timeout không xử lý được
+    @event.listens_for(engine, 'begin')
+    def begin_sqlite_transaction(connection):
+        connection.exec_driver_sql('BEGIN IMMEDIATE' if is_write_transaction() else 'BEGIN')
+
+    return pragmas
@@ -0,0 +1,107 @@
+# Cấu hình gunicorn: gunicorn -c gunicorn.conf.py app:app
+#
+# GUNICORN_WORKER_CLASS: 'gevent' (mặc định), 'gthread' hoặc 'sync'. gevent cho phép nhiều kết nối
+# chờ lâu (luồng đơn hàng SSE của admin, SMTP) mà không giữ luồng; gthread/sync chỉ phục vụ được
+# vài kết nối SSE mỗi worker (xem order_feed.default_max_streams).
+# Số worker/luồng tính theo số nhân CPU, có thể ghi đè bằng WEB_CONCURRENCY và GUNICORN_THREADS.
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+
+# gevent phải vá thư viện chuẩn trước khi app (và SQLAlchemy, smtplib...) được import ở master
+if worker_class == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+    try:
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+    except ImportError:
+        pass
+
+from order_feed import default_max_streams
+
+cores = multiprocessing.cpu_count()
+
+if worker_class == 'sync':
+    default_workers = cores * 2 + 1
+    default_threads = 1
+elif worker_class == 'gthread':
+    # Ít tiến trình hơn, mỗi tiến trình nhiều luồng: chờ SMTP/khóa/SSE không chiếm cả tiến trình
+    default_workers = cores + 1
+    default_threads = 8
+else:
+    default_workers = cores + 1
+    default_threads = 1
+
+workers = int(os.environ.get('WEB_CONCURRENCY', default_workers))
+threads = int(os.environ.get('GUNICORN_THREADS', default_threads))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+# Mỗi kết nối SSE của admin giữ một greenlet (gevent) hoặc một luồng (gthread/sync) cho đến khi đóng
+os.environ.setdefault('ORDER_FEED_MAX_STREAMS', str(default_max_streams(worker_class, threads, worker_connections)))
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+
+# Tái tạo worker định kỳ để giải phóng bộ nhớ phân mảnh
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests // 10
+
+# Master chỉ import app, không khởi tạo database lúc import
+os.environ.setdefault('INIT_DB_ON_IMPORT', '0')
+
+# Thư mục chỉ số Prometheus dùng chung giữa các worker: phải có trước khi app được
+# import (preload_app import ngay sau khi đọc file này), xóa chỉ số của lần chạy trước
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'fashion-store-metrics'))
+shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+
+# Khởi tạo database một lần ở master, trước khi fork các worker
+def when_ready(server):
+    from app import app, db, init_db, warm_templates
+    try:
+        init_db()
+    except Exception as e:
+        server.log.error(f"Database initialization error: {str(e)}")
+    # Biên dịch trước template ở master: các worker được fork thừa hưởng template đã biên dịch
+    if preload_app and os.environ.get('TEMPLATE_WARMUP', '1') == '1':
+        timings = warm_templates()
+        for name, elapsed_ms, error in timings:
+            if error:
+                server.log.warning(f"Template {name} failed to compile: {error}")
+            else:
+                server.log.info(f"Template {name} compiled in {elapsed_ms:.1f} ms")
+        server.log.info(f"Warmed {len(timings)} templates in {sum(t[1] for t in timings):.1f} ms")
+    # Dựng chỉ mục gợi ý tìm kiếm một lần ở master, các worker dùng chung qua fork
+    if preload_app:
+        from app import search_suggestions
+        try:
+            search_suggestions.rebuild()
+            server.log.info(f"Search suggestion index built with {len(search_suggestions.products)} products")
+        except Exception as e:
+            server.log.error(f"Search suggestion index error: {str(e)}")
+    with app.app_context():
+        db.engine.dispose()
+
+
+# Mỗi worker bỏ các kết nối kế thừa từ master (không đóng socket dùng chung), tự mở kết nối mới
+def post_fork(server, worker):
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose(close=False)
+    store = getattr(app.session_interface, 'store', None)
+    if store is not None:
+        store.engine.dispose(close=False)
+
+
+# Worker đã thoát: gộp gauge "livesum" của nó khỏi tổng
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
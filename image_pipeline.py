@@ -0,0 +1,202 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from PIL import Image, ImageOps, features
+
+
+# Tạo ảnh responsive từ ảnh gốc trong static/: nhiều kích thước, định dạng
+# WebP (AVIF tùy chọn) kèm JPEG dự phòng. Tên file chứa mã băm nội dung nên có thể cache
+# vĩnh viễn; danh sách biến thể được lưu trong manifest.json dùng chung giữa các worker.
+
+IMAGE_WIDTHS = (320, 640, 1024, 1600)
+SOURCE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+SAVE_OPTIONS = {
+    'avif': {'format': 'AVIF', 'speed': 6},
+    'webp': {'format': 'WEBP', 'method': 4},
+    'jpeg': {'format': 'JPEG', 'optimize': True, 'progressive': True},
+}
+
+
+# Định dạng theo thứ tự ưu tiên của trình duyệt; JPEG luôn có để làm ảnh dự phòng
+def supported_formats(requested=None):
+    requested = requested or ['webp']
+    formats = [fmt for fmt in requested if fmt != 'jpeg' and (fmt != 'avif' or features.check('avif'))]
+    return formats + ['jpeg']
+
+
+class ImagePipeline:
+    def __init__(self, static_folder, output_dir, widths=IMAGE_WIDTHS, formats=None, quality=80,
+                 reload_interval=2.0):
+        self.static_folder = static_folder
+        self.output_dir = output_dir
+        self.widths = tuple(sorted(widths))
+        self.formats = supported_formats(formats)
+        self.quality = quality
+        self.reload_interval = reload_interval
+        self.manifest_path = os.path.join(output_dir, 'manifest.json')
+        self.manifest = {}
+        self.manifest_mtime = None
+        self.checked_at = 0
+        self.pending = set()
+        self.failed = set()
+        self.lock = threading.Lock()
+        self.wake_event = threading.Event()
+        self.thread = None
+        self.pid = None
+
+    # '/static/images/a.jpg' hoặc 'images/a.jpg' -> 'images/a.jpg'; None nếu không phải ảnh trong static
+    def source_key(self, image_url):
+        if not image_url or '://' in image_url:
+            return None
+        key = image_url.split('?')[0].lstrip('/')
+        if key.startswith('static/'):
+            key = key[len('static/'):]
+        if not key.lower().endswith(SOURCE_EXTENSIONS):
+            return None
+        path = os.path.normpath(os.path.join(self.static_folder, key))
+        if not path.startswith(os.path.abspath(self.static_folder) + os.sep):
+            return None
+        return key.replace(os.sep, '/')
+
+    def _load_manifest(self):
+        try:
+            mtime = os.path.getmtime(self.manifest_path)
+        except OSError:
+            return {}
+        if mtime != self.manifest_mtime:
+            try:
+                with open(self.manifest_path) as f:
+                    self.manifest = json.load(f)
+                self.manifest_mtime = mtime
+            except (OSError, ValueError):
+                pass
+        return self.manifest
+
+    # Biến thể của một ảnh, hoặc None nếu chưa được xử lý
+    def lookup(self, image_url):
+        key = self.source_key(image_url)
+        if key is None:
+            return None
+        now = time.time()
+        if now - self.checked_at >= self.reload_interval:
+            self.checked_at = now
+            self._load_manifest()
+        return self.manifest.get(key)
+
+    def _variant_widths(self, width):
+        widths = [w for w in self.widths if w < width]
+        # Luôn có một biến thể ở kích thước gốc (không phóng to ảnh nhỏ)
+        widths.append(min(width, self.widths[-1]))
+        return widths
+
+    def process(self, image_url):
+        key = self.source_key(image_url)
+        if key is None:
+            return None
+        source_path = os.path.join(self.static_folder, key)
+        with open(source_path, 'rb') as f:
+            data = f.read()
+        # Mã băm gồm cả cấu hình mã hóa để đổi chất lượng/kích thước sẽ sinh URL mới
+        settings = f'{self.widths}{self.formats}{self.quality}'.encode()
+        digest = hashlib.sha256(data + settings).hexdigest()[:12]
+
+        manifest = self._load_manifest()
+        entry = manifest.get(key)
+        if entry is not None and entry['hash'] == digest:
+            return entry
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        stem = os.path.splitext(key)[0].replace('/', '-')
+        with Image.open(source_path) as image:
+            image = ImageOps.exif_transpose(image)
+            original_width, original_height = image.size
+            variants = {fmt: [] for fmt in self.formats}
+            for width in self._variant_widths(original_width):
+                height = round(original_height * width / original_width)
+                resized = image.resize((width, height), Image.LANCZOS) if width != original_width else image
+                for fmt in self.formats:
+                    filename = f'{stem}.{digest}.{width}w.{"jpg" if fmt == "jpeg" else fmt}'
+                    path = os.path.join(self.output_dir, filename)
+                    if not os.path.exists(path):
+                        self._save(resized, path, fmt)
+                    variants[fmt].append([filename, width])
+
+        entry = {'hash': digest, 'width': original_width, 'height': original_height, 'variants': variants}
+        self._update_manifest(key, entry)
+        return entry
+
+    def _save(self, image, path, fmt):
+        if fmt == 'jpeg' and image.mode != 'RGB':
+            # JPEG không có kênh alpha: ghép lên nền trắng
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            rgba = image.convert('RGBA')
+            background.paste(rgba, mask=rgba.getchannel('A'))
+            image = background
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        # Ghi vào file tạm rồi đổi tên để worker khác không đọc phải file dở dang
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        image.save(tmp_path, quality=self.quality, **SAVE_OPTIONS[fmt])
+        os.replace(tmp_path, path)
+
+    def _update_manifest(self, key, entry):
+        with self.lock:
+            # Đọc lại từ đĩa để không ghi đè kết quả của worker khác
+            self.manifest_mtime = None
+            manifest = dict(self._load_manifest())
+            manifest[key] = entry
+            tmp_path = f'{self.manifest_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(manifest, f)
+            os.replace(tmp_path, self.manifest_path)
+            self.manifest = manifest
+            self.manifest_mtime = os.path.getmtime(self.manifest_path)
+
+    def _ensure_thread(self):
+        if self.thread is not None and self.thread.is_alive() and self.pid == os.getpid():
+            return
+        self.pid = os.getpid()
+        self.thread = threading.Thread(target=self._run, name='image-pipeline', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            self.wake_event.wait()
+            self.wake_event.clear()
+            while True:
+                with self.lock:
+                    if not self.pending:
+                        break
+                    image_url = self.pending.pop()
+                try:
+                    self.process(image_url)
+                except Exception as e:
+                    # Không thử lại ảnh lỗi (thiếu file, hỏng) ở mỗi lần render
+                    self.failed.add(image_url)
+                    print(f"Image pipeline error ({image_url}): {str(e)}")
+
+    # Xếp ảnh vào hàng đợi xử lý nền
+    def enqueue(self, image_url):
+        key = self.source_key(image_url)
+        if key is None or key in self.failed:
+            return
+        with self.lock:
+            self._ensure_thread()
+            self.pending.add(key)
+        self.wake_event.set()
+
+    # Xử lý đồng bộ toàn bộ ảnh gốc trong thư mục (dùng cho lệnh CLI)
+    def process_directory(self, subdir='images'):
+        output_dir = os.path.abspath(self.output_dir)
+        results = []
+        for root, dirs, files in os.walk(os.path.join(self.static_folder, subdir)):
+            dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != output_dir]
+            for name in sorted(files):
+                if name.lower().endswith(SOURCE_EXTENSIONS):
+                    key = os.path.relpath(os.path.join(root, name), self.static_folder).replace(os.sep, '/')
+                    results.append((key, self.process(key)))
+        return results
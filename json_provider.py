@@ -0,0 +1,99 @@
+import dataclasses
+import decimal
+import uuid
+from datetime import date, datetime, timezone
+
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy.engine import Row
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# JSON provider cho Flask dùng orjson: Decimal, datetime và Row của SQLAlchemy được
+# mã hóa trực tiếp nên view có thể trả thẳng kết quả truy vấn, không cần vòng lặp
+# chuyển từng dòng sang dict/float/chuỗi ngày. Không cài orjson thì dùng module json
+# chuẩn với cùng quy tắc chuyển đổi.
+#
+# - Decimal -> số thực (giá tiền, điểm trung bình)
+# - datetime không có múi giờ được coi là UTC (database lưu datetime.utcnow()),
+#   xuất ISO 8601 đến giây: "2026-10-19T18:41:00+00:00"
+# - Row -> object theo tên cột (đặt tên bằng .label()), giữ thứ tự cột của truy vấn
+#   (không sắp xếp khóa)
+
+# Tên cột theo metadata của kết quả truy vấn: Row._fields tạo tuple mới mỗi lần gọi
+# nên được tính một lần cho mỗi dạng kết quả
+_row_fields = {}
+
+
+def _row_to_dict(row):
+    parent = row._parent
+    fields = _row_fields.get(parent)
+    if fields is None:
+        if len(_row_fields) > 1000:
+            _row_fields.clear()
+        fields = _row_fields[parent] = tuple(str(field) for field in row._fields)
+    return dict(zip(fields, row))
+
+
+def _default(o):
+    if isinstance(o, decimal.Decimal):
+        return float(o)
+    if isinstance(o, Row):
+        return _row_to_dict(o)
+    if isinstance(o, uuid.UUID):
+        return str(o)
+    if hasattr(o, '__html__'):
+        return str(o.__html__())
+    raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
+
+
+def _stdlib_default(o):
+    if isinstance(o, datetime):
+        if o.tzinfo is None:
+            o = o.replace(tzinfo=timezone.utc)
+        return o.isoformat(timespec='seconds')
+    if isinstance(o, date):
+        return o.isoformat()
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return dataclasses.asdict(o)
+    return _default(o)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    default = staticmethod(_stdlib_default)
+    ensure_ascii = False
+    sort_keys = False
+
+    def orjson_options(self, pretty=False, sort_keys=None):
+        options = orjson.OPT_NAIVE_UTC | orjson.OPT_OMIT_MICROSECONDS | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys if sort_keys is None else sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if pretty:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        # orjson luôn xuất dạng gọn nên bỏ qua separators (cookie phiên truyền vào);
+        # sort_keys đến từ filter tojson của Jinja; tùy chọn khác (indent, cls...) dùng json chuẩn
+        kwargs.pop('separators', None)
+        sort_keys = kwargs.pop('sort_keys', self.sort_keys)
+        if orjson is None or kwargs:
+            return super().dumps(obj, sort_keys=sort_keys, **kwargs)
+        return orjson.dumps(obj, default=_default, option=self.orjson_options(sort_keys=sort_keys)).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    # Tạo response trực tiếp từ bytes của orjson, không qua bước decode/encode chuỗi
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = self.compact is False or (self.compact is None and self._app.debug)
+        data = orjson.dumps(obj, default=_default, option=self.orjson_options(pretty))
+        return self._app.response_class(data + b'\n', mimetype=self.mimetype)
@@ -0,0 +1,106 @@
+import os
+import time
+
+from flask import Response, g, has_request_context, request, before_render_template, template_rendered, got_request_exception
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+from sqlalchemy import event
+
+
+# Chỉ số kiểu Prometheus cho route, SQL và template. Khi chạy nhiều worker gunicorn,
+# đặt PROMETHEUS_MULTIPROC_DIR (gunicorn.conf.py tự đặt) để mỗi worker ghi ra file mmap
+# riêng và /metrics cộng dồn từ thư mục đó.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Thời gian xử lý request', ['endpoint', 'method', 'status'],
+    buckets=LATENCY_BUCKETS
+)
+REQUEST_EXCEPTIONS = Counter('http_request_exceptions_total', 'Số request phát sinh exception', ['endpoint'])
+REQUESTS_IN_PROGRESS = Gauge(
+    'http_requests_in_progress', 'Số request đang xử lý', multiprocess_mode='livesum'
+)
+APP_ERRORS = Counter('app_errors_total', 'Lỗi bị bắt và chỉ ghi log (gửi email, tác vụ nền...)', ['source'])
+SQL_LATENCY = Histogram(
+    'db_statement_duration_seconds', 'Thời gian chạy câu lệnh SQL', ['endpoint', 'operation'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5)
+)
+TEMPLATE_LATENCY = Histogram(
+    'template_render_duration_seconds', 'Thời gian render template', ['template'], buckets=LATENCY_BUCKETS
+)
+SESSION_COOKIE_SIZE = Histogram(
+    'session_cookie_bytes', 'Kích thước cookie phiên client gửi lên',
+    buckets=(0, 256, 512, 1024, 2048, 3072, 4096)
+)
+
+
+def current_endpoint():
+    if has_request_context():
+        return request.endpoint or 'unknown'
+    return 'background'
+
+
+def install_metrics(app, engine):
+    session_cookie_name = app.config.get('SESSION_COOKIE_NAME', 'session')
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        g.request_in_progress = True
+        REQUESTS_IN_PROGRESS.inc()
+        SESSION_COOKIE_SIZE.observe(len(request.cookies.get(session_cookie_name, '')))
+
+    @app.after_request
+    def observe_request(response):
+        started = g.get('request_started')
+        if started is not None:
+            REQUEST_LATENCY.labels(current_endpoint(), request.method, str(response.status_code)).observe(
+                time.perf_counter() - started
+            )
+        return response
+
+    @app.teardown_request
+    def finish_request(exc):
+        if g.pop('request_in_progress', False):
+            REQUESTS_IN_PROGRESS.dec()
+
+    def record_exception(sender, exception, **extra):
+        REQUEST_EXCEPTIONS.labels(current_endpoint()).inc()
+    got_request_exception.connect(record_exception, app, weak=False)
+
+    def start_template_timer(sender, template, context, **extra):
+        g.setdefault('template_started', []).append(time.perf_counter())
+    before_render_template.connect(start_template_timer, app, weak=False)
+
+    def observe_template(sender, template, context, **extra):
+        stack = g.get('template_started')
+        if stack:
+            TEMPLATE_LATENCY.labels(template.name or 'string').observe(time.perf_counter() - stack.pop())
+    template_rendered.connect(observe_template, app, weak=False)
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('statement_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def observe_statement(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['statement_started'].pop()
+        operation = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else 'other'
+        SQL_LATENCY.labels(current_endpoint(), operation).observe(time.perf_counter() - started)
+
+    @event.listens_for(engine, 'handle_error')
+    def discard_statement_timer(context):
+        if context.connection is not None:
+            stack = context.connection.info.get('statement_started')
+            if stack:
+                stack.pop()
+
+
+def metrics_response():
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
@@ -0,0 +1,162 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, select, text, update
+from sqlalchemy.schema import CreateColumn
+
+
+# Quản lý phiên bản schema cho database đã tồn tại.
+# db.create_all() chỉ tạo bảng mới, không thêm chỉ mục/cột vào bảng cũ,
+# nên mỗi thay đổi như vậy được khai báo thành một migration có số thứ tự.
+
+migration_metadata = MetaData()
+
+schema_migrations = Table(
+    'schema_migrations', migration_metadata,
+    Column('version', Integer, primary_key=True),
+    Column('description', String(200)),
+    Column('applied_at', DateTime, default=datetime.utcnow),
+)
+
+
+# Tạo các chỉ mục đã khai báo trên model (theo tên), bỏ qua chỉ mục đã có
+def create_indexes(*names):
+    def apply(connection, metadata):
+        found = set()
+        for table in metadata.tables.values():
+            for index in table.indexes:
+                if index.name in names:
+                    index.create(connection, checkfirst=True)
+                    found.add(index.name)
+        missing = set(names) - found
+        if missing:
+            raise ValueError(f"Unknown indexes: {', '.join(sorted(missing))}")
+    return apply
+
+
+# Thêm các cột đã khai báo trên model vào bảng cũ, bỏ qua cột đã có
+def add_columns(table_name, *names):
+    def apply(connection, metadata):
+        table = metadata.tables[table_name]
+        existing = {column['name'] for column in inspect(connection).get_columns(table_name)}
+        for name in names:
+            if name in existing:
+                continue
+            definition = CreateColumn(table.c[name]).compile(dialect=connection.dialect)
+            connection.execute(text(f'ALTER TABLE {table_name} ADD COLUMN {definition}'))
+    return apply
+
+
+# Gộp nhiều bước thành một migration (chạy chung một transaction)
+def steps(*functions):
+    def apply(connection, metadata):
+        for function in functions:
+            function(connection, metadata)
+    return apply
+
+
+# Tính khóa sắp xếp cho sản phẩm đã có: giá thấp nhất của biến thể (không có biến thể
+# thì dùng giá gốc), điểm và số đánh giá, tổng số lượng đã đặt mua
+def backfill_product_sort_keys(connection, metadata):
+    products = metadata.tables['products']
+    variants = metadata.tables['product_variants']
+    reviews = metadata.tables['product_reviews']
+    details = metadata.tables['order_details']
+    connection.execute(update(products).values(
+        min_price=func.coalesce(
+            select(func.min(variants.c.price)).where(variants.c.product_id == products.c.id).scalar_subquery(),
+            products.c.base_price
+        ),
+        avg_rating=func.coalesce(
+            select(func.avg(reviews.c.rating)).where(reviews.c.product_id == products.c.id).scalar_subquery(), 0
+        ),
+        review_count=select(func.count(reviews.c.id)).where(reviews.c.product_id == products.c.id).scalar_subquery(),
+        sold_count=func.coalesce(
+            select(func.sum(details.c.quantity)).select_from(
+                details.join(variants, details.c.product_variant_id == variants.c.id)
+            ).where(variants.c.product_id == products.c.id).scalar_subquery(), 0
+        ),
+    ))
+
+
+# Bộ đếm số đơn hàng chưa hủy trong ma trận gợi ý (mẫu số của điểm lift)
+def backfill_recommendation_orders(connection, metadata):
+    counters = metadata.tables['store_counters']
+    orders = metadata.tables['orders']
+    details = metadata.tables['order_details']
+    order_count = connection.execute(
+        select(func.count(func.distinct(details.c.order_id))).select_from(
+            details.join(orders, details.c.order_id == orders.c.id)
+        ).where(orders.c.status != 'cancelled')
+    ).scalar() or 0
+    connection.execute(counters.delete().where(counters.c.name == 'recommendation_orders'))
+    connection.execute(counters.insert().values(
+        name='recommendation_orders', value=order_count, updated_at=datetime.utcnow()
+    ))
+
+
+MIGRATIONS = [
+    (1, 'Chỉ mục cho các truy vấn nóng', create_indexes(
+        'ix_products_category_id',
+        'ix_product_variants_product_id',
+        'ix_orders_user_id',
+        'ix_orders_created_at',
+        'ix_orders_status_created_at',
+        'ix_order_details_order_id',
+        'ix_order_details_product_variant_id',
+        'ix_product_reviews_product_id_created_at',
+        'ix_product_comments_product_id_approved_created_at',
+    )),
+    (2, 'Đồng bộ chỉ mục với script PostgreSQL', create_indexes(
+        'ix_wishlist_product_id',
+        'ix_product_reviews_user_id',
+        'ix_recently_viewed_user_id_viewed_at',
+    )),
+    (3, 'Khóa sắp xếp sản phẩm và chỉ mục cho trang danh sách', steps(
+        add_columns('products', 'min_price', 'avg_rating', 'review_count', 'sold_count'),
+        backfill_product_sort_keys,
+        create_indexes(
+            'ix_products_active_min_price',
+            'ix_products_active_created_at',
+            'ix_products_active_rating',
+            'ix_products_active_sold_count',
+            'ix_products_active_category_min_price',
+            'ix_products_active_category_created_at',
+            'ix_products_active_category_rating',
+            'ix_products_active_category_sold_count',
+        ),
+    )),
+    (4, 'Chỉ mục updated_at cho cập nhật gợi ý tìm kiếm', create_indexes(
+        'ix_products_updated_at',
+    )),
+    (5, 'Bộ đếm số đơn hàng cho điểm lift của gợi ý', backfill_recommendation_orders),
+]
+
+
+def applied_versions(connection):
+    migration_metadata.create_all(connection)
+    return set(connection.execute(select(schema_migrations.c.version)).scalars())
+
+
+# Chạy các migration chưa áp dụng, mỗi migration trong một transaction riêng
+def run_migrations(engine, metadata):
+    with engine.begin() as connection:
+        applied = applied_versions(connection)
+
+    done = []
+    for version, description, apply in MIGRATIONS:
+        if version in applied:
+            continue
+        try:
+            with engine.begin() as connection:
+                apply(connection, metadata)
+                connection.execute(schema_migrations.insert().values(
+                    version=version, description=description, applied_at=datetime.utcnow()
+                ))
+        except Exception:
+            # Worker khác có thể vừa áp dụng cùng migration
+            with engine.begin() as connection:
+                if version in applied_versions(connection):
+                    continue
+            raise
+        done.append((version, description))
+    return done
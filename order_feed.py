@@ -0,0 +1,96 @@
+import os
+import threading
+from collections import deque
+
+
+# Số kết nối SSE tối đa mỗi worker mặc định theo loại worker gunicorn. Với gevent (mặc định)
+# mỗi kết nối chỉ là một greenlet đang chờ, nên cho phép một nửa worker_connections; với
+# gthread/sync mỗi kết nối giữ một luồng cho đến khi đóng, nên chỉ dành 1/4 số luồng cho SSE.
+# gunicorn.conf.py và app.py cùng dùng hàm này để hai nơi không lệch nhau.
+def default_max_streams(worker_class=None, threads=None, worker_connections=None):
+    worker_class = worker_class or os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+    if worker_class == 'gevent':
+        if worker_connections is None:
+            worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+        return worker_connections // 2
+    if threads is None:
+        threads = int(os.environ.get('GUNICORN_THREADS', 8 if worker_class == 'gthread' else 1))
+    return threads // 4
+
+
+# Phát sự kiện đơn hàng cho các kết nối SSE trong một worker.
+# Chỉ một luồng nền mỗi worker đọc bảng order_events (theo id tăng dần),
+# các client chỉ chờ trên Condition nên kết nối rảnh gần như không tốn gì.
+# Số kết nối được giới hạn bởi max_subscribers (None: không giới hạn).
+class OrderEventHub:
+    def __init__(self, fetch_events, latest_id, poll_interval=1.0, buffer_size=500, max_subscribers=None):
+        self.fetch_events = fetch_events
+        self.latest_id = latest_id
+        self.poll_interval = poll_interval
+        self.max_subscribers = max_subscribers
+        self.events = deque(maxlen=buffer_size)
+        self.last_id = None
+        self.subscribers = 0
+        self.condition = threading.Condition()
+        self.wake_event = threading.Event()
+        self.thread = None
+        self.pid = None
+
+    # Khởi động luồng đọc log (khởi động lại nếu tiến trình vừa fork)
+    def _ensure_thread(self):
+        if self.thread is not None and self.thread.is_alive() and self.pid == os.getpid():
+            return
+        self.pid = os.getpid()
+        self.thread = threading.Thread(target=self._run, name='order-event-hub', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            self.wake_event.wait(self.poll_interval)
+            self.wake_event.clear()
+            if not self.subscribers:
+                continue
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Order event hub error: {str(e)}")
+
+    # Đọc các sự kiện mới từ log và đánh thức các client đang chờ
+    def poll(self):
+        events = self.fetch_events(self.last_id)
+        if not events:
+            return
+        with self.condition:
+            for event in events:
+                self.events.append(event)
+                self.last_id = event['id']
+            self.condition.notify_all()
+
+    # Gọi sau khi commit để client nhận sự kiện ngay, không phải chờ chu kỳ poll
+    def wake(self):
+        self.wake_event.set()
+
+    # Trả về mốc id để bắt đầu chờ, hoặc None nếu worker đã đủ số kết nối
+    def subscribe(self):
+        with self.condition:
+            if self.max_subscribers is not None and self.subscribers >= self.max_subscribers:
+                return None
+            self.subscribers += 1
+            if self.last_id is None:
+                # Lần đầu: chỉ lấy mốc id hiện tại, không phát lại lịch sử
+                self.last_id = self.latest_id()
+        self._ensure_thread()
+        return self.last_id
+
+    def unsubscribe(self):
+        with self.condition:
+            self.subscribers -= 1
+
+    # Chờ các sự kiện có id > after_id, trả về [] khi hết timeout
+    def wait_for(self, after_id, timeout):
+        with self.condition:
+            pending = [e for e in self.events if e['id'] > after_id]
+            if not pending:
+                self.condition.wait(timeout)
+                pending = [e for e in self.events if e['id'] > after_id]
+        return pending
@@ -0,0 +1,185 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.orm import with_parent
+
+from app import (db, Order, OrderDetail, PRODUCT_SORTS, product_listing_query, product_variants_query,
+                 product_reviews_query, recommendations_query, reviews_query, average_rating_query,
+                 comments_query, customer_orders_query, wishlist_query, recently_viewed_query,
+                 recent_orders_query, admin_orders_query, revenue_query, products_validators,
+                 product_detail_validators, get_reviews_validators, get_comments_validators,
+                 load_variant_stock)
+
+
+# Kiểm tra hồi quy kế hoạch thực thi: mỗi truy vấn nóng của các route phải
+# dùng chỉ mục, không được quét toàn bộ bảng (EXPLAIN QUERY PLAN của SQLite,
+# EXPLAIN với enable_seqscan = off trên PostgreSQL). Trang danh sách sản phẩm còn
+# phải lấy đúng thứ tự từ chỉ mục, không sắp xếp lại toàn bộ kết quả.
+# Truy vấn được dựng bằng chính các hàm mà route dùng; các validator của conditional GET
+# và các hàm tự chạy truy vấn được gọi thật, mọi câu SELECT chúng phát ra đều được kiểm tra.
+
+# Các bảng tham chiếu nhỏ được phép quét toàn bộ
+SMALL_TABLES = {'categories', 'colors', 'sizes', 'store_counters'}
+
+
+def compile_query(query):
+    compiled = query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'render_postcompile': True})
+    if compiled.positiontup is not None:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+    return str(compiled), params
+
+
+# Ghi lại các câu SELECT được gửi tới database trong khối with
+@contextmanager
+def captured_statements():
+    statements = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+
+# Mỗi mục: (tên, câu SQL, tham số, allow_index_scan, allow_sort)
+def query_check(name, query, allow_index_scan=False, allow_sort=True):
+    return (name, *compile_query(query), allow_index_scan, allow_sort)
+
+
+def captured_checks(name, call, *args):
+    with captured_statements() as statements:
+        call(*args)
+    return [(f"{name} #{i}" if len(statements) > 1 else name, statement, params, False, True)
+            for i, (statement, params) in enumerate(statements, 1)]
+
+
+# Mọi tổ hợp sắp xếp x (danh mục) x (khoảng giá) của trang /products
+def product_listing_queries():
+    queries = []
+    for sort in PRODUCT_SORTS:
+        for category_id in (None, 1):
+            for min_price, max_price in ((None, None), (100000, 500000)):
+                query = product_listing_query(category_id, '', min_price, max_price, sort)
+                name = f"products: sort={sort}" + (' category' if category_id else '') + (' price' if min_price else '')
+                queries.append(query_check(name, query, allow_sort=False))
+    return queries
+
+
+def hot_queries():
+    now = datetime.utcnow()
+    return product_listing_queries() + [
+        query_check('product_detail: variants', product_variants_query(1)),
+        query_check('product_detail: reviews', product_reviews_query(1)),
+        query_check('product_detail: recommendations', recommendations_query(1)),
+        query_check('get_reviews', reviews_query(1)),
+        query_check('get_reviews: average', average_rating_query(1)),
+        query_check('get_comments', comments_query(1)),
+        query_check('my_account: orders', customer_orders_query(1)),
+        # Tải lười order.details trong template order_detail.html
+        query_check('order_detail: details', db.session.query(OrderDetail).filter(with_parent(Order(id=1), Order.details))),
+        query_check('wishlist', wishlist_query(1)),
+        query_check('recently_viewed', recently_viewed_query(1, 10)),
+        # Duyệt chỉ mục created_at theo thứ tự rồi dừng sau LIMIT: chấp nhận được
+        query_check('admin_dashboard: recent orders', recent_orders_query(), True),
+        query_check('admin_orders: by status', admin_orders_query('pending')),
+        query_check('admin_reports: monthly revenue', revenue_query(now - timedelta(days=30), now)),
+    ] + (
+        # Validator của conditional GET chạy ở mọi request, kể cả khi trả 304
+        captured_checks('products: validators', products_validators)
+        + captured_checks('product_detail: validators', product_detail_validators, 1)
+        + captured_checks('get_reviews: validators', get_reviews_validators, 1)
+        + captured_checks('get_comments: validators', get_comments_validators, 1)
+        + captured_checks('stock_availability', load_variant_stock, [1, 2, 3])
+    )
+
+
+def explain(statement, params):
+    connection = db.session.connection()
+    if db.engine.dialect.name == 'postgresql':
+        # Bảng nhỏ luôn được quét tuần tự; tắt seqscan để kiểm tra có đường đi qua chỉ mục hay không
+        connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+        rows = connection.exec_driver_sql('EXPLAIN ' + statement, params).all()
+        return [row[0] for row in rows]
+    rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, params).all()
+    return [row[-1] for row in rows]
+
+
+# Trả về các dòng kế hoạch quét toàn bảng. "SCAN ... USING INDEX" cũng là quét
+# toàn bộ (theo thứ tự chỉ mục), chỉ chấp nhận khi truy vấn có LIMIT nhỏ.
+# allow_sort=False: sắp xếp kết quả bằng B-tree tạm cũng bị tính là lỗi.
+def full_scans(plan, allow_index_scan=False, allow_sort=True):
+    problems = []
+    for detail in plan:
+        if not allow_sort and detail.startswith('USE TEMP B-TREE FOR ORDER BY'):
+            problems.append(detail)
+            continue
+        if not detail.startswith('SCAN '):
+            continue
+        if allow_index_scan and ' INDEX ' in detail:
+            continue
+        table = detail.split()[1]
+        if table in SMALL_TABLES:
+            continue
+        problems.append(detail)
+    return problems
+
+
+# Tương tự cho PostgreSQL: "Seq Scan", quét chỉ mục không có "Index Cond", hoặc node "Sort"
+def postgresql_full_scans(plan, allow_index_scan=False, allow_sort=True):
+    problems = []
+    for i, line in enumerate(plan):
+        node = line.strip().lstrip('->').strip()
+        if not allow_sort and (node.startswith('Sort ') or node.startswith('Incremental Sort ')):
+            problems.append(node)
+            continue
+        if ' on ' not in node or 'Scan' not in node.split(' on ')[0]:
+            continue
+        table = node.split(' on ')[1].split()[0]
+        if table in SMALL_TABLES:
+            continue
+        if node.startswith('Seq Scan'):
+            problems.append(node)
+            continue
+        if allow_index_scan or node.startswith('Bitmap Heap Scan'):
+            continue
+        # Các dòng chi tiết của node nằm ngay sau, trước node kế tiếp
+        details = []
+        for following in plan[i + 1:]:
+            if following.strip().startswith('->'):
+                break
+            details.append(following.strip())
+        if not any(d.startswith('Index Cond') for d in details):
+            problems.append(node)
+    return problems
+
+
+def check_query_plans():
+    dialect = db.engine.dialect.name
+    if dialect not in ('sqlite', 'postgresql'):
+        print(f"Query plan checks do not support {dialect}.")
+        return []
+    find_problems = postgresql_full_scans if dialect == 'postgresql' else full_scans
+
+    queries = hot_queries()
+    failures = []
+    try:
+        for name, statement, params, *options in queries:
+            plan = explain(statement, params)
+            problems = find_problems(plan, *options)
+            status = 'FAIL' if problems else 'ok'
+            print(f"[{status}] {name}")
+            for detail in plan:
+                print(f"        {detail}")
+            if problems:
+                failures.append((name, problems))
+    finally:
+        db.session.rollback()
+    print(f"{len(failures)} of {len(queries)} hot queries fall back to a full table scan.")
+    return failures
@@ -0,0 +1,134 @@
+import atexit
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+# Bộ đệm ghi sau (write-behind) cho "sản phẩm đã xem gần đây".
+# Mỗi lượt xem chỉ cập nhật bộ nhớ của worker; các lượt xem lặp lại của cùng
+# (user, sản phẩm) được gộp lại và ghi xuống database theo lô trong luồng nền.
+# Hàng đợi giữ tối đa max_pending lượt xem (bỏ lượt cũ nhất khi đầy), lượt xem ghi lỗi
+# max_attempts lần bị bỏ. Danh sách trong LRU chỉ dùng trong cache_ttl giây rồi nạp lại
+# từ database để thấy lượt xem do worker khác ghi.
+class RecentlyViewedBuffer:
+    def __init__(self, flush_fn, load_fn, max_items=10, max_users=5000,
+                 flush_interval=5.0, max_pending=1000, max_attempts=3, cache_ttl=30.0):
+        self.flush_fn = flush_fn
+        self.load_fn = load_fn
+        self.max_items = max_items
+        self.max_users = max_users
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.cache_ttl = cache_ttl
+        self.pending = {}
+        self.attempts = {}
+        self.lru = OrderedDict()
+        self.lock = threading.Lock()
+        self.wake_event = threading.Event()
+        self.thread = None
+        self.pid = None
+        atexit.register(self.flush)
+
+    def _ensure_thread(self):
+        if self.thread is not None and self.thread.is_alive() and self.pid == os.getpid():
+            return
+        self.pid = os.getpid()
+        # Tiến trình con sau fork không thừa hưởng dữ liệu chưa ghi của tiến trình cha
+        self.pending = {}
+        self.attempts = {}
+        self.thread = threading.Thread(target=self._run, name='recently-viewed-flush', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            self.wake_event.wait(self.flush_interval)
+            self.wake_event.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Recently viewed flush error: {str(e)}")
+
+    # Cập nhật danh sách đã xem (mới nhất đứng đầu) và giới hạn số phần tử
+    def _remember(self, user_id, items):
+        self.lru[user_id] = (items, time.monotonic() + self.cache_ttl)
+        self.lru.move_to_end(user_id)
+        while len(self.lru) > self.max_users:
+            self.lru.popitem(last=False)
+
+    def record(self, user_id, product_id, viewed_at=None):
+        viewed_at = viewed_at or time.time()
+        with self.lock:
+            self._ensure_thread()
+            # Xếp lại cuối hàng đợi để phần tử đầu luôn là lượt xem cũ nhất
+            self.pending.pop((user_id, product_id), None)
+            self.pending[(user_id, product_id)] = viewed_at
+            self._trim_pending()
+            cached = self.lru.get(user_id)
+            if cached is not None:
+                items = cached[0]
+                items.pop(product_id, None)
+                items[product_id] = viewed_at
+                items.move_to_end(product_id, last=False)
+                while len(items) > self.max_items:
+                    items.popitem()
+                self.lru.move_to_end(user_id)
+            if len(self.pending) >= self.max_pending // 2:
+                self.wake_event.set()
+
+    def _trim_pending(self):
+        while len(self.pending) > self.max_pending:
+            key = next(iter(self.pending))
+            del self.pending[key]
+            self.attempts.pop(key, None)
+
+    # Trả về danh sách product_id đã xem, mới nhất trước
+    def get(self, user_id):
+        with self.lock:
+            cached = self.lru.get(user_id)
+            if cached is not None and cached[1] > time.monotonic():
+                self.lru.move_to_end(user_id)
+                return list(cached[0])
+
+        loaded = dict(self.load_fn(user_id, self.max_items))
+        with self.lock:
+            # Gộp các lượt xem chưa kịp ghi xuống database
+            for (pending_user, product_id), viewed_at in self.pending.items():
+                if pending_user == user_id:
+                    loaded[product_id] = max(viewed_at, loaded.get(product_id, 0))
+            ordered = sorted(loaded.items(), key=lambda item: item[1], reverse=True)[:self.max_items]
+            items = OrderedDict(ordered)
+            self._remember(user_id, items)
+            return list(items)
+
+    def flush(self):
+        with self.lock:
+            if not self.pending:
+                return
+            batch, self.pending = self.pending, {}
+        try:
+            self.flush_fn([
+                (user_id, product_id, viewed_at)
+                for (user_id, product_id), viewed_at in batch.items()
+            ])
+        except Exception:
+            # Đưa lại vào hàng đợi để lần sau ghi tiếp (không ghi đè lượt xem mới hơn),
+            # trừ các lượt xem đã lỗi max_attempts lần
+            with self.lock:
+                dropped = 0
+                for key, viewed_at in batch.items():
+                    attempts = self.attempts.get(key, 0) + 1
+                    if attempts >= self.max_attempts:
+                        self.attempts.pop(key, None)
+                        dropped += 1
+                    elif key not in self.pending:
+                        self.attempts[key] = attempts
+                        self.pending[key] = viewed_at
+                self._trim_pending()
+            if dropped:
+                print(f"Recently viewed: dropped {dropped} views after {self.max_attempts} failed flushes")
+            raise
+        with self.lock:
+            for key in batch:
+                self.attempts.pop(key, None)
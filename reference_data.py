@@ -0,0 +1,54 @@
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+
+# Danh mục, màu và size gần như không đổi: mỗi worker giữ một bản chụp chỉ đọc trong
+# bộ nhớ (tuple + dict theo id bọc MappingProxyType) thay vì truy vấn ở mỗi request.
+# Khi các bảng này thay đổi, transaction ghi tăng một bộ đếm phiên bản dùng chung
+# (một dòng trong database); mỗi worker chỉ đọc bộ đếm đó tối đa một lần mỗi
+# check_interval giây và nạp lại cả ba bảng khi phiên bản khác với bản đang giữ.
+
+ReferenceSnapshot = namedtuple('ReferenceSnapshot', [
+    'version', 'categories', 'colors', 'sizes', 'categories_by_id', 'colors_by_id', 'sizes_by_id'
+])
+
+
+def build_snapshot(version, categories, colors, sizes):
+    categories, colors, sizes = tuple(categories), tuple(colors), tuple(sizes)
+    return ReferenceSnapshot(
+        version, categories, colors, sizes,
+        MappingProxyType({category.id: category for category in categories}),
+        MappingProxyType({color.id: color for color in colors}),
+        MappingProxyType({size.id: size for size in sizes}),
+    )
+
+
+class ReferenceDataCache:
+    def __init__(self, load, current_version, check_interval=1.0):
+        # load() -> (categories, colors, sizes); current_version() -> giá trị bộ đếm hiện tại
+        self.load = load
+        self.current_version = current_version
+        self.check_interval = check_interval
+        self.snapshot = None
+        self.next_check = 0
+        self.lock = threading.Lock()
+
+    def get(self):
+        snapshot = self.snapshot
+        if snapshot is not None and time.monotonic() < self.next_check:
+            return snapshot
+        with self.lock:
+            now = time.monotonic()
+            if self.snapshot is not None and now < self.next_check:
+                return self.snapshot
+            version = self.current_version()
+            if self.snapshot is None or self.snapshot.version != version:
+                self.snapshot = build_snapshot(version, *self.load())
+            self.next_check = now + self.check_interval
+            return self.snapshot
+
+    # Worker vừa ghi thay đổi thì kiểm tra lại phiên bản ngay ở lần đọc sau
+    def invalidate(self):
+        self.next_check = 0
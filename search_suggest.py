@@ -0,0 +1,285 @@
+import bisect
+import os
+import re
+import threading
+import unicodedata
+
+
+# Gợi ý tìm kiếm theo tiền tố (typeahead) từ chỉ mục trong bộ nhớ, không truy vấn database.
+#
+# - Khóa được bỏ dấu tiếng Việt và viết thường ("Áo Thun Nữ" -> "ao thun nu"); mỗi tên sinh
+#   một khóa cho mỗi vị trí bắt đầu từ ("ao thun nu", "thun nu", "nu") để gõ "thun" vẫn ra.
+# - Các khóa nằm trong một mảng đã sắp xếp: khoảng khớp một tiền tố tìm bằng bisect.
+# - Khoảng nhỏ (<= scan_limit khóa) được xếp hạng trực tiếp theo độ phổ biến; khoảng lớn
+#   (tiền tố ngắn như "a", "ao") có sẵn top-K tính lúc dựng chỉ mục bằng cách gộp top-K của
+#   các tiền tố con, nên mọi truy vấn chỉ chạm tối đa scan_limit phần tử.
+# - Chỉ mục là bất biến: thay đổi tạo bản mới (dùng lại top-K của các tiền tố không bị ảnh
+#   hưởng) rồi thay bằng một phép gán, request đang đọc không cần khóa.
+
+# Lớn hơn mọi ký tự có thể có trong khóa: tiền tố + KEY_END là cận trên của khoảng khớp
+KEY_END = '\U0010ffff'
+
+_non_word = re.compile(r'[\W_]+')
+
+
+def fold(text):
+    text = unicodedata.normalize('NFD', text.lower()).replace('đ', 'd')
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(_non_word.sub(' ', text).split())
+
+
+def word_keys(name):
+    words = fold(name).split()
+    return {' '.join(words[i:]) for i in range(len(words))}
+
+
+# Ghép mảng mới từ các đoạn (slice) của mảng cũ: chi phí là một lần sao chép ở tầng C
+# cộng O(số vị trí), thay vì mỗi lần insert/del dịch cả mảng
+def _without(values, positions):
+    result = []
+    start = 0
+    for position in sorted(positions):
+        result += values[start:position]
+        start = position + 1
+    result += values[start:]
+    return result
+
+
+# positions không giảm, tính trên mảng cũ: values_to_insert[i] đứng trước values[positions[i]]
+def _with(values, positions, values_to_insert):
+    result = []
+    start = 0
+    for position, value in zip(positions, values_to_insert):
+        result += values[start:position]
+        result.append(value)
+        start = position
+    result += values[start:]
+    return result
+
+
+class SuggestionIndex:
+    def __init__(self, items=(), scan_limit=512, top_k=10, _keys=None, _refs=None, _top=None, _rank_keys=None):
+        # items: {id: (tên, trọng số)}
+        self.items = dict(items)
+        # Khóa xếp hạng của từng mục: phổ biến hơn, tên ngắn hơn đứng trước
+        self.rank_keys = _rank_keys if _rank_keys is not None else {
+            item_id: (-weight, len(name), name) for item_id, (name, weight) in self.items.items()
+        }
+        self.scan_limit = scan_limit
+        self.top_k = top_k
+        if _keys is None:
+            entries = sorted((key, item_id) for item_id, (name, _) in self.items.items() for key in word_keys(name))
+            _keys = [key for key, _ in entries]
+            _refs = [item_id for _, item_id in entries]
+        self.keys = _keys
+        self.refs = _refs
+        self.top = {} if _top is None else _top
+        if _top is None:
+            self._node('', 0, len(self.keys))
+
+    def __len__(self):
+        return len(self.items)
+
+    def _rank(self, ids):
+        return tuple(sorted(set(ids), key=self.rank_keys.__getitem__)[:self.top_k])
+
+    def _range(self, prefix):
+        lo = bisect.bisect_left(self.keys, prefix)
+        return lo, bisect.bisect_left(self.keys, prefix + KEY_END, lo)
+
+    # Top-K của khoảng [lo, hi) gồm các khóa bắt đầu bằng prefix; khoảng lớn được chia theo
+    # ký tự kế tiếp và gộp top-K của từng nhánh, kết quả lưu lại theo tiền tố
+    def _node(self, prefix, lo, hi):
+        if hi - lo <= self.scan_limit:
+            return self._rank(self.refs[lo:hi])
+        cached = self.top.get(prefix)
+        if cached is not None:
+            return cached
+        keys = self.keys
+        depth = len(prefix)
+        candidates = []
+        position = lo
+        # Khóa trùng đúng tiền tố đứng trước mọi khóa dài hơn
+        while position < hi and len(keys[position]) == depth:
+            candidates.append(self.refs[position])
+            position += 1
+        while position < hi:
+            child = prefix + keys[position][depth]
+            end = bisect.bisect_left(keys, child + KEY_END, position, hi)
+            candidates.extend(self._node(child, position, end))
+            position = end
+        result = self.top[prefix] = self._rank(candidates)
+        return result
+
+    def suggest(self, text, limit=10):
+        prefix = fold(text)
+        if not prefix:
+            return []
+        ids = self._node(prefix, *self._range(prefix))
+        return [(item_id, self.items[item_id][0]) for item_id in ids[:limit]]
+
+    # Bản mới với các mục thêm/sửa (upserts: {id: (tên, trọng số)}) và các id bị xóa
+    def updated(self, upserts=None, removals=()):
+        upserts = upserts or {}
+        touched = set(upserts) | set(removals)
+        if not touched:
+            return self
+        old_entries = [(key, item_id) for item_id in touched if item_id in self.items
+                       for key in word_keys(self.items[item_id][0])]
+        new_entries = sorted((key, item_id) for item_id, (name, _) in upserts.items() for key in word_keys(name))
+        affected = {key for key, _ in old_entries} | {key for key, _ in new_entries}
+        keys, refs = self.keys, self.refs
+        if old_entries:
+            positions = []
+            for key, item_id in old_entries:
+                position = bisect.bisect_left(keys, key)
+                while refs[position] != item_id:
+                    position += 1
+                positions.append(position)
+            keys, refs = _without(keys, positions), _without(refs, positions)
+        if new_entries:
+            positions = []
+            for key, item_id in new_entries:
+                position = bisect.bisect_left(keys, key)
+                while position < len(keys) and keys[position] == key and refs[position] < item_id:
+                    position += 1
+                positions.append(position)
+            keys = _with(keys, positions, [key for key, _ in new_entries])
+            refs = _with(refs, positions, [item_id for _, item_id in new_entries])
+        items = dict(self.items)
+        rank_keys = dict(self.rank_keys)
+        for item_id in touched:
+            items.pop(item_id, None)
+            rank_keys.pop(item_id, None)
+        items.update(upserts)
+        rank_keys.update((item_id, (-weight, len(name), name)) for item_id, (name, weight) in upserts.items())
+
+        # Bỏ top-K của mọi tiền tố của khóa bị ảnh hưởng rồi tính lại từ nhánh sâu nhất
+        stale = {key[:length] for key in affected for length in range(len(key) + 1)}
+        top = {prefix: ids for prefix, ids in self.top.items() if prefix not in stale}
+        index = SuggestionIndex(items, self.scan_limit, self.top_k, keys, refs, top, rank_keys)
+        for prefix in sorted(stale, key=len, reverse=True):
+            lo, hi = index._range(prefix)
+            if hi - lo > index.scan_limit:
+                index._node(prefix, lo, hi)
+        return index
+
+
+class SearchSuggestions:
+    def __init__(self, load_products, load_categories, refresh_interval=30, rebuild_interval=3600,
+                 scan_limit=512, top_k=10, update_limit=100):
+        # load_products(since) -> các dòng (id, name, category_id, weight, is_active, updated_at),
+        # since=None để lấy toàn bộ; load_categories() -> các dòng (id, name)
+        self.load_products = load_products
+        self.load_categories = load_categories
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.scan_limit = scan_limit
+        self.top_k = top_k
+        # Cập nhật tại chỗ tốn O(số khóa) cho mỗi sản phẩm: quá update_limit sản phẩm thì dựng lại
+        self.update_limit = update_limit
+        self.products = None
+        self.categories = None
+        self.product_categories = {}
+        self.watermark = None
+        self.lock = threading.Lock()
+        self.wake_event = threading.Event()
+        self.pending_removals = set()
+        self.thread = None
+        self.pid = None
+
+    def _ensure_thread(self):
+        if self.thread is not None and self.thread.is_alive() and self.pid == os.getpid():
+            return
+        self.pid = os.getpid()
+        self.wake_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='search-suggestions', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        since_rebuild = 0
+        while True:
+            self.wake_event.wait(self.refresh_interval)
+            woken = self.wake_event.is_set()
+            self.wake_event.clear()
+            since_rebuild += 0 if woken else self.refresh_interval
+            try:
+                # Dựng lại định kỳ để cập nhật độ phổ biến và loại sản phẩm đã xóa ở worker khác
+                if since_rebuild >= self.rebuild_interval:
+                    self.rebuild()
+                    since_rebuild = 0
+                else:
+                    self.refresh()
+            except Exception as e:
+                print(f"Search suggestion refresh error: {str(e)}")
+
+    def _category_index(self, categories, products):
+        weights = {}
+        for product_id, (_, weight) in products.items.items():
+            category_id = self.product_categories.get(product_id)
+            weights[category_id] = weights.get(category_id, 0) + weight
+        return SuggestionIndex({category_id: (name, weights.get(category_id, 0)) for category_id, name in categories},
+                               self.scan_limit, self.top_k)
+
+    def rebuild(self, force=True):
+        with self.lock:
+            if not force and self.products is not None:
+                return
+            self._rebuild()
+
+    def _rebuild(self):
+        items = {}
+        product_categories = {}
+        watermark = None
+        for product_id, name, category_id, weight, is_active, updated_at in self.load_products(None):
+            if updated_at is not None and (watermark is None or updated_at > watermark):
+                watermark = updated_at
+            if is_active:
+                items[product_id] = (name, weight or 0)
+                product_categories[product_id] = category_id
+        products = SuggestionIndex(items, self.scan_limit, self.top_k)
+        self.product_categories = product_categories
+        self.categories = self._category_index(self.load_categories(), products)
+        self.products = products
+        self.watermark = watermark
+        self.pending_removals.clear()
+
+    # Áp dụng các sản phẩm có updated_at từ mốc lần trước trở đi (>= để không bỏ sót
+    # thay đổi cùng thời điểm). Chỉ đổi tên, ẩn/hiện hoặc sản phẩm mới được áp dụng; độ
+    # phổ biến (đổi theo mỗi lượt bán) chỉ cập nhật khi dựng lại định kỳ
+    def refresh(self):
+        if self.products is None:
+            return self.rebuild()
+        with self.lock:
+            upserts, removals = {}, set(self.pending_removals)
+            self.pending_removals.clear()
+            watermark = self.watermark
+            rows = self.load_products(self.watermark) if self.watermark is not None else []
+            for product_id, name, category_id, weight, is_active, updated_at in rows:
+                if updated_at is not None and (watermark is None or updated_at > watermark):
+                    watermark = updated_at
+                if is_active:
+                    self.product_categories[product_id] = category_id
+                    removals.discard(product_id)
+                    current = self.products.items.get(product_id)
+                    if current is None or current[0] != name:
+                        upserts[product_id] = (name, current[1] if current is not None else weight or 0)
+                elif product_id in self.products.items:
+                    removals.add(product_id)
+            removals &= self.products.items.keys()
+            if len(upserts) + len(removals) > self.update_limit:
+                return self._rebuild()
+            self.products = self.products.updated(upserts, removals)
+            self.categories = self._category_index(self.load_categories(), self.products)
+            self.watermark = watermark
+
+    # Gọi sau khi worker này commit thay đổi sản phẩm: luồng nền cập nhật ngay
+    def changed(self, removed_ids=()):
+        self.pending_removals.update(removed_ids)
+        self.wake_event.set()
+
+    def suggest(self, text, limit=10):
+        self._ensure_thread()
+        if self.products is None:
+            self.rebuild(force=False)
+        return self.products.suggest(text, limit), self.categories.suggest(text, limit)
@@ -0,0 +1,264 @@
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSession, SessionInterface
+from itsdangerous import BadSignature, Signer
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, Text, delete, insert, select, update
+
+from db_tuning import write_transaction
+
+
+# Phiên lưu phía server: cookie chỉ giữ "id.phiên_bản" đã ký, dữ liệu phiên (giỏ hàng,
+# tên, quyền admin...) nằm trong bảng sessions. Mỗi worker có một LRU nhỏ phía trước;
+# mục trong LRU chỉ được dùng khi phiên bản trùng với cookie. Phiên bản do database cấp
+# (version + 1 trong chính câu UPDATE ghi dữ liệu), nên kể cả khi hai worker cùng ghi một
+# phiên, mỗi cặp (id, phiên bản) ứng với đúng một dữ liệu và LRU không bao giờ bị đọc cũ.
+# Phiên bị xóa ở worker khác (đăng xuất, đổi id) chỉ còn dùng được từ LRU tối đa cache_ttl giây.
+# Phiên chỉ được ghi lại khi dữ liệu đổi hoặc cần gia hạn; phiên hết hạn được xóa
+# theo lô trong luồng nền.
+
+session_metadata = MetaData()
+
+sessions_table = Table(
+    'sessions', session_metadata,
+    Column('id', String(64), primary_key=True),
+    Column('version', Integer, nullable=False),
+    Column('data', Text, nullable=False),
+    Column('expires_at', DateTime, nullable=False, index=True),
+)
+
+
+class ServerSession(SecureCookieSession):
+    def __init__(self, initial=None, sid=None, version=0, payload=None, expires_at=None, cookie_sid=None,
+                 cookie_version=None):
+        super().__init__(initial)
+        self.sid = sid
+        self.version = version
+        # Dữ liệu đã tuần tự hóa lúc mở phiên, so sánh khi lưu để biết phiên có đổi không
+        self.payload = payload
+        self.expires_at = expires_at
+        self.cookie_sid = cookie_sid
+        self.cookie_version = cookie_version
+        self.previous_sid = None
+
+    # Cấp id phiên mới, giữ nguyên dữ liệu (gọi khi đăng nhập/đăng xuất để chống session
+    # fixation); bản ghi theo id cũ bị xóa khi lưu phiên
+    def regenerate(self):
+        if self.sid is not None:
+            self.previous_sid = self.sid
+        self.sid = None
+        self.version = 0
+        self.payload = None
+        self.expires_at = None
+        self.modified = True
+
+
+class SessionStore:
+    def __init__(self, engine, ttl=timedelta(days=7), cache_size=10000, cache_ttl=30, gc_interval=300,
+                 gc_batch=1000):
+        self.engine = engine
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.gc_interval = gc_interval
+        self.gc_batch = gc_batch
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.table_ready = False
+        self.thread = None
+        self.pid = None
+
+    def _ensure_table(self):
+        if not self.table_ready:
+            session_metadata.create_all(self.engine)
+            self.table_ready = True
+
+    def _ensure_thread(self):
+        if self.thread is not None and self.thread.is_alive() and self.pid == os.getpid():
+            return
+        self.pid = os.getpid()
+        # Tiến trình con sau fork không dùng lại LRU của tiến trình cha
+        self.cache.clear()
+        self.thread = threading.Thread(target=self._run, name='session-gc', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            threading.Event().wait(self.gc_interval)
+            try:
+                self.purge_expired()
+            except Exception as e:
+                print(f"Session cleanup error: {str(e)}")
+
+    def _remember(self, sid, entry):
+        self.cache[sid] = (entry, time.monotonic() + self.cache_ttl)
+        self.cache.move_to_end(sid)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    # Trả về (phiên bản, dữ liệu, hạn) của phiên còn hạn, hoặc None
+    def get(self, sid, version):
+        now = datetime.utcnow()
+        with self.lock:
+            self._ensure_thread()
+            cached = self.cache.get(sid)
+            if cached is not None and cached[0][0] == version and cached[0][2] > now and \
+                    cached[1] > time.monotonic():
+                self.cache.move_to_end(sid)
+                return cached[0]
+        self._ensure_table()
+        with self.engine.connect() as connection:
+            row = connection.execute(
+                select(sessions_table.c.version, sessions_table.c.data, sessions_table.c.expires_at)
+                .where(sessions_table.c.id == sid)
+            ).first()
+        if row is None or row.expires_at <= now:
+            return None
+        entry = (row.version, row.data, row.expires_at)
+        with self.lock:
+            self._remember(sid, entry)
+        return entry
+
+    # Phiên mới với id ngẫu nhiên, trả về (id, phiên bản)
+    def create(self, payload, expires_at):
+        self._ensure_table()
+        sid = secrets.token_urlsafe(32)
+        with write_transaction(), self.engine.begin() as connection:
+            connection.execute(insert(sessions_table), {'id': sid, 'version': 1, 'data': payload,
+                                                        'expires_at': expires_at})
+        with self.lock:
+            self._remember(sid, (1, payload, expires_at))
+        return sid, 1
+
+    # Ghi dữ liệu mới, trả về phiên bản database vừa cấp hoặc None nếu phiên không còn
+    def save(self, sid, payload, expires_at):
+        self._ensure_table()
+        with write_transaction(), self.engine.begin() as connection:
+            version = connection.execute(
+                update(sessions_table).where(sessions_table.c.id == sid)
+                .values(version=sessions_table.c.version + 1, data=payload, expires_at=expires_at)
+                .returning(sessions_table.c.version)
+            ).scalar()
+        with self.lock:
+            if version is None:
+                self.cache.pop(sid, None)
+            else:
+                self._remember(sid, (version, payload, expires_at))
+        return version
+
+    # Gia hạn phiên không đổi dữ liệu; bỏ qua nếu worker khác đã ghi phiên bản mới hơn
+    def touch(self, sid, version, expires_at):
+        self._ensure_table()
+        with write_transaction(), self.engine.begin() as connection:
+            touched = connection.execute(
+                update(sessions_table)
+                .where(sessions_table.c.id == sid, sessions_table.c.version == version)
+                .values(expires_at=expires_at)
+            ).rowcount
+        with self.lock:
+            cached = self.cache.get(sid)
+            if touched and cached is not None and cached[0][0] == version:
+                self._remember(sid, (version, cached[0][1], expires_at))
+
+    def delete(self, sid):
+        self._ensure_table()
+        with write_transaction(), self.engine.begin() as connection:
+            connection.execute(delete(sessions_table).where(sessions_table.c.id == sid))
+        with self.lock:
+            self.cache.pop(sid, None)
+
+    # Xóa phiên hết hạn theo từng lô, mỗi lô một transaction ngắn để không giữ khóa ghi lâu
+    def purge_expired(self):
+        self._ensure_table()
+        total = 0
+        while True:
+            expired = select(sessions_table.c.id).where(
+                sessions_table.c.expires_at <= datetime.utcnow()
+            ).limit(self.gc_batch).scalar_subquery()
+            with write_transaction(), self.engine.begin() as connection:
+                deleted = connection.execute(delete(sessions_table).where(sessions_table.c.id.in_(expired))).rowcount
+            total += deleted
+            if deleted < self.gc_batch:
+                return total
+
+
+class ServerSessionInterface(SessionInterface):
+    serializer = TaggedJSONSerializer()
+    salt = 'server-session'
+
+    def __init__(self, store):
+        self.store = store
+
+    def get_signer(self, app):
+        return Signer(app.secret_key, salt=self.salt, key_derivation='hmac')
+
+    def open_session(self, app, request):
+        if not app.secret_key:
+            return None
+        value = request.cookies.get(self.get_cookie_name(app))
+        if value:
+            try:
+                sid, version = self.get_signer(app).unsign(value).decode().rsplit('.', 1)
+                version = int(version)
+            except (BadSignature, ValueError):
+                return ServerSession()
+            entry = self.store.get(sid, version)
+            if entry is not None:
+                current_version, payload, expires_at = entry
+                return ServerSession(self.serializer.loads(payload), sid, current_version, payload, expires_at,
+                                     cookie_sid=sid, cookie_version=version)
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if session.previous_sid is not None:
+            self.store.delete(session.previous_sid)
+            session.previous_sid = None
+
+        # Phiên bị xóa hết: xóa bản ghi và cookie
+        if not session:
+            if session.sid is not None:
+                self.store.delete(session.sid)
+            if session.cookie_sid is not None:
+                response.delete_cookie(name, domain=domain, path=path, secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app), httponly=self.get_cookie_httponly(app))
+            return
+
+        # Chỉ tuần tự hóa khi có gán giá trị vào phiên (như cookie ký của Flask, sửa trực tiếp
+        # list/dict lồng bên trong cần gán lại); dữ liệu giống hệt lúc mở thì không ghi lại
+        payload = self.serializer.dumps(dict(session)) if session.modified else session.payload
+        changed = payload != session.payload
+        now = datetime.utcnow()
+        ttl = app.permanent_session_lifetime if session.permanent else self.store.ttl
+        # Chỉ gia hạn khi đã dùng quá nửa thời hạn, tránh ghi database ở mọi request
+        refresh = session.expires_at is None or session.expires_at - now < ttl / 2
+        if session.sid is not None and changed:
+            version = self.store.save(session.sid, payload, now + ttl)
+            if version is None:
+                # Bản ghi đã hết hạn và bị dọn: lưu thành phiên mới
+                session.sid = None
+            else:
+                session.version = version
+        elif session.sid is not None and refresh:
+            self.store.touch(session.sid, session.version, now + ttl)
+        if session.sid is None:
+            session.sid, session.version = self.store.create(payload, now + ttl)
+
+        if (session.cookie_sid, session.cookie_version) != (session.sid, session.version) or \
+                (refresh and session.permanent):
+            response.set_cookie(
+                name, self.get_signer(app).sign(f'{session.sid}.{session.version}').decode(),
+                expires=self.get_expiration_time(app, session), httponly=self.get_cookie_httponly(app),
+                domain=domain, path=path, secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app)
+            )
@@ -0,0 +1,233 @@
+import fcntl
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from flask import has_request_context, request
+from sqlalchemy import event
+
+
+# Ghi lại các câu lệnh SQL chạy lâu hơn ngưỡng: SQL đã chuẩn hóa, kiểu tham số
+# (không ghi giá trị), thời gian, endpoint và kế hoạch thực thi. EXPLAIN chạy
+# trong luồng nền trên kết nối riêng nên không làm chậm thêm request, và mỗi dạng câu
+# lệnh (fingerprint) chỉ được EXPLAIN tối đa một lần mỗi explain_interval giây để không
+# nhân đôi tải lên database đúng lúc database đang chậm. EXPLAIN ANALYZE (PostgreSQL,
+# chạy lại câu lệnh thật) chỉ dùng khi bật analyze.
+
+_IN_LIST = re.compile(r'\((?:\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*,)+\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*\)')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r'\s+')
+
+
+# Gom các câu lệnh chỉ khác nhau ở hằng số hoặc độ dài danh sách IN về cùng một dạng
+def normalize_sql(statement):
+    statement = _SPACE.sub(' ', statement).strip()
+    statement = _LITERAL.sub('?', statement)
+    return _IN_LIST.sub('(?, ...)', statement)
+
+
+def fingerprint(normalized):
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+
+def parameter_shape(parameters, executemany):
+    if executemany:
+        rows = list(parameters)
+        return {'rows': len(rows), 'row': parameter_shape(rows[0], False) if rows else None}
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    return [type(value).__name__ for value in parameters or ()]
+
+
+# RotatingFileHandler dùng chung giữa nhiều worker: xoay file dưới khóa flock và
+# mở lại file khi tiến trình khác đã xoay (inode đổi)
+class SharedRotatingFileHandler(RotatingFileHandler):
+    def shouldRollover(self, record):
+        if self.stream is not None:
+            try:
+                if os.stat(self.baseFilename).st_ino != os.fstat(self.stream.fileno()).st_ino:
+                    self.stream.close()
+                    self.stream = self._open()
+            except FileNotFoundError:
+                self.stream.close()
+                self.stream = self._open()
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        with open(self.baseFilename + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            # Tiến trình khác có thể vừa xoay xong trong lúc chờ khóa
+            if os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename) >= self.maxBytes:
+                super().doRollover()
+            else:
+                if self.stream is not None:
+                    self.stream.close()
+                self.stream = self._open()
+
+
+class SlowQueryLog:
+    def __init__(self, log_path, threshold_ms=200, explain=True, analyze=False, explain_interval=300,
+                 max_bytes=5 * 1024 * 1024, backup_count=3, max_pending=100):
+        self.log_path = log_path
+        self.threshold = threshold_ms / 1000
+        self.explain = explain
+        self.analyze = analyze
+        self.explain_interval = explain_interval
+        # fingerprint -> thời điểm EXPLAIN gần nhất (time.monotonic)
+        self.explained = {}
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.pending = deque(maxlen=max_pending)
+        self.lock = threading.Lock()
+        self.wake_event = threading.Event()
+        self.thread = None
+        self.pid = None
+        self.engine = None
+        self.logger = None
+
+    def install(self, engine):
+        self.engine = engine
+        os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+        self.logger = logging.getLogger('slow_queries')
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        handler = SharedRotatingFileHandler(self.log_path, maxBytes=self.max_bytes, backupCount=self.backup_count)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        self.logger.addHandler(handler)
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def start_slow_query_timer(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault('slow_query_started', []).append(time.perf_counter())
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def check_slow_query(conn, cursor, statement, parameters, context, executemany):
+            duration = time.perf_counter() - conn.info['slow_query_started'].pop()
+            if duration >= self.threshold and not conn.info.get('slow_query_explain'):
+                self.record(statement, parameters, executemany, duration, conn.dialect.name)
+
+        @event.listens_for(engine, 'handle_error')
+        def discard_slow_query_timer(context):
+            if context.connection is not None:
+                stack = context.connection.info.get('slow_query_started')
+                if stack:
+                    stack.pop()
+
+    def record(self, statement, parameters, executemany, duration, dialect):
+        normalized = normalize_sql(statement)
+        entry = {
+            'time': datetime.utcnow().isoformat(timespec='seconds'),
+            'fingerprint': fingerprint(normalized),
+            'sql': normalized,
+            'params': parameter_shape(parameters, executemany),
+            'duration_ms': round(duration * 1000, 2),
+            'endpoint': request.endpoint if has_request_context() else None,
+            'method': request.method if has_request_context() else None,
+            'pid': os.getpid(),
+        }
+        # Giá trị tham số chỉ giữ trong bộ nhớ để chạy EXPLAIN, không ghi ra log
+        explain_params = None if executemany else parameters
+        with self.lock:
+            self._ensure_thread()
+            self.pending.append((entry, statement, explain_params, dialect))
+        self.wake_event.set()
+
+    def _ensure_thread(self):
+        if self.thread is not None and self.thread.is_alive() and self.pid == os.getpid():
+            return
+        self.pid = os.getpid()
+        self.pending.clear()
+        self.explained = {}
+        self.thread = threading.Thread(target=self._run, name='slow-query-log', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            self.wake_event.wait()
+            self.wake_event.clear()
+            while True:
+                with self.lock:
+                    if not self.pending:
+                        break
+                    entry, statement, parameters, dialect = self.pending.popleft()
+                if self.explain and parameters is not None and self._should_explain(entry['fingerprint']):
+                    try:
+                        entry['plan'] = self.explain_plan(statement, parameters, dialect)
+                    except Exception as e:
+                        entry['plan_error'] = str(e)
+                self.logger.info(json.dumps(entry, ensure_ascii=False, default=str))
+
+    def _should_explain(self, fingerprint):
+        now = time.monotonic()
+        last = self.explained.get(fingerprint)
+        if last is not None and now - last < self.explain_interval:
+            return False
+        self.explained[fingerprint] = now
+        # Bỏ các fingerprint đã quá hạn để dict không lớn mãi
+        if len(self.explained) > 1000:
+            self.explained = {key: value for key, value in self.explained.items()
+                              if now - value < self.explain_interval}
+        return True
+
+    # EXPLAIN trên kết nối riêng; transaction luôn rollback nên EXPLAIN ANALYZE không để lại thay đổi
+    def explain_plan(self, statement, parameters, dialect):
+        with self.engine.connect() as connection:
+            connection.info['slow_query_explain'] = True
+            try:
+                if dialect == 'postgresql':
+                    # ANALYZE thực thi câu lệnh thật: chỉ khi được bật và chỉ cho SELECT
+                    if self.analyze and statement.lstrip().lower().startswith(('select', 'with')):
+                        statement = f'EXPLAIN (ANALYZE, BUFFERS) {statement}'
+                    else:
+                        statement = f'EXPLAIN {statement}'
+                    rows = connection.exec_driver_sql(statement, parameters).all()
+                    return [row[0] for row in rows]
+                rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).all()
+                return [row[-1] for row in rows]
+            finally:
+                connection.info['slow_query_explain'] = False
+                connection.rollback()
+
+    def read_entries(self, limit=5000):
+        entries = []
+        # File cũ nhất trước (.3, .2, .1) rồi đến file hiện tại
+        paths = sorted(glob.glob(self.log_path + '.[0-9]*'), key=lambda p: -int(p.rsplit('.', 1)[1]))
+        for path in paths + [self.log_path]:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            entries.append(json.loads(line))
+                        except ValueError:
+                            continue
+            except OSError:
+                continue
+        return entries[-limit:]
+
+    # Tổng hợp theo fingerprint, sắp xếp theo tổng thời gian
+    def summary(self, limit=5000):
+        groups = {}
+        for entry in self.read_entries(limit):
+            group = groups.setdefault(entry['fingerprint'], {
+                'fingerprint': entry['fingerprint'], 'sql': entry['sql'], 'count': 0, 'total_ms': 0.0,
+                'max_ms': 0.0, 'endpoints': {}, 'last_seen': None, 'plan': None,
+            })
+            group['count'] += 1
+            group['total_ms'] += entry['duration_ms']
+            group['max_ms'] = max(group['max_ms'], entry['duration_ms'])
+            endpoint = entry.get('endpoint') or 'background'
+            group['endpoints'][endpoint] = group['endpoints'].get(endpoint, 0) + 1
+            group['last_seen'] = entry['time']
+            group['params'] = entry.get('params')
+            if entry.get('plan'):
+                group['plan'] = entry['plan']
+        for group in groups.values():
+            group['avg_ms'] = group['total_ms'] / group['count']
+        return sorted(groups.values(), key=lambda group: group['total_ms'], reverse=True)
@@ -0,0 +1,123 @@
+// Trạng thái đăng nhập và URL được template truyền qua thuộc tính data-* của <body>
+const isLoggedIn = document.body.dataset.loggedIn === '1';
+
+// Auto-hide flash messages after 5 seconds
+setTimeout(function () {
+    $('.alert').alert('close');
+}, 5000);
+
+// Newsletter subscription
+document.getElementById('subscribe-btn').addEventListener('click', function () {
+    const email = document.getElementById('newsletter-email').value;
+    const btn = this;
+    const originalContent = btn.innerHTML;
+
+    if (!email) {
+        alert('Vui lòng nhập email');
+        return;
+    }
+
+    // Show loading state
+    btn.innerHTML = '<i class="fas fa-spinner fa-spin"></i>';
+    btn.disabled = true;
+
+    fetch(document.body.dataset.subscribeUrl, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/x-www-form-urlencoded',
+        },
+        body: `email=${email}`
+    })
+        .then(response => response.json())
+        .then(data => {
+            alert(data.message);
+            if (data.success) {
+                document.getElementById('newsletter-email').value = '';
+            }
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            alert('Đã xảy ra lỗi khi đăng ký');
+        })
+        .finally(() => {
+            btn.innerHTML = originalContent;
+            btn.disabled = false;
+        });
+});
+
+// Gợi ý tìm kiếm khi gõ (chờ 150ms sau lần gõ cuối, bỏ kết quả của yêu cầu cũ)
+const searchInput = document.getElementById('search-input');
+const searchSuggestions = document.getElementById('search-suggestions');
+let suggestTimer = null;
+let suggestSeq = 0;
+
+searchInput.addEventListener('input', function () {
+    clearTimeout(suggestTimer);
+    const query = this.value.trim();
+    if (!query) {
+        searchSuggestions.innerHTML = '';
+        return;
+    }
+    suggestTimer = setTimeout(function () {
+        const seq = ++suggestSeq;
+        fetch(`${document.body.dataset.suggestUrl}?q=${encodeURIComponent(query)}`)
+            .then(response => response.json())
+            .then(data => {
+                if (seq !== suggestSeq) {
+                    return;
+                }
+                searchSuggestions.innerHTML = '';
+                data.categories.concat(data.products).forEach(item => {
+                    const option = document.createElement('option');
+                    option.value = item.name;
+                    searchSuggestions.appendChild(option);
+                });
+            })
+            .catch(error => console.error('Error:', error));
+    }, 150);
+});
+
+// Dark mode toggle
+document.getElementById('toggleTheme').addEventListener('click', function () {
+    const currentTheme = document.documentElement.getAttribute('data-bs-theme');
+    const newTheme = currentTheme === 'dark' ? 'light' : 'dark';
+
+    document.documentElement.setAttribute('data-bs-theme', newTheme);
+
+    // Update icons
+    document.getElementById('darkIcon').style.display = newTheme === 'dark' ? 'inline' : 'none';
+    document.getElementById('lightIcon').style.display = newTheme === 'light' ? 'inline' : 'none';
+
+    // Save preference if logged in
+    if (isLoggedIn) {
+        fetch('/toggle_dark_mode', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/x-www-form-urlencoded',
+            },
+            body: `dark_mode=${newTheme === 'dark' ? 1 : 0}`
+        });
+    } else {
+        // Save to localStorage for non-logged in users
+        localStorage.setItem('darkMode', newTheme === 'dark' ? 'enabled' : 'disabled');
+    }
+});
+
+// Check localStorage for theme preference on page load (for non-logged in users)
+document.addEventListener('DOMContentLoaded', function () {
+    const savedTheme = isLoggedIn ? null : localStorage.getItem('darkMode');
+    if (savedTheme === 'enabled') {
+        document.documentElement.setAttribute('data-bs-theme', 'dark');
+        document.getElementById('darkIcon').style.display = 'inline';
+        document.getElementById('lightIcon').style.display = 'none';
+    } else if (savedTheme === 'disabled') {
+        document.documentElement.setAttribute('data-bs-theme', 'light');
+        document.getElementById('darkIcon').style.display = 'none';
+        document.getElementById('lightIcon').style.display = 'inline';
+    } else {
+        // Default: show correct icon based on initial theme
+        const currentTheme = document.documentElement.getAttribute('data-bs-theme');
+        document.getElementById('darkIcon').style.display = currentTheme === 'dark' ? 'inline' : 'none';
+        document.getElementById('lightIcon').style.display = currentTheme === 'light' ? 'inline' : 'none';
+    }
+});
@@ -0,0 +1,56 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+# Cache tồn kho/giá của biến thể trong mỗi worker với thời hạn ngắn (TTL vài giây): khi
+# nhiều khách cùng xem/thêm một sản phẩm trong đợt giảm giá, mỗi biến thể chỉ được đọc
+# từ database tối đa một lần mỗi TTL thay vì ở mọi request. Các biến thể chưa có hoặc đã
+# hết hạn trong cache được nạp chung bằng một truy vấn. Id không tồn tại cũng được nhớ
+# (giá trị None) để các id sai không đi thẳng vào database.
+
+class StockCache:
+    def __init__(self, load, ttl=2.0, max_entries=50000):
+        # load(variant_ids) -> {variant_id: giá trị} cho các biến thể tồn tại
+        self.load = load
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_many(self, variant_ids):
+        now = time.monotonic()
+        found = {}
+        missing = []
+        with self.lock:
+            for variant_id in variant_ids:
+                entry = self.entries.get(variant_id)
+                if entry is not None and entry[0] > now:
+                    if entry[1] is not None:
+                        found[variant_id] = entry[1]
+                else:
+                    missing.append(variant_id)
+        if not missing:
+            return found
+
+        loaded = self.load(missing)
+        expires = time.monotonic() + self.ttl
+        with self.lock:
+            for variant_id in missing:
+                value = loaded.get(variant_id)
+                self.entries[variant_id] = (expires, value)
+                self.entries.move_to_end(variant_id)
+                if value is not None:
+                    found[variant_id] = value
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return found
+
+    def get(self, variant_id):
+        return self.get_many([variant_id]).get(variant_id)
+
+    # Worker vừa commit thay đổi tồn kho/giá: bỏ các mục tương ứng để lần đọc sau lấy số mới
+    def invalidate(self, variant_ids):
+        with self.lock:
+            for variant_id in variant_ids:
+                self.entries.pop(variant_id, None)
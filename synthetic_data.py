@@ -0,0 +1,419 @@
+import csv
+import io
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import func, select
+
+
+# Sinh dữ liệu giả lập với khối lượng lớn (sản phẩm, biến thể, khách hàng, đơn hàng,
+# đánh giá, bình luận, wishlist) để kiểm thử hiệu năng. Dữ liệu được sinh theo khối
+# bằng NumPy và nạp thẳng qua cursor DBAPI: COPY với PostgreSQL, executemany với SQLite,
+# mỗi khối một transaction. Độ phổ biến sản phẩm theo phân phối Zipf, ngày đặt hàng
+# theo mùa (cuối tuần, 11/11, Black Friday, cuối năm, Tết) và tăng trưởng dần theo thời gian.
+#
+# Dữ liệu sinh ra chỉ tham chiếu tới các dòng do chính nó tạo (cùng danh mục, màu, size
+# có sẵn), id được gán trực tiếp nối tiếp id lớn nhất hiện có.
+
+PRESETS = {
+    'small': {'products': 1000, 'variants': 10000, 'users': 5000, 'orders': 50000,
+              'reviews': 10000, 'comments': 5000, 'wishlist': 10000},
+    'medium': {'products': 10000, 'variants': 100000, 'users': 50000, 'orders': 1000000,
+               'reviews': 200000, 'comments': 50000, 'wishlist': 100000},
+    'large': {'products': 100000, 'variants': 1000000, 'users': 500000, 'orders': 10000000,
+              'reviews': 2000000, 'comments': 500000, 'wishlist': 1000000},
+}
+
+SECONDS_PER_DAY = 86400
+
+FAMILY_NAMES = ['Nguyễn', 'Trần', 'Lê', 'Phạm', 'Hoàng', 'Huỳnh', 'Phan', 'Vũ', 'Võ', 'Đặng', 'Bùi', 'Đỗ']
+MIDDLE_NAMES = ['Văn', 'Thị', 'Minh', 'Ngọc', 'Thanh', 'Hữu', 'Thu', 'Quốc', 'Gia', 'Bảo']
+GIVEN_NAMES = ['An', 'Bình', 'Châu', 'Dũng', 'Hà', 'Hải', 'Hạnh', 'Hùng', 'Lan', 'Linh', 'Long', 'Mai',
+               'Nam', 'Nga', 'Phong', 'Phương', 'Quân', 'Tâm', 'Thảo', 'Trang', 'Tuấn', 'Vy']
+CITIES = ['Hà Nội', 'TP.HCM', 'Đà Nẵng', 'Hải Phòng', 'Cần Thơ', 'Huế', 'Nha Trang', 'Biên Hòa', 'Vũng Tàu']
+STYLES = ['Basic', 'Oversize', 'Slim Fit', 'Vintage', 'Công Sở', 'Dạo Phố', 'Thể Thao', 'Cao Cấp']
+MATERIALS = ['Cotton', 'Linen', 'Kaki', 'Jean', 'Lụa', 'Len', 'Nỉ', 'Polyester']
+REVIEW_TEXTS = ['Chất vải đẹp, đúng mô tả', 'Giao hàng nhanh', 'Size hơi rộng so với bảng size',
+                'Màu bên ngoài nhạt hơn ảnh', 'Giá hợp lý, sẽ mua lại', 'Đường may chưa chắc chắn', None]
+COMMENT_TEXTS = ['Sản phẩm này còn size M không shop?', 'Cao 1m65 nặng 55kg mặc size nào vừa ạ?',
+                 'Có màu khác không shop?', 'Bao lâu thì giao tới Hà Nội?', 'Vải có bị co sau khi giặt không?']
+ADMIN_REPLIES = ['Dạ còn ạ, bạn đặt hàng trên web nhé', 'Shop tư vấn bạn size M ạ', 'Dạ giao 2-3 ngày ạ']
+
+RATING_WEIGHTS = [0.07, 0.06, 0.12, 0.30, 0.45]
+# Phân bổ đơn hàng theo giờ trong ngày: thấp lúc đêm, cao điểm buổi trưa và buổi tối
+HOUR_WEIGHTS = [1, 0.5, 0.3, 0.2, 0.2, 0.3, 0.8, 1.5, 2.5, 3, 3, 3.5, 4.5, 4, 3, 3, 3.2, 3.5, 4, 5, 6, 6, 4.5, 2.5]
+
+
+def volumes_for(scale, **overrides):
+    volumes = dict(PRESETS[scale])
+    volumes.update({name: value for name, value in overrides.items() if value is not None})
+    return volumes
+
+
+# Phân phối Zipf-Mandelbrot: phần tử hạng k có trọng số 1 / (k + shift)^s.
+# Hạng được gán ngẫu nhiên để sản phẩm bán chạy không luôn là sản phẩm có id nhỏ.
+class ZipfSampler:
+    def __init__(self, rng, n, s=1.0, shift=10):
+        weights = 1.0 / (np.arange(1, n + 1) + shift) ** s
+        self.cdf = np.cumsum(weights) / weights.sum()
+        self.permutation = rng.permutation(n)
+        self.rng = rng
+
+    def sample(self, size):
+        ranks = np.minimum(np.searchsorted(self.cdf, self.rng.random(size)), len(self.cdf) - 1)
+        return self.permutation[ranks]
+
+
+# Trọng số từng ngày: xu hướng tăng trưởng, cuối tuần, mùa mua sắm và các ngày khuyến mãi lớn
+def seasonal_day_weights(start, days):
+    month_factor = {1: 1.3, 2: 1.1, 3: 0.9, 4: 0.9, 5: 1.0, 6: 0.95, 7: 0.85, 8: 0.9, 9: 1.0, 10: 1.05,
+                    11: 1.4, 12: 1.6}
+    weights = np.empty(days)
+    for i in range(days):
+        day = start + timedelta(days=i)
+        weight = (1 + i / days) * month_factor[day.month]
+        if day.weekday() >= 5:
+            weight *= 1.2
+        if (day.month, day.day) in ((11, 11), (12, 12)):
+            weight *= 3
+        elif day.month == 11 and day.weekday() == 4 and day.day >= 23:
+            weight *= 2.5  # Black Friday
+        weights[i] = weight
+    return weights / weights.sum()
+
+
+class TimestampSampler:
+    def __init__(self, rng, end, days):
+        self.rng = rng
+        self.start = (end - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+        self.start_epoch = int((self.start - datetime(1970, 1, 1)).total_seconds())
+        self.day_cdf = np.cumsum(seasonal_day_weights(self.start, days))
+        hours = np.array(HOUR_WEIGHTS, dtype=np.float64)
+        self.hour_cdf = np.cumsum(hours / hours.sum())
+        self.days = days
+
+    def sample(self, size):
+        day = np.minimum(np.searchsorted(self.day_cdf, self.rng.random(size)), self.days - 1)
+        hour = np.minimum(np.searchsorted(self.hour_cdf, self.rng.random(size)), 23)
+        return (self.start_epoch + day * SECONDS_PER_DAY + hour * 3600
+                + self.rng.integers(0, 3600, size)).astype(np.int64)
+
+
+# Định dạng giống cách SQLAlchemy lưu DateTime trong SQLite, PostgreSQL cũng đọc được
+def format_timestamps(epochs):
+    text = np.datetime_as_string(epochs.astype('datetime64[s]'))
+    return np.char.add(np.char.replace(text, 'T', ' '), '.000000').tolist()
+
+
+def chunks(total, size):
+    for start in range(0, total, size):
+        yield start, min(size, total - start)
+
+
+# Nạp dữ liệu theo khối qua cursor DBAPI (bỏ qua event của SQLAlchemy như đo chỉ số,
+# ghi truy vấn chậm để không làm chậm quá trình nạp)
+class BulkLoader:
+    def __init__(self, engine):
+        self.engine = engine
+        self.dialect = engine.dialect.name
+
+    def insert(self, table, columns, rows):
+        with self.engine.begin() as connection:
+            if self.dialect == 'postgresql':
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(rows)
+                buffer.seek(0)
+                cursor = connection.connection.cursor()
+                cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+                cursor.close()
+            else:
+                cursor = connection.connection.cursor()
+                cursor.executemany(
+                    f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", rows
+                )
+                cursor.close()
+
+    # Id được gán trực tiếp nên phải đẩy sequence của PostgreSQL lên sau khi nạp
+    def reset_sequences(self, tables):
+        if self.dialect != 'postgresql':
+            return
+        with self.engine.begin() as connection:
+            for table in tables:
+                connection.exec_driver_sql(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                    f"COALESCE((SELECT MAX(id) FROM {table}), 1))"
+                )
+
+
+class SyntheticData:
+    def __init__(self, engine, metadata, volumes, password_hash, seed=42, days=730, zipf=1.0,
+                 chunk_size=50000, end=None, log=print):
+        self.engine = engine
+        self.tables = metadata.tables
+        self.volumes = volumes
+        self.password_hash = password_hash
+        self.rng = np.random.default_rng(seed)
+        self.chunk_size = chunk_size
+        self.zipf = zipf
+        self.log = log
+        self.loader = BulkLoader(engine)
+        self.timestamps = TimestampSampler(self.rng, end or datetime.utcnow(), days)
+        self.counts = {}
+
+    def run(self):
+        for name, needs in (('variants', ('products',)), ('orders', ('products', 'variants', 'users')),
+                            ('reviews', ('products', 'users')), ('comments', ('products', 'users')),
+                            ('wishlist', ('products', 'users'))):
+            if self.volumes.get(name) and not all(self.volumes.get(need) for need in needs):
+                raise ValueError(f"Generating {name} requires {', '.join(needs)}")
+        self.load_reference_data()
+        for name in ('users', 'products', 'variants', 'orders', 'reviews', 'comments', 'wishlist'):
+            if self.volumes.get(name):
+                started = time.perf_counter()
+                getattr(self, f'generate_{name}')()
+                self.log(f"{name}: {self.counts[name]} rows in {time.perf_counter() - started:.1f}s")
+        self.loader.reset_sequences(['users', 'products', 'product_variants', 'orders', 'order_details',
+                                     'product_reviews', 'product_comments', 'wishlist'])
+        return self.counts
+
+    def next_id(self, connection, table):
+        return (connection.execute(select(func.max(self.tables[table].c.id))).scalar() or 0) + 1
+
+    def load_reference_data(self):
+        with self.engine.connect() as connection:
+            self.category_ids = np.array(connection.execute(select(self.tables['categories'].c.id)).scalars().all())
+            self.color_ids = np.array(connection.execute(select(self.tables['colors'].c.id)).scalars().all())
+            self.size_ids = np.array(connection.execute(select(self.tables['sizes'].c.id)).scalars().all())
+            products = self.tables['products']
+            self.category_names = dict(connection.execute(
+                select(self.tables['categories'].c.id, self.tables['categories'].c.name)
+            ).all())
+            self.image_urls = connection.execute(
+                select(products.c.image_url).where(products.c.image_url.isnot(None)).distinct()
+            ).scalars().all() or [None]
+            self.first_ids = {table: self.next_id(connection, table) for table in (
+                'users', 'products', 'product_variants', 'orders', 'order_details',
+                'product_reviews', 'product_comments', 'wishlist'
+            )}
+        if not len(self.category_ids) or not len(self.color_ids) or not len(self.size_ids):
+            raise ValueError('Categories, colors and sizes must exist before generating data (run init_db first)')
+
+    def generate_users(self):
+        total = self.volumes['users']
+        first_id = self.first_ids['users']
+        rng = self.rng
+        columns = ('id', 'username', 'email', 'password_hash', 'full_name', 'phone', 'address',
+                   'is_admin', 'dark_mode', 'created_at', 'updated_at')
+        for start, size in chunks(total, self.chunk_size):
+            ids = np.arange(first_id + start, first_id + start + size)
+            # Tài khoản được tạo trước đơn hàng đầu tiên: lùi ngày đăng ký từ 0-180 ngày
+            created = format_timestamps(self.timestamps.sample(size) - rng.integers(0, 180, size) * SECONDS_PER_DAY)
+            family = rng.integers(0, len(FAMILY_NAMES), size)
+            middle = rng.integers(0, len(MIDDLE_NAMES), size)
+            given = rng.integers(0, len(GIVEN_NAMES), size)
+            cities = rng.integers(0, len(CITIES), size)
+            phones = rng.integers(0, 10 ** 8, size)
+            rows = [
+                (int(user_id), f'customer{user_id}', f'customer{user_id}@example.com', self.password_hash,
+                 f'{FAMILY_NAMES[f]} {MIDDLE_NAMES[m]} {GIVEN_NAMES[g]}', f'09{phone:08d}',
+                 f'{house} Đường số {street}, {CITIES[c]}', False, False, created_at, created_at)
+                for user_id, f, m, g, c, phone, house, street, created_at in zip(
+                    ids.tolist(), family.tolist(), middle.tolist(), given.tolist(), cities.tolist(),
+                    phones.tolist(), rng.integers(1, 500, size).tolist(), rng.integers(1, 50, size).tolist(), created
+                )
+            ]
+            self.loader.insert('users', columns, rows)
+        self.user_ids = np.arange(first_id, first_id + total)
+        # Mức độ mua sắm của khách theo log-normal: đa số mua ít, một nhóm nhỏ mua rất nhiều
+        activity = rng.lognormal(0, 0.8, total)
+        self.user_cdf = np.cumsum(activity) / activity.sum()
+        self.counts['users'] = total
+
+    def generate_products(self):
+        total = self.volumes['products']
+        first_id = self.first_ids['products']
+        rng = self.rng
+        columns = ('id', 'name', 'description', 'base_price', 'category_id', 'image_url', 'is_active',
+                   'created_at', 'updated_at')
+        # Giá theo log-normal quanh 350.000đ, làm tròn nghìn đồng
+        self.base_prices = np.clip(np.round(rng.lognormal(np.log(350000), 0.5, total), -3), 79000, 5000000)
+        for start, size in chunks(total, self.chunk_size):
+            ids = range(first_id + start, first_id + start + size)
+            categories = rng.choice(self.category_ids, size).tolist()
+            styles = rng.integers(0, len(STYLES), size).tolist()
+            materials = rng.integers(0, len(MATERIALS), size).tolist()
+            images = rng.integers(0, len(self.image_urls), size).tolist()
+            active = (rng.random(size) < 0.97).tolist()
+            created = format_timestamps(self.timestamps.sample(size))
+            rows = [
+                (product_id, f'{self.category_names[category]} {STYLES[style]} {MATERIALS[material]} {product_id}',
+                 f'{self.category_names[category]} chất liệu {MATERIALS[material].lower()}, phong cách '
+                 f'{STYLES[style].lower()}', float(price), category, self.image_urls[image], is_active,
+                 created_at, created_at)
+                for product_id, category, style, material, image, is_active, created_at, price in zip(
+                    ids, categories, styles, materials, images, active, created,
+                    self.base_prices[start:start + size]
+                )
+            ]
+            self.loader.insert('products', columns, rows)
+        self.product_ids = np.arange(first_id, first_id + total)
+        self.product_sampler = ZipfSampler(rng, total, self.zipf)
+        self.counts['products'] = total
+
+    def generate_variants(self):
+        products = len(self.product_ids)
+        combos = len(self.color_ids) * len(self.size_ids)
+        rng = self.rng
+        # Mỗi sản phẩm có số biến thể quanh mức trung bình, tối thiểu 1, tối đa số tổ hợp màu x size
+        per_product = np.clip(rng.poisson(self.volumes['variants'] / products, products), 1, combos)
+        self.variant_start = self.first_ids['product_variants'] + np.r_[0, np.cumsum(per_product)[:-1]]
+        self.variant_count = per_product
+        total = int(per_product.sum())
+        self.variant_prices = np.empty(total)
+        columns = ('id', 'product_id', 'color_id', 'size_id', 'price', 'stock_quantity', 'sku', 'created_at')
+        sizes = len(self.size_ids)
+        for start, size in chunks(products, max(1, self.chunk_size // 10)):
+            # Chọn tổ hợp màu x size không trùng cho từng sản phẩm
+            indexes = np.repeat(np.arange(start, start + size), per_product[start:start + size])
+            combo = np.concatenate([rng.choice(combos, count, replace=False)
+                                    for count in per_product[start:start + size].tolist()])
+            ids = np.arange(len(indexes)) + self.variant_start[start]
+            product_ids = self.product_ids[indexes]
+            color_ids = self.color_ids[combo // sizes]
+            size_ids = self.size_ids[combo % sizes]
+            prices = self.base_prices[indexes]
+            stock = np.where(rng.random(len(indexes)) < 0.05, 0, rng.integers(1, 200, len(indexes)))
+            self.variant_prices[ids - self.first_ids['product_variants']] = prices
+            rows = [
+                (variant_id, product_id, color_id, size_id, price, quantity,
+                 f'SYN{product_id}-{color_id}-{size_id}', created_at)
+                for variant_id, product_id, color_id, size_id, price, quantity, created_at in zip(
+                    ids.tolist(), product_ids.tolist(), color_ids.tolist(), size_ids.tolist(), prices.tolist(),
+                    stock.tolist(), format_timestamps(self.timestamps.sample(len(indexes)))
+                )
+            ]
+            self.loader.insert('product_variants', columns, rows)
+        self.counts['variants'] = total
+
+    def sample_users(self, size):
+        return self.user_ids[np.minimum(np.searchsorted(self.user_cdf, self.rng.random(size)), len(self.user_ids) - 1)]
+
+    # Trạng thái theo tuổi đơn: đơn cũ phần lớn đã hoàn thành, đơn mới còn chờ xử lý
+    def order_statuses(self, epochs):
+        age_days = (self.timestamps.start_epoch + self.timestamps.days * SECONDS_PER_DAY - epochs) / SECONDS_PER_DAY
+        roll = self.rng.random(len(epochs))
+        recent = np.select([roll < 0.5, roll < 0.8, roll < 0.9], ['pending', 'processing', 'shipped'], 'cancelled')
+        middle = np.select([roll < 0.35, roll < 0.8, roll < 0.9], ['completed', 'shipped', 'processing'], 'cancelled')
+        old = np.select([roll < 0.9, roll < 0.92], ['completed', 'shipped'], 'cancelled')
+        return np.where(age_days <= 3, recent, np.where(age_days <= 14, middle, old)).tolist()
+
+    def generate_orders(self):
+        rng = self.rng
+        order_id = self.first_ids['orders']
+        detail_id = self.first_ids['order_details']
+        order_columns = ('id', 'user_id', 'total_amount', 'status', 'shipping_address', 'phone', 'created_at',
+                         'updated_at')
+        detail_columns = ('id', 'order_id', 'product_variant_id', 'quantity', 'unit_price', 'total_price')
+        line_items = 0
+        # Sắp xếp thời điểm đặt hàng để id đơn tăng theo thời gian như dữ liệu thật
+        all_epochs = np.sort(self.timestamps.sample(self.volumes['orders']))
+        for start, size in chunks(self.volumes['orders'], self.chunk_size):
+            order_ids = np.arange(order_id, order_id + size)
+            # 1-5 sản phẩm mỗi đơn, phần lớn chỉ 1-2
+            lines = np.minimum(rng.geometric(0.55, size), 5)
+            line_orders = np.repeat(order_ids, lines)
+            products = self.product_sampler.sample(len(line_orders))
+            variants = self.variant_start[products] + (rng.random(len(line_orders)) * self.variant_count[products]).astype(np.int64)
+            prices = self.variant_prices[variants - self.first_ids['product_variants']]
+            quantities = rng.choice([1, 2, 3], len(line_orders), p=[0.8, 0.15, 0.05])
+            line_totals = prices * quantities
+            totals = np.bincount(line_orders - order_id, weights=line_totals, minlength=size)
+
+            epochs = all_epochs[start:start + size]
+            created = format_timestamps(epochs)
+            cities = rng.integers(0, len(CITIES), size).tolist()
+            rows = [
+                (oid, uid, round(total, 2), status, CITIES[city], None, created_at, created_at)
+                for oid, uid, total, status, city, created_at in zip(
+                    order_ids.tolist(), self.sample_users(size).tolist(), totals.tolist(),
+                    self.order_statuses(epochs), cities, created
+                )
+            ]
+            self.loader.insert('orders', order_columns, rows)
+
+            detail_ids = range(detail_id, detail_id + len(line_orders))
+            self.loader.insert('order_details', detail_columns, list(zip(
+                detail_ids, line_orders.tolist(), variants.tolist(), quantities.tolist(), prices.tolist(),
+                line_totals.tolist()
+            )))
+            order_id += size
+            detail_id += len(line_orders)
+            line_items += len(line_orders)
+        self.counts['orders'] = self.volumes['orders']
+        self.counts['order_details'] = line_items
+
+    # Cặp (user, sản phẩm) duy nhất theo phân phối của khách hàng và sản phẩm: sinh dư rồi
+    # loại trùng, trả về khóa user_index * số sản phẩm + product_index theo thứ tự ngẫu nhiên
+    def sample_user_product_pairs(self, wanted):
+        wanted = min(wanted, len(self.user_ids) * len(self.product_ids))
+        users = self.sample_users(int(wanted * 1.2) + 10) - self.user_ids[0]
+        products = self.product_sampler.sample(len(users))
+        keys = np.unique(users * len(self.product_ids) + products)
+        return self.rng.permutation(keys)[:wanted]
+
+    def generate_reviews(self):
+        rng = self.rng
+        # Mỗi khách hàng chỉ có một đánh giá cho mỗi sản phẩm (add_review sửa đánh giá cũ)
+        keys = self.sample_user_product_pairs(self.volumes['reviews'])
+        review_id = self.first_ids['product_reviews']
+        columns = ('id', 'product_id', 'user_id', 'rating', 'comment', 'created_at')
+        for start, size in chunks(len(keys), self.chunk_size):
+            batch = keys[start:start + size]
+            ratings = rng.choice([1, 2, 3, 4, 5], size, p=RATING_WEIGHTS)
+            texts = rng.integers(0, len(REVIEW_TEXTS), size).tolist()
+            rows = list(zip(range(review_id + start, review_id + start + size),
+                            self.product_ids[batch % len(self.product_ids)].tolist(),
+                            (self.user_ids[0] + batch // len(self.product_ids)).tolist(), ratings.tolist(),
+                            [REVIEW_TEXTS[text] for text in texts], format_timestamps(self.timestamps.sample(size))))
+            self.loader.insert('product_reviews', columns, rows)
+        self.counts['reviews'] = len(keys)
+
+    def generate_comments(self):
+        rng = self.rng
+        comment_id = self.first_ids['product_comments']
+        columns = ('id', 'product_id', 'user_id', 'comment', 'is_approved', 'admin_reply', 'reply_date',
+                   'created_at')
+        for start, size in chunks(self.volumes['comments'], self.chunk_size):
+            products = self.product_ids[self.product_sampler.sample(size)]
+            epochs = self.timestamps.sample(size)
+            created = format_timestamps(epochs)
+            replied = rng.random(size) < 0.3
+            reply_dates = format_timestamps(epochs + rng.integers(600, 2 * SECONDS_PER_DAY, size))
+            texts = rng.integers(0, len(COMMENT_TEXTS), size).tolist()
+            replies = rng.integers(0, len(ADMIN_REPLIES), size).tolist()
+            rows = [
+                (cid, pid, uid, COMMENT_TEXTS[text], approved, ADMIN_REPLIES[reply] if has_reply else None,
+                 reply_date if has_reply else None, created_at)
+                for cid, pid, uid, text, approved, has_reply, reply, reply_date, created_at in zip(
+                    range(comment_id + start, comment_id + start + size), products.tolist(),
+                    self.sample_users(size).tolist(), texts, (rng.random(size) < 0.9).tolist(), replied.tolist(),
+                    replies, reply_dates, created
+                )
+            ]
+            self.loader.insert('product_comments', columns, rows)
+        self.counts['comments'] = self.volumes['comments']
+
+    def generate_wishlist(self):
+        # Cặp (user, sản phẩm) phải duy nhất
+        keys = self.sample_user_product_pairs(self.volumes['wishlist'])
+        wishlist_id = self.first_ids['wishlist']
+        columns = ('id', 'user_id', 'product_id', 'created_at')
+        for start, size in chunks(len(keys), self.chunk_size):
+            batch = keys[start:start + size]
+            rows = list(zip(range(wishlist_id + start, wishlist_id + start + size),
+                            (self.user_ids[0] + batch // len(self.product_ids)).tolist(),
+                            self.product_ids[batch % len(self.product_ids)].tolist(),
+                            format_timestamps(self.timestamps.sample(size))))
+            self.loader.insert('wishlist', columns, rows)
+        self.counts['wishlist'] = len(keys)